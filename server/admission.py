@@ -0,0 +1,208 @@
+"""
+Admission control for expensive operations.
+
+Every worker caps how many LLM queries, embedding searches and document
+ingestions run at once (ADMISSION_*_CONCURRENCY). A request that finds its
+operation at capacity waits in a bounded FIFO queue; it is turned away at
+once with 429 + Retry-After when the queue is full or the expected wait is
+longer than ADMISSION_MAX_WAIT_SECONDS, and after that long at most. So
+under overload the requests that are admitted still see normal latency
+instead of everyone slowing down together, and the model providers never
+see more than the caps.
+
+Each user also has a token bucket (ADMISSION_USER_RATE_PER_MINUTE, bursts of
+ADMISSION_USER_BURST) shared by all three operations, so one user scripting
+/ask is rate limited before they can fill the queues. Caps and buckets are
+per worker process; multiply by the worker count for host-wide figures.
+"""
+
+import math
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+from config import (
+    ADMISSION_LLM_CONCURRENCY,
+    ADMISSION_EMBED_CONCURRENCY,
+    ADMISSION_INGEST_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_MAX_WAIT_SECONDS,
+    ADMISSION_USER_RATE_PER_MINUTE,
+    ADMISSION_USER_BURST
+)
+from metrics import ADMISSION_REJECTIONS, stage
+
+
+LLM = "llm"
+EMBED = "embed"
+INGEST = "ingest"
+
+# Bounds for the Retry-After hint (seconds)
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class Overloaded(Exception):
+    """The request was not admitted; retry after `retry_after` seconds"""
+
+    def __init__(self, operation: str, reason: str, retry_after: float):
+        self.operation = operation
+        self.reason = reason
+        self.retry_after = int(min(max(math.ceil(retry_after), MIN_RETRY_AFTER), MAX_RETRY_AFTER))
+        ADMISSION_REJECTIONS.labels(operation, reason).inc()
+        super().__init__(f"Too many {operation} requests ({reason}), retry in {self.retry_after}s")
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders at once, a bounded FIFO queue of waiters behind them"""
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int = ADMISSION_QUEUE_SIZE,
+        max_wait: float = ADMISSION_MAX_WAIT_SECONDS
+    ):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        # limit <= 0 means uncapped
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        # Moving average of how long a slot is held, for wait estimates
+        self.mean_hold_seconds = 0.0
+
+    def expected_wait(self) -> float:
+        """Rough seconds until a newly queued request gets a slot"""
+        if not self.limit:
+            return 0.0
+        return self.mean_hold_seconds * (self.waiting + 1) / self.limit
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the body of the block; raises Overloaded instead of queueing too long"""
+        if self._semaphore is not None:
+            if self._semaphore.locked():
+                if self.waiting >= self.max_queue:
+                    raise Overloaded(self.name, "queue_full", self.expected_wait())
+                if self.expected_wait() > self.max_wait:
+                    raise Overloaded(self.name, "overloaded", self.expected_wait())
+            self.waiting += 1
+            try:
+                with stage("queue_wait"):
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                raise Overloaded(self.name, "wait_timeout", self.expected_wait())
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            held = time.perf_counter() - start
+            self.mean_hold_seconds = held if self.admitted == 1 else 0.9 * self.mean_hold_seconds + 0.1 * held
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "mean_hold_seconds": round(self.mean_hold_seconds, 3)
+        }
+
+
+class UserRateLimiter:
+    """Token bucket per user: `rate_per_minute` refill, up to `burst` saved up"""
+
+    def __init__(
+        self,
+        rate_per_minute: float = ADMISSION_USER_RATE_PER_MINUTE,
+        burst: int = ADMISSION_USER_BURST,
+        max_users: int = 100000,
+        timer: Callable[[], float] = time.monotonic
+    ):
+        self.rate = rate_per_minute / 60
+        self.burst = max(burst, 1)
+        self.timer = timer
+        # A bucket untouched for this long is full again, so it can be dropped
+        refill_seconds = self.burst / self.rate if self.rate > 0 else 1
+        self._buckets = TTLCache(maxsize=max_users, ttl=refill_seconds, timer=timer)
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, user_id: str, operation: str, cost: float = 1.0):
+        """Spend `cost` tokens of a user's bucket or raise Overloaded"""
+        if not self.enabled:
+            return
+        now = self.timer()
+        tokens, updated = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < cost:
+            self._buckets[user_id] = (tokens, now)
+            self.limited += 1
+            raise Overloaded(operation, "user_rate_limited", (cost - tokens) / self.rate)
+        self._buckets[user_id] = (tokens - cost, now)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "tracked_users": len(self._buckets),
+            "limited": self.limited
+        }
+
+
+class AdmissionController:
+    """Per-user rate limit, then a concurrency slot for the operation"""
+
+    def __init__(self, limiters: Dict[str, ConcurrencyLimiter], users: Optional[UserRateLimiter] = None):
+        self.limiters = limiters
+        self.users = users
+
+    @asynccontextmanager
+    async def admit(self, operation: str, user_id: Optional[str] = None):
+        """
+        Run the body of the block once admitted.
+
+        Raises:
+            Overloaded: the user is over their rate, or the operation is at
+                capacity and its queue is full or too slow
+        """
+        if user_id is not None and self.users is not None:
+            self.users.take(user_id, operation)
+        async with self.limiters[operation].slot():
+            yield
+
+    def stats(self) -> dict:
+        return {
+            **{name: limiter.stats() for name, limiter in self.limiters.items()},
+            "users": self.users.stats() if self.users is not None else None
+        }
+
+
+# Global admission controller instance
+admission = AdmissionController(
+    {
+        LLM: ConcurrencyLimiter(LLM, ADMISSION_LLM_CONCURRENCY),
+        EMBED: ConcurrencyLimiter(EMBED, ADMISSION_EMBED_CONCURRENCY),
+        INGEST: ConcurrencyLimiter(INGEST, ADMISSION_INGEST_CONCURRENCY)
+    },
+    UserRateLimiter()
+)
@@ -0,0 +1,262 @@
+"""
+Cold archive tier for inactive chats.
+
+Chats idle for ARCHIVE_AFTER_DAYS have their messages packed into per-chat
+transcript blobs (BSON, zstd-compressed, ARCHIVE_MESSAGES_PER_BLOB messages
+per part) in the chat_archives collection, and the hot message rows are
+deleted, so the messages collection and its indexes only hold chats people
+still use. The chat document itself stays where it is, marked archived_at.
+
+Opening an archived chat (/chats/{chat_id}, /ask) rehydrates it: messages
+are written back with their original _ids in the current MESSAGE_STORAGE
+mode, then the archive is dropped. Both directions are idempotent, so an
+interrupted run is simply repeated.
+
+Usage:
+    python archive.py run [--days N] [--limit N] [--dry-run]
+    python archive.py restore CHAT_ID
+"""
+
+import sys
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import bson
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from config import (
+    MONGODB_URI,
+    MONGODB_DB_NAME,
+    MESSAGE_STORAGE,
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_MESSAGES_PER_BLOB,
+    ARCHIVE_ZSTD_LEVEL
+)
+from database import Database, db
+from migrate_messages import build_buckets
+
+
+CODEC = "zstd"
+
+
+def pack_messages(messages: List[dict], level: int = ARCHIVE_ZSTD_LEVEL) -> bytes:
+    """Message rows -> compressed transcript blob"""
+    import zstandard  # Only needed by the archive job and rehydration
+
+    return zstandard.ZstdCompressor(level=level).compress(bson.encode({"messages": messages}))
+
+
+def unpack_messages(blob: bytes) -> List[dict]:
+    """Compressed transcript blob -> message rows"""
+    import zstandard
+
+    return bson.decode(zstandard.ZstdDecompressor().decompress(blob))["messages"]
+
+
+class ChatArchiver:
+    """Moves idle chats' messages to compressed blobs and back"""
+
+    def __init__(
+        self,
+        database: Database,
+        after_days: float = ARCHIVE_AFTER_DAYS,
+        messages_per_blob: int = ARCHIVE_MESSAGES_PER_BLOB,
+        level: int = ARCHIVE_ZSTD_LEVEL
+    ):
+        self.database = database
+        self.after_days = after_days
+        self.messages_per_blob = messages_per_blob
+        self.level = level
+
+    async def find_idle_chats(self, limit: int, now: datetime = None) -> List[dict]:
+        """Unarchived, undeleted chats not updated for after_days, oldest first"""
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.after_days)
+        return await self.database.chats.find(
+            {"archived_at": None, "updated_at": {"$lt": cutoff}, "deleted_at": {"$exists": False}},
+            {"updated_at": 1}
+        ).sort("updated_at", ASCENDING).limit(limit).to_list(length=limit)
+
+    async def _hot_messages(self, chat_id: str) -> Tuple[List[dict], List[dict]]:
+        """
+        Every hot message of a chat from both storage modes, oldest first and
+        with positions, plus the bucket documents they came from
+        """
+        rows = await self.database.messages.find({"chat_id": chat_id}).sort(
+            [("created_at", ASCENDING), ("_id", ASCENDING)]
+        ).to_list(length=None)
+        buckets = await self.database.message_buckets.collection.find(
+            {"chat_id": chat_id}
+        ).sort("seq", ASCENDING).to_list(length=None)
+        for bucket in buckets:
+            for entry in bucket["messages"]:
+                rows.append({"chat_id": chat_id, **entry})
+
+        rows.sort(key=lambda row: (row["created_at"], row.get("pos", -1), row["_id"]))
+        for pos, row in enumerate(rows):
+            row.setdefault("pos", pos)
+        return rows, buckets
+
+    async def archive_chat(self, chat_id: str, updated_at: datetime) -> Optional[dict]:
+        """
+        Archive one chat as of `updated_at`. Returns stats, or None when the
+        chat was written to meanwhile (it stays hot and the blobs are dropped).
+        """
+        messages, buckets = await self._hot_messages(chat_id)
+
+        parts, raw_bytes, stored_bytes = [], 0, 0
+        for part, start in enumerate(range(0, len(messages), self.messages_per_blob)):
+            group = messages[start:start + self.messages_per_blob]
+            blob = pack_messages(group, self.level)
+            raw_bytes += len(bson.encode({"messages": group}))
+            stored_bytes += len(blob)
+            parts.append({
+                "chat_id": chat_id,
+                "part": part,
+                "count": len(group),
+                "codec": CODEC,
+                "first_at": group[0]["created_at"],
+                "last_at": group[-1]["created_at"],
+                "blob": bson.Binary(blob),
+                "created_at": datetime.utcnow()
+            })
+
+        # Replace any blobs left by an interrupted run
+        await self.database.archives.delete_many({"chat_id": chat_id})
+        if parts:
+            await self.database.archives.insert_many(parts, ordered=True)
+
+        # Only flip the chat if nobody wrote to it since it was selected
+        result = await self.database.chats.update_one(
+            {"_id": ObjectId(chat_id), "updated_at": updated_at, "archived_at": None},
+            {"$set": {"archived_at": datetime.utcnow(), "archived_messages": len(messages)}}
+        )
+        if result.modified_count == 0:
+            await self.database.archives.delete_many({"chat_id": chat_id})
+            return None
+        self.database.chat_cache.invalidate(chat_id)
+
+        # Delete exactly what was archived: a message appended in the meantime
+        # stays hot (and a bucket it landed in is kept) until rehydration merges it
+        message_ids = [msg["_id"] for msg in messages]
+        for start in range(0, len(message_ids), self.messages_per_blob):
+            await self.database.messages.delete_many(
+                {"_id": {"$in": message_ids[start:start + self.messages_per_blob]}}
+            )
+        for bucket in buckets:
+            await self.database.message_buckets.collection.delete_one(
+                {"_id": bucket["_id"], "count": bucket["count"]}
+            )
+
+        return {"messages": len(messages), "parts": len(parts), "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
+
+    async def run_once(self, limit: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> List[dict]:
+        """Archive up to `limit` idle chats. Returns per-chat stats."""
+        results = []
+        for chat in await self.find_idle_chats(limit):
+            chat_id = str(chat["_id"])
+            if dry_run:
+                results.append({"chat_id": chat_id, "updated_at": chat["updated_at"]})
+                continue
+            stats = await self.archive_chat(chat_id, chat["updated_at"])
+            if stats is not None:
+                results.append({"chat_id": chat_id, **stats})
+        return results
+
+    async def rehydrate(self, chat_id: str) -> int:
+        """Bring an archived chat's messages back to the hot tier. Returns the number restored."""
+        parts = await self.database.archives.find({"chat_id": chat_id}).sort("part", ASCENDING).to_list(length=None)
+        messages = []
+        for part in parts:
+            messages.extend(unpack_messages(part["blob"]))
+
+        if self.database.bucketed:
+            await self._restore_buckets(chat_id, messages)
+        elif messages:
+            rows = [{key: value for key, value in msg.items() if key != "pos"} for msg in messages]
+            # Original _ids make a repeated rehydration skip what is already back
+            try:
+                await self.database.messages.insert_many(rows, ordered=False)
+            except BulkWriteError as e:
+                if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                    raise
+
+        await self.database.chats.update_one(
+            {"_id": ObjectId(chat_id)},
+            {"$unset": {"archived_at": "", "archived_messages": ""}}
+        )
+        self.database.chat_cache.invalidate(chat_id)
+        await self.database.archives.delete_many({"chat_id": chat_id})
+        if messages:
+            print(f"📤 Rehydrated {len(messages)} messages of chat {chat_id}")
+        return len(messages)
+
+    async def _restore_buckets(self, chat_id: str, archived: List[dict]):
+        """Rebuild a chat's buckets from its archive plus anything appended since it was archived"""
+        buckets = self.database.message_buckets
+        merged = {msg["_id"]: msg for msg in archived}
+        async for bucket in buckets.collection.find({"chat_id": chat_id}):
+            for entry in bucket["messages"]:
+                merged[entry["_id"]] = entry
+        if not merged:
+            return
+
+        rows = sorted(merged.values(), key=lambda msg: msg["pos"])
+        await buckets.collection.delete_many({"chat_id": chat_id})
+        await buckets.collection.insert_many(build_buckets(chat_id, rows, buckets.bucket_size), ordered=True)
+        await self.database.chats.update_one({"_id": ObjectId(chat_id)}, {"$set": {"message_count": len(rows)}})
+
+
+# Global archiver instance
+archiver = ChatArchiver(db)
+
+
+# ==================== CLI ====================
+
+async def _main(args) -> int:
+    database = Database(uri=args.uri, db_name=args.db, message_storage=MESSAGE_STORAGE)
+    await database.connect()
+    try:
+        chat_archiver = ChatArchiver(database, after_days=args.days)
+        if args.command == "restore":
+            restored = await chat_archiver.rehydrate(args.chat_id)
+            print(f"✅ Restored {restored} messages")
+            return 0
+
+        results = await chat_archiver.run_once(args.limit, args.dry_run)
+        for result in results:
+            print(f"🧊 {result}")
+        if args.dry_run:
+            print(f"✅ Would archive {len(results)} chats")
+        else:
+            raw = sum(r["raw_bytes"] for r in results)
+            stored = sum(r["stored_bytes"] for r in results)
+            print(f"✅ Archived {sum(r['messages'] for r in results)} messages in {len(results)} chats "
+                  f"({raw} -> {stored} bytes)")
+        return 0
+    finally:
+        await database.disconnect()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Archive inactive chats to compressed transcripts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="Archive chats idle for --days")
+    run.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS)
+    run.add_argument("--limit", type=int, default=ARCHIVE_BATCH_SIZE, help="Chats per run")
+    run.add_argument("--dry-run", action="store_true")
+    restore = subparsers.add_parser("restore", help="Rehydrate one archived chat")
+    restore.add_argument("chat_id")
+    restore.set_defaults(days=ARCHIVE_AFTER_DAYS)
+    for sub in (run, restore):
+        sub.add_argument("--uri", default=MONGODB_URI)
+        sub.add_argument("--db", default=MONGODB_DB_NAME)
+    return asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+"""
+LegalEagle Performance Benchmarks
+
+Offline micro-benchmarks for the server's hot paths. None of them need
+MongoDB, Pinecone or any API keys.
+
+Usage:
+    python benchmarks.py quantization [--chunks 20000] [--queries 200] [--top-k 5] [--rescore-multiplier 4]
+    python benchmarks.py serialization [--messages 1000] [--repeat 50]
+    python benchmarks.py startup [--runs 3] [--budget-ms 1500]
+    python benchmarks.py compression [--messages 50 200 1000] [--repeat 20]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import random
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+
+# Benchmarks never talk to the real services; keep config.py from exiting
+for _name in ("GOOGLE_API_KEY", "COHERE_API_KEY", "MONGODB_URI", "RAZORPAY_KEY_ID", "RAZORPAY_KEY_SECRET"):
+    os.environ.setdefault(_name, "benchmark")
+os.environ.setdefault("VECTOR_STORE_BACKEND", "local")
+
+from config import PINECONE_DIMENSION, VECTOR_TRUNCATE_DIM, VECTOR_RESCORE_MULTIPLIER
+from quantization import get_quantizer
+from vector_store import LocalVectorStore
+from models import ChatResponse, MessageResponse, ChatHistoryResponse, chat_to_dict, message_to_dict
+
+
+def log_header(msg):
+    print(f"\n{'='*60}")
+    print(f"  {msg}")
+    print(f"{'='*60}\n")
+
+
+# ==================== QUANTIZATION ====================
+
+def make_embeddings(n: int, dim: int, rank: int = 96, seed: int = 0) -> np.ndarray:
+    """
+    Synthetic embeddings with a low intrinsic dimension, like real text
+    embeddings: a random low-rank signal plus a little isotropic noise.
+    """
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(rank, dim)).astype(np.float32)
+    latent = rng.normal(size=(n, rank)).astype(np.float32)
+    vectors = latent @ basis + 2.0 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bytes_per_vector(mode: str, dim: int) -> int:
+    """Bytes of first-stage index per vector (what has to stay in RAM)"""
+    quantizer = get_quantizer(mode, VECTOR_TRUNCATE_DIM)
+    if quantizer is None:
+        return dim * 4
+    size = quantizer.code_width(dim) * np.dtype(quantizer.dtype).itemsize
+    if quantizer.has_scales:
+        size += 4
+    return size
+
+
+def benchmark_quantization(chunks: int, queries: int, top_k: int, rescore_multiplier: int):
+    """Recall@k, latency and memory per million chunks for every quantization mode"""
+    log_header(f"Quantization: {chunks} chunks, {queries} queries, dim={PINECONE_DIMENSION}, k={top_k}")
+
+    dim = PINECONE_DIMENSION
+    corpus = make_embeddings(chunks, dim)
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, chunks, size=queries)
+    query_vectors = corpus[picks] + 0.02 * rng.normal(size=(queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    # Ground truth from exact float32 search
+    exact_scores = query_vectors @ corpus.T
+    truth = [set(np.argsort(-row)[:top_k]) for row in exact_scores]
+    ids = [str(i) for i in range(chunks)]
+    metadatas = [{} for _ in range(chunks)]
+
+    print(f"{'mode':<10}{'recall@k':>10}{'ms/query':>10}{'index MB/1M':>14}{'side store MB/1M':>18}")
+    for mode in ("none", "int8", "binary", "truncate"):
+        with tempfile.TemporaryDirectory() as root:
+            store = LocalVectorStore(
+                root=root,
+                dim=dim,
+                quantization=mode,
+                truncate_dim=VECTOR_TRUNCATE_DIM,
+                rescore_multiplier=rescore_multiplier
+            )
+            for start in range(0, chunks, 1000):
+                store.upsert("bench", ids[start:start + 1000], corpus[start:start + 1000], metadatas[start:start + 1000])
+
+            hits = 0
+            start = time.perf_counter()
+            for qi, vector in enumerate(query_vectors):
+                matches = store.query("bench", vector, top_k)
+                hits += len(truth[qi] & {int(m["id"]) for m in matches})
+            elapsed_ms = (time.perf_counter() - start) * 1000 / queries
+            store.delete_namespace("bench")
+
+        index_mb = bytes_per_vector(mode, dim) * 1_000_000 / 1e6
+        side_mb = 0 if mode == "none" else dim * 4 * 1_000_000 / 1e6
+        print(f"{mode:<10}{hits / (queries * top_k):>10.3f}{elapsed_ms:>10.2f}{index_mb:>14.0f}{side_mb:>18.0f}")
+
+    print(f"\nRescore shortlist = top_k x {rescore_multiplier}, truncate dim = {VECTOR_TRUNCATE_DIM}.")
+    print("Index MB is the first-stage matrix scanned per query; the side store is only")
+    print("touched for shortlisted rows, so it can live on disk / page cache.")
+
+
+# ==================== SERIALIZATION ====================
+
+def make_chat_rows(messages: int):
+    """A chat row and its message rows, shaped like the projected Mongo results"""
+    start = datetime(2025, 1, 1)
+    chat = {"_id": "65f0c0ffee0000000000abcd", "user_id": "user-1", "title": "Master services agreement",
+            "prompt_template": "legal_assistant", "created_at": start, "updated_at": start, "is_active": True}
+    rows = [
+        {"_id": f"65f0c0ffee{i:014d}", "chat_id": chat["_id"], "role": "user" if i % 2 == 0 else "assistant",
+         "content": "The indemnification clause in section 12 survives termination. " * 8,
+         "sources": [1, 4, 7] if i % 2 else [], "created_at": start + timedelta(seconds=i, microseconds=123000)}
+        for i in range(messages)
+    ]
+    return chat, rows
+
+
+async def legacy_history_body(chat: dict, rows: list, field) -> bytes:
+    """Previous path: validated field-by-field models, FastAPI re-validation, stdlib JSON"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    model = ChatHistoryResponse(
+        chat=ChatResponse(
+            id=chat["_id"], user_id=chat["user_id"], title=chat["title"],
+            prompt_template=chat["prompt_template"], created_at=chat["created_at"],
+            updated_at=chat["updated_at"], is_active=chat["is_active"]
+        ),
+        messages=[
+            MessageResponse(
+                id=msg["_id"], chat_id=msg["chat_id"], role=msg["role"], content=msg["content"],
+                sources=msg["sources"], created_at=msg["created_at"]
+            )
+            for msg in rows
+        ]
+    )
+    content = await serialize_response(field=field, response_content=model)
+    return JSONResponse(content).body
+
+
+def trusted_history_body(chat: dict, rows: list) -> bytes:
+    """Current path: trusted rows mapped straight to the response shape, serialized once with orjson"""
+    from fastapi.responses import ORJSONResponse
+
+    return ORJSONResponse({
+        "chat": chat_to_dict(chat),
+        "messages": [message_to_dict(msg) for msg in rows],
+        "next_cursor": None
+    }).body
+
+
+def benchmark_serialization(messages: int, repeat: int):
+    """Time building and serializing the /chats/{chat_id} response body"""
+    from fastapi.utils import create_model_field
+
+    log_header(f"/chats/{{chat_id}} serialization: {messages} messages, {repeat} runs")
+
+    chat, rows = make_chat_rows(messages)
+    field = create_model_field(name="Response_get_chat_history", type_=ChatHistoryResponse, mode="serialization")
+
+    legacy = asyncio.run(legacy_history_body(chat, rows, field))
+    trusted = trusted_history_body(chat, rows)
+    assert json.loads(legacy) == json.loads(trusted), "Serialized bodies differ"
+
+    async def time_legacy():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await legacy_history_body(chat, rows, field)
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    legacy_ms = asyncio.run(time_legacy())
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        trusted_history_body(chat, rows)
+    trusted_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    print(f"{'path':<34}{'ms/response':>12}{'body KB':>10}")
+    print(f"{'validate + re-validate + json':<34}{legacy_ms:>12.2f}{len(legacy) / 1024:>10.1f}")
+    print(f"{'rows -> dict + orjson':<34}{trusted_ms:>12.2f}{len(trusted) / 1024:>10.1f}")
+    print(f"\nSpeed-up: {legacy_ms / trusted_ms:.1f}x (bodies are identical JSON)")
+
+
+# ==================== COMPRESSION ====================
+
+# Sentences shuffled into message bodies, so the payload is varied prose
+# rather than one repeated line (which would flatter every compressor)
+LEGAL_SENTENCES = (
+    "The indemnification clause in section 12 survives termination of this agreement.",
+    "Either party may terminate for convenience on ninety days written notice.",
+    "Liability is capped at the fees paid in the twelve months preceding the claim.",
+    "Confidential information excludes material already in the public domain.",
+    "The licensee shall not sublicense the software without prior written consent.",
+    "Disputes are referred to arbitration seated in Mumbai under the 1996 Act.",
+    "Payment is due within thirty days of a correctly issued tax invoice.",
+    "A force majeure event suspends performance only for as long as it continues.",
+    "The warranty period runs for six months from the date of acceptance.",
+    "Any amendment must be in writing and signed by authorised representatives.",
+    "Section 7(b) limits assignment to affiliates that assume every obligation.",
+    "Late payments accrue interest at 1.5% per month or the maximum lawful rate.",
+    "Clause 4.2 requires the vendor to maintain insurance of at least INR 5 crore.",
+    "The non-solicitation covenant lasts eighteen months after the term ends.",
+    "Notices are deemed received two business days after dispatch by courier.",
+    "In my reading, the termination right in clause 9 is broader than in the draft."
+)
+
+
+def make_prose(rng: random.Random, sentences: int) -> str:
+    return " ".join(rng.choice(LEGAL_SENTENCES) for _ in range(sentences))
+
+
+def make_history_payloads(messages: int, seed: int = 0) -> Tuple[bytes, bytes]:
+    """(/chats/{chat_id} body, /search body) with varied message and chunk text"""
+    from fastapi.responses import ORJSONResponse
+
+    rng = random.Random(seed)
+    chat, rows = make_chat_rows(messages)
+    for row in rows:
+        row["content"] = make_prose(rng, rng.randint(2, 6) if row["role"] == "user" else rng.randint(6, 14))
+    history = trusted_history_body(chat, rows)
+    # top_k=10 chunks of ~CHUNK_SIZE characters
+    search = ORJSONResponse({
+        "status": "success",
+        "results": [
+            {"content": make_prose(rng, 12), "page": rng.randint(1, 40), "source": "msa_2025.pdf"}
+            for _ in range(10)
+        ],
+        "total": 10
+    }).body
+    return history, search
+
+
+async def serve_through_middleware(app, body: bytes, accept_encoding: str) -> Tuple[dict, bytes]:
+    """Run one GET through an ASGI app; (response headers, body bytes)"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    }
+    await app(scope, receive, send)
+    headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    return headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def benchmark_compression(message_counts: List[int], repeat: int, bandwidths_mbps=(1.5, 10, 50)):
+    """Payload size and end-to-end time of history / search responses per encoding"""
+    import gzip
+
+    import brotli
+    from fastapi.responses import Response
+    from compression import CompressionMiddleware
+
+    payloads = []
+    for messages in message_counts:
+        history, search = make_history_payloads(messages)
+        payloads.append((f"/chats/{{id}} {messages} msgs", history))
+    payloads.append(("/search top_k=10", search))
+
+    decoders = {"identity": lambda data: data, "gzip": gzip.decompress, "br": brotli.decompress}
+
+    for name, body in payloads:
+        log_header(f"{name}: {len(body) / 1024:.1f} KB JSON")
+
+        async def app(scope, receive, send):
+            await Response(body, media_type="application/json")(scope, receive, send)
+
+        middleware = CompressionMiddleware(app)
+        print(f"{'encoding':<10}{'KB':>8}{'ratio':>7}{'server ms':>11}{'decode ms':>11}"
+              + "".join(f"{f'e2e @{mbps:g}Mbps':>15}" for mbps in bandwidths_mbps))
+
+        for encoding in ("identity", "gzip", "br"):
+            headers, wire = asyncio.run(serve_through_middleware(middleware, body, encoding))
+            assert headers.get("content-encoding", "identity") == encoding
+            assert decoders[encoding](wire) == body, "Round trip changed the body"
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                asyncio.run(serve_through_middleware(middleware, body, encoding))
+            server_ms = (time.perf_counter() - start) * 1000 / repeat
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                decoders[encoding](wire)
+            decode_ms = (time.perf_counter() - start) * 1000 / repeat
+
+            # Transfer time at the link rate; latency is the same for every encoding
+            e2e = [server_ms + len(wire) * 8 / (mbps * 1000) + decode_ms for mbps in bandwidths_mbps]
+            print(f"{encoding:<10}{len(wire) / 1024:>8.1f}{len(body) / len(wire):>6.1f}x{server_ms:>11.2f}"
+                  f"{decode_ms:>11.2f}" + "".join(f"{ms:>13.1f}ms" for ms in e2e))
+
+    print("\nserver ms is the middleware round trip (compression included), e2e adds the")
+    print("transfer at each link rate and client-side decoding. Bodies under")
+    print("COMPRESSION_MIN_BYTES are sent as is.")
+
+
+# ==================== STARTUP ====================
+
+# Heavy SDKs that `import main` must not load; they come in with the RAG
+# pipeline in the worker lifespan, or on first use
+LAZY_MODULES = (
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langchain_cohere",
+    "langchain_google_genai",
+    "langchain_text_splitters",
+    "cohere",
+    "pinecone",
+    "pypdf",
+)
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+
+def measure_import_time(module: str = "main") -> Tuple[float, List[Tuple[float, str]], List[str]]:
+    """
+    Import `module` in a fresh interpreter under `python -X importtime`.
+
+    Returns (cumulative ms for the module, [(ms, name)] of its direct
+    imports, LAZY_MODULES that ended up loaded anyway).
+    """
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    total_ms, children, pending = None, [], []
+    # Lines look like "import time: self [us] | cumulative | <2 spaces per level>name",
+    # and a module's imports are listed before the module itself
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        ms = int(cumulative) / 1000
+        if depth == 1:
+            pending.append((ms, name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                total_ms, children = ms, pending
+            pending = []
+    if total_ms is None:
+        raise RuntimeError(f"No importtime entry for {module!r}:\n{result.stderr[-2000:]}")
+
+    leaked = [name for name in result.stdout.strip().split(",") if name]
+    return total_ms, sorted(children, reverse=True), leaked
+
+
+def benchmark_startup(runs: int, budget_ms: float) -> bool:
+    """Cold `import main` cost (best of `runs`); False when over budget or a heavy SDK loads eagerly"""
+    log_header(f"Cold start: python -X importtime -c 'import main' (best of {runs})")
+
+    measurements = [measure_import_time("main") for _ in range(runs)]
+    total_ms, children, leaked = min(measurements, key=lambda m: m[0])
+
+    print(f"{'import':<34}{'ms':>10}")
+    for ms, name in children[:10]:
+        print(f"{name:<34}{ms:>10.1f}")
+    print(f"{'main (cumulative)':<34}{total_ms:>10.1f}")
+    print(f"\nBudget: {budget_ms:.0f} ms")
+
+    ok = True
+    if total_ms > budget_ms:
+        print(f"❌ import main took {total_ms:.0f} ms, over the {budget_ms:.0f} ms budget")
+        ok = False
+    if leaked:
+        print(f"❌ Loaded at import time (should be lazy): {', '.join(leaked)}")
+        ok = False
+    if ok:
+        print("✅ Within budget")
+    return ok
+
+
+# ==================== MAIN ====================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="LegalEagle performance benchmarks")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    quant = sub.add_parser("quantization", help="Recall and memory of vector quantization modes")
+    quant.add_argument("--chunks", type=int, default=20000)
+    quant.add_argument("--queries", type=int, default=200)
+    quant.add_argument("--top-k", type=int, default=5)
+    quant.add_argument("--rescore-multiplier", type=int, default=VECTOR_RESCORE_MULTIPLIER)
+
+    serial = sub.add_parser("serialization", help="/chats/{chat_id} response build + JSON time")
+    serial.add_argument("--messages", type=int, default=1000)
+    serial.add_argument("--repeat", type=int, default=50)
+
+    startup = sub.add_parser("startup", help="Cold import cost of the app; fails over budget")
+    startup.add_argument("--runs", type=int, default=3)
+    startup.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+
+    compress = sub.add_parser("compression", help="gzip/brotli size and end-to-end time of history responses")
+    compress.add_argument("--messages", type=int, nargs="+", default=[50, 200, 1000])
+    compress.add_argument("--repeat", type=int, default=20)
+
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "quantization":
+        benchmark_quantization(args.chunks, args.queries, args.top_k, args.rescore_multiplier)
+    elif args.benchmark == "serialization":
+        benchmark_serialization(args.messages, args.repeat)
+    elif args.benchmark == "startup":
+        return 0 if benchmark_startup(args.runs, args.budget_ms) else 1
+    elif args.benchmark == "compression":
+        benchmark_compression(args.messages, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
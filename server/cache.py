@@ -0,0 +1,128 @@
+"""
+In-process caches for hot MongoDB records.
+
+RecordCache is a per-worker TTL cache. On top of it, request_scope() opens a
+per-request memo (a contextvar) so a record is read at most once per request,
+even when the TTL cache is disabled or an entry expires mid-request.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Hashable, Optional
+
+from cachetools import TTLCache
+
+from metrics import CACHE_LOOKUPS
+
+
+# Per-request memo: {(cache name, key): record}. None outside a request scope.
+_request_memo: ContextVar[Optional[dict]] = ContextVar("request_memo", default=None)
+
+
+@contextmanager
+def request_scope():
+    """Memoize record reads for the duration of one request"""
+    token = _request_memo.set({})
+    try:
+        yield
+    finally:
+        _request_memo.reset(token)
+
+
+class RecordCache:
+    """
+    TTL cache of Mongo records keyed by id.
+
+    Callers always get a shallow copy, so mutating a returned record never
+    changes what other requests see. Writers keep entries fresh with set()
+    (write-through), update() or invalidate().
+    
+    When records are keyed by something other than their _id (users by
+    user_id), id_field="_id" keeps an _id -> key map so change-stream events,
+    which only carry the _id, can still find the entry (key_for_id).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        maxsize: int = 10000,
+        timer: Callable[[], float] = time.monotonic,
+        id_field: Optional[str] = None
+    ):
+        self.name = name
+        self.enabled = ttl > 0 and maxsize > 0
+        self._cache = TTLCache(maxsize=max(maxsize, 1), ttl=max(ttl, 1e-9), timer=timer)
+        self.id_field = id_field
+        self._keys_by_id = TTLCache(maxsize=max(maxsize, 1), ttl=max(ttl, 1e-9), timer=timer)
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = CACHE_LOOKUPS.labels(name, "hit")
+        self._miss_counter = CACHE_LOOKUPS.labels(name, "miss")
+
+    def _memo(self) -> Optional[dict]:
+        return _request_memo.get()
+
+    def peek(self, key: Hashable) -> Optional[dict]:
+        """Cached record without copying or counting (for writers)"""
+        memo = self._memo()
+        if memo is not None and (self.name, key) in memo:
+            return memo[(self.name, key)]
+        return self._cache.get(key) if self.enabled else None
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        """Cached copy of a record, or None on a miss"""
+        record = self.peek(key)
+        if record is None:
+            self.misses += 1
+            self._miss_counter.inc()
+            return None
+        self.hits += 1
+        self._hit_counter.inc()
+        memo = self._memo()
+        if memo is not None:
+            memo[(self.name, key)] = record
+        return dict(record)
+
+    def set(self, key: Hashable, record: dict):
+        """Store a freshly read or written record"""
+        record = dict(record)
+        memo = self._memo()
+        if memo is not None:
+            memo[(self.name, key)] = record
+        if self.enabled:
+            self._cache[key] = record
+            if self.id_field and record.get(self.id_field) is not None:
+                self._keys_by_id[record[self.id_field]] = key
+
+    def key_for_id(self, doc_id: Hashable) -> Optional[Hashable]:
+        """Cache key of the record with this id_field value, if it was cached"""
+        return self._keys_by_id.get(doc_id)
+
+    def update(self, key: Hashable, changes: dict):
+        """Apply field changes to a cached record (no-op if it is not cached)"""
+        record = self.peek(key)
+        if record is not None:
+            self.set(key, {**record, **changes})
+
+    def invalidate(self, key: Hashable):
+        """Drop a record from the TTL cache and the current request's memo"""
+        memo = self._memo()
+        if memo is not None:
+            memo.pop((self.name, key), None)
+        self._cache.pop(key, None)
+
+    def clear(self):
+        self._cache.clear()
+        self._keys_by_id.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,201 @@
+"""
+Negotiated response compression (brotli or gzip).
+
+Chat histories and search results are large and mostly legal prose, which
+compresses 5-10x; on a mobile connection the transfer saved is worth far
+more than the few milliseconds spent compressing. CompressionMiddleware
+picks the encoding from Accept-Encoding (brotli preferred, then gzip),
+leaves bodies under COMPRESSION_MIN_BYTES alone (headers and CPU would cost
+more than they save), and skips responses that are already encoded or not
+compressible (images, archives).
+
+Brotli needs the optional `brotli` package; without it only gzip is offered.
+"""
+
+import zlib
+from typing import List, Optional
+
+from config import COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the install
+    brotli = None
+
+
+# Content types worth compressing (prefix match)
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str, brotli_available: bool = brotli is not None) -> Optional[str]:
+    """
+    "br", "gzip" or None for an Accept-Encoding header value. Codings with
+    q=0 are refused; among the rest brotli wins (smaller at similar cost).
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip()] = q
+
+    def allowed(coding: str) -> bool:
+        return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+    if brotli_available and allowed("br"):
+        return "br"
+    if allowed("gzip"):
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Incremental compressor for one response body"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31: gzip container
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware: compress responses for clients that accept br/gzip"""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_BYTES,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.minimum_size <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+        # Body of a response with a known length, collected to compress in one go
+        buffered: Optional[List[bytes]] = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough, buffered
+
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows the size
+                start_message = {**message, "headers": list(message.get("headers", []))}
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if buffered is not None:
+                buffered.append(body)
+                if not more_body:
+                    await self._send_whole(send, start_message, compressor.finish(b"".join(buffered)))
+                return
+
+            if compressor is None:
+                headers = {k.lower(): v for k, v in start_message["headers"]}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+                # Responses passed through BaseHTTPMiddleware arrive in chunks
+                # but keep their Content-Length, which is the size to judge by
+                size = int(headers[b"content-length"]) if b"content-length" in headers else None
+                if size is None and not more_body:
+                    size = len(body)
+                if (
+                    b"content-encoding" in headers
+                    or start_message["status"] in (204, 206, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or (size is not None and size < self.minimum_size)
+                ):
+                    passthrough = True
+                    if content_type.startswith(COMPRESSIBLE_TYPES):
+                        self._add_vary(start_message)
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                response_headers = [
+                    (k, v) for k, v in start_message["headers"]
+                    if k.lower() not in (b"content-length", b"etag")
+                ]
+                etag = headers.get(b"etag")
+                if etag is not None:
+                    # The bytes differ from the identity body, so the tag can only be weak
+                    response_headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+                response_headers.append((b"content-encoding", encoding.encode()))
+                start_message["headers"] = response_headers
+                self._add_vary(start_message)
+
+                if more_body and size is not None:
+                    buffered = [body]
+                    return
+                if not more_body:
+                    await self._send_whole(send, start_message, compressor.finish(body))
+                    return
+                # Streaming: chunked transfer, each chunk flushed as it comes
+                await send(start_message)
+
+            if more_body:
+                await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    async def _send_whole(send, start_message, compressed: bytes):
+        start_message["headers"].append((b"content-length", str(len(compressed)).encode()))
+        await send(start_message)
+        await send({"type": "http.response.body", "body": compressed})
+
+    @staticmethod
+    def _add_vary(start_message):
+        """Caches must key compressible responses by Accept-Encoding"""
+        headers = start_message["headers"]
+        for i, (name, value) in enumerate(headers):
+            if name.lower() == b"vary":
+                if b"accept-encoding" not in value.lower():
+                    headers[i] = (name, value + b", Accept-Encoding")
+                return
+        headers.append((b"vary", b"Accept-Encoding"))
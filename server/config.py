@@ -1,86 +1,225 @@
-import os
-import sys
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# API Keys (Required - must be set in environment)
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-COHERE_API_KEY = os.getenv("COHERE_API_KEY")
-MONGODB_URI = os.getenv("MONGODB_URI")
-
-# Razorpay Configuration (Required for payments)
-RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
-RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
-
-# Pinecone Configuration (Required)
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "legaleagle")
-PINECONE_HOST = os.getenv("PINECONE_HOST")
-
-
-# Validate required environment variables
-def validate_env():
-    """Validate that all required environment variables are set"""
-    required_vars = {
-        "GOOGLE_API_KEY": GOOGLE_API_KEY,
-        "PINECONE_API_KEY": PINECONE_API_KEY,
-        "COHERE_API_KEY": COHERE_API_KEY,
-        "MONGODB_URI": MONGODB_URI,
-        "RAZORPAY_KEY_ID": RAZORPAY_KEY_ID,
-        "RAZORPAY_KEY_SECRET": RAZORPAY_KEY_SECRET,
-        "PINECONE_HOST": PINECONE_HOST,
-    }
-    
-    missing = [name for name, value in required_vars.items() if not value]
-    
-    if missing:
-        print("❌ Missing required environment variables:")
-        for var in missing:
-            print(f"   - {var}")
-        print("\n📝 Please set these in your .env file or environment")
-        print("   See .env.example for reference")
-        sys.exit(1)
-
-
-# Run validation on import (will exit if missing vars)
-validate_env()
-
-# Pricing Configuration (can be overridden via env)
-FREE_CHAT_LIMIT = int(os.getenv("FREE_CHAT_LIMIT", "2"))
-FREE_DOCUMENT_LIMIT = int(os.getenv("FREE_DOCUMENT_LIMIT", "2"))
-PREMIUM_PRICE_INR = int(os.getenv("PREMIUM_PRICE_INR", "49900"))  # ₹499 in paise
-PREMIUM_QUERIES_LIMIT = int(os.getenv("PREMIUM_QUERIES_LIMIT", "-1"))  # -1 = unlimited
-
-# Pinecone additional config
-PINECONE_DIMENSION = int(os.getenv("PINECONE_DIMENSION", "1024"))
-PINECONE_METRIC = os.getenv("PINECONE_METRIC", "cosine")
-
-# MongoDB Configuration
-MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "legaleagle")
-MONGODB_CHATS_COLLECTION = os.getenv("MONGODB_CHATS_COLLECTION", "chats")
-MONGODB_MESSAGES_COLLECTION = os.getenv("MONGODB_MESSAGES_COLLECTION", "messages")
-MONGODB_DOCUMENTS_COLLECTION = os.getenv("MONGODB_DOCUMENTS_COLLECTION", "documents")
-MONGODB_USERS_COLLECTION = os.getenv("MONGODB_USERS_COLLECTION", "users")
-MONGODB_PAYMENTS_COLLECTION = os.getenv("MONGODB_PAYMENTS_COLLECTION", "payments")
-
-# Embedding Model
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-english-v3.0")
-
-# LLM Configuration
-LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
-LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.3"))
-
-# Document Processing
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
-CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
-
-# Server Configuration
-PORT = int(os.getenv("PORT", "8000"))
-HOST = os.getenv("HOST", "0.0.0.0")
-
-# CORS Configuration - comma separated origins for production
-CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
-
-# Debug mode
-DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# API Keys (Required - must be set in environment)
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+MONGODB_URI = os.getenv("MONGODB_URI")
+
+# Razorpay Configuration (Required for payments)
+RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
+RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+
+# Pinecone Configuration (Required for the pinecone vector backend)
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "legaleagle")
+PINECONE_HOST = os.getenv("PINECONE_HOST")
+
+# Vector Store Backend - "pinecone" (hosted) or "local" (memory-mapped NumPy files)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+
+# Payment Gateway Backend - "razorpay" or "fake" (in-memory, for tests and offline dev)
+PAYMENT_GATEWAY_BACKEND = os.getenv("PAYMENT_GATEWAY_BACKEND", "razorpay").lower()
+
+
+# Validate required environment variables
+def validate_env():
+    """Validate that all required environment variables are set"""
+    required_vars = {
+        "GOOGLE_API_KEY": GOOGLE_API_KEY,
+        "COHERE_API_KEY": COHERE_API_KEY,
+        "MONGODB_URI": MONGODB_URI,
+    }
+    
+    # Razorpay credentials are only needed for the real gateway
+    if PAYMENT_GATEWAY_BACKEND == "razorpay":
+        required_vars["RAZORPAY_KEY_ID"] = RAZORPAY_KEY_ID
+        required_vars["RAZORPAY_KEY_SECRET"] = RAZORPAY_KEY_SECRET
+    
+    # Pinecone credentials are only needed when it is the vector backend
+    if VECTOR_STORE_BACKEND == "pinecone":
+        required_vars["PINECONE_API_KEY"] = PINECONE_API_KEY
+        required_vars["PINECONE_HOST"] = PINECONE_HOST
+    
+    missing = [name for name, value in required_vars.items() if not value]
+    
+    if missing:
+        print("❌ Missing required environment variables:")
+        for var in missing:
+            print(f"   - {var}")
+        print("\n📝 Please set these in your .env file or environment")
+        print("   See .env.example for reference")
+        sys.exit(1)
+
+
+# Run validation on import (will exit if missing vars)
+validate_env()
+
+# Pricing Configuration (can be overridden via env)
+FREE_CHAT_LIMIT = int(os.getenv("FREE_CHAT_LIMIT", "2"))
+FREE_DOCUMENT_LIMIT = int(os.getenv("FREE_DOCUMENT_LIMIT", "2"))
+PREMIUM_PRICE_INR = int(os.getenv("PREMIUM_PRICE_INR", "49900"))  # ₹499 in paise
+PREMIUM_QUERIES_LIMIT = int(os.getenv("PREMIUM_QUERIES_LIMIT", "-1"))  # -1 = unlimited
+
+# Payment gateway HTTP client (one pooled keep-alive client per process)
+RAZORPAY_API_URL = os.getenv("RAZORPAY_API_URL", "https://api.razorpay.com/v1")
+PAYMENT_TIMEOUT_SECONDS = float(os.getenv("PAYMENT_TIMEOUT_SECONDS", "10"))
+PAYMENT_CONNECT_TIMEOUT_SECONDS = float(os.getenv("PAYMENT_CONNECT_TIMEOUT_SECONDS", "3"))
+PAYMENT_MAX_RETRIES = int(os.getenv("PAYMENT_MAX_RETRIES", "2"))
+PAYMENT_MAX_CONNECTIONS = int(os.getenv("PAYMENT_MAX_CONNECTIONS", "20"))
+
+# Pinecone additional config
+PINECONE_DIMENSION = int(os.getenv("PINECONE_DIMENSION", "1024"))
+PINECONE_METRIC = os.getenv("PINECONE_METRIC", "cosine")
+PINECONE_UPSERT_BATCH_SIZE = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "100"))
+
+# Local vector store config (used when VECTOR_STORE_BACKEND=local)
+LOCAL_VECTOR_STORE_DIR = os.getenv("LOCAL_VECTOR_STORE_DIR", "data/vectors")
+LOCAL_VECTOR_INITIAL_CAPACITY = int(os.getenv("LOCAL_VECTOR_INITIAL_CAPACITY", "256"))
+# Reduced-precision first-stage search: none, int8, binary or truncate
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+VECTOR_TRUNCATE_DIM = int(os.getenv("VECTOR_TRUNCATE_DIM", "256"))
+# Candidates rescored at full precision = top_k * multiplier
+VECTOR_RESCORE_MULTIPLIER = int(os.getenv("VECTOR_RESCORE_MULTIPLIER", "4"))
+
+# MongoDB Configuration
+MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "legaleagle")
+MONGODB_CHATS_COLLECTION = os.getenv("MONGODB_CHATS_COLLECTION", "chats")
+MONGODB_MESSAGES_COLLECTION = os.getenv("MONGODB_MESSAGES_COLLECTION", "messages")
+MONGODB_DOCUMENTS_COLLECTION = os.getenv("MONGODB_DOCUMENTS_COLLECTION", "documents")
+MONGODB_USERS_COLLECTION = os.getenv("MONGODB_USERS_COLLECTION", "users")
+MONGODB_PAYMENTS_COLLECTION = os.getenv("MONGODB_PAYMENTS_COLLECTION", "payments")
+MONGODB_MESSAGE_BUCKETS_COLLECTION = os.getenv("MONGODB_MESSAGE_BUCKETS_COLLECTION", "message_buckets")
+MONGODB_MIGRATIONS_COLLECTION = os.getenv("MONGODB_MIGRATIONS_COLLECTION", "schema_migrations")
+MONGODB_ARCHIVES_COLLECTION = os.getenv("MONGODB_ARCHIVES_COLLECTION", "chat_archives")
+
+# Startup schema check (migrations are applied with `python migrations.py up`):
+# "warn" checks in the background and logs, "strict" refuses to start when
+# the database is behind, "off" skips the check
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "warn").lower()
+
+# Message storage: "documents" (one document per message) or "buckets"
+# (fixed-size bucket documents per chat; migrate with migrate_messages.py)
+MESSAGE_STORAGE = os.getenv("MESSAGE_STORAGE", "documents").lower()
+MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "50"))
+
+# Embedding Model
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-english-v3.0")
+
+# LLM Configuration
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.3"))
+
+# Model Routing - short factual lookups go to the fast model, analyses to the strong one
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gemini-2.5-flash-lite")
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", LLM_MODEL)
+LLM_FAST_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_FAST_MAX_OUTPUT_TOKENS", "512"))
+ROUTER_FAST_MAX_QUERY_CHARS = int(os.getenv("ROUTER_FAST_MAX_QUERY_CHARS", "160"))
+ROUTER_FAST_MAX_CONTEXT_CHARS = int(os.getenv("ROUTER_FAST_MAX_CONTEXT_CHARS", "6000"))
+ROUTER_FAST_MAX_CLAUSES = int(os.getenv("ROUTER_FAST_MAX_CLAUSES", "2"))
+# Templates that always need the strong model (comma separated)
+ROUTER_STRONG_TEMPLATES = [
+    t.strip() for t in os.getenv(
+        "ROUTER_STRONG_TEMPLATES",
+        "contract_reviewer,compliance_checker,case_analyzer,legal_drafter,legal_summarizer,legal_researcher"
+    ).split(",") if t.strip()
+]
+
+# Cross-chat search (/search/user) fan-out limits
+SEARCH_FANOUT_CONCURRENCY = int(os.getenv("SEARCH_FANOUT_CONCURRENCY", "8"))
+SEARCH_FANOUT_MAX_CHATS = int(os.getenv("SEARCH_FANOUT_MAX_CHATS", "200"))
+
+# Largest page size accepted by paginated list endpoints (/chats, /chats/{id})
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+# In-process record cache for chats and users (TTL 0 disables a cache)
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "10"))
+RECORD_CACHE_MAX_ENTRIES = int(os.getenv("RECORD_CACHE_MAX_ENTRIES", "10000"))
+# Cross-worker invalidation of those caches: "changestream" (needs a replica
+# set; falls back to TTL expiry on a standalone mongod) or "off"
+CACHE_INVALIDATION = os.getenv("CACHE_INVALIDATION", "changestream").lower()
+CACHE_INVALIDATION_RETRY_SECONDS = float(os.getenv("CACHE_INVALIDATION_RETRY_SECONDS", "5"))
+
+# Write-behind usage counters (query_count): flushed in bulk this often,
+# or sooner once this many users have pending increments
+COUNTER_FLUSH_SECONDS = float(os.getenv("COUNTER_FLUSH_SECONDS", "5"))
+COUNTER_MAX_PENDING_USERS = int(os.getenv("COUNTER_MAX_PENDING_USERS", "5000"))
+
+# Background chat deletion (DELETE /chats/{id} tombstones, the deleter purges)
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", "1000"))
+DELETION_POLL_SECONDS = float(os.getenv("DELETION_POLL_SECONDS", "30"))
+DELETION_LEASE_SECONDS = float(os.getenv("DELETION_LEASE_SECONDS", "300"))
+DELETION_RETRY_BASE_SECONDS = float(os.getenv("DELETION_RETRY_BASE_SECONDS", "5"))
+DELETION_RETRY_MAX_SECONDS = float(os.getenv("DELETION_RETRY_MAX_SECONDS", "600"))
+
+# Cold archive (`python archive.py run`): chats idle this long move to zstd
+# transcript blobs and are rehydrated when opened
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_MESSAGES_PER_BLOB = int(os.getenv("ARCHIVE_MESSAGES_PER_BLOB", "1000"))
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "10"))
+
+# Document Processing
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+# Server Configuration
+PORT = int(os.getenv("PORT", "8000"))
+HOST = os.getenv("HOST", "0.0.0.0")
+
+# Multi-process serving (serve.py): worker processes, seconds in-flight
+# requests get on shutdown/restart, and requests after which a worker is
+# recycled (0 = never)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30"))
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "0"))
+
+# Per-worker client pools (every worker process opens its own)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "8"))
+PINECONE_CONNECTION_POOL_SIZE = int(os.getenv("PINECONE_CONNECTION_POOL_SIZE", "16"))
+
+# Admission control (per worker): concurrent LLM queries, embedding searches
+# and ingestions (0 = uncapped), how many requests may wait for a slot and
+# for how long, and a per-user token bucket (0 = off). Beyond these, requests
+# get an immediate 429 with Retry-After.
+ADMISSION_LLM_CONCURRENCY = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "8"))
+ADMISSION_EMBED_CONCURRENCY = int(os.getenv("ADMISSION_EMBED_CONCURRENCY", "16"))
+ADMISSION_INGEST_CONCURRENCY = int(os.getenv("ADMISSION_INGEST_CONCURRENCY", "2"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+ADMISSION_USER_RATE_PER_MINUTE = float(os.getenv("ADMISSION_USER_RATE_PER_MINUTE", "30"))
+ADMISSION_USER_BURST = int(os.getenv("ADMISSION_USER_BURST", "10"))
+
+# Response compression (brotli/gzip, negotiated): bodies smaller than this
+# are sent as is (0 disables compression)
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# 0-11; 4-5 is the sweet spot for dynamic responses, 11 is for static assets
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Readiness (/health/ready): dependencies are probed in the background every
+# READINESS_INTERVAL_SECONDS and probes answer from the cached results. Only
+# READINESS_CRITICAL checks take a worker out of rotation; a result older than
+# READINESS_STALE_SECONDS counts as failed.
+READINESS_CHECKS = [
+    c.strip() for c in os.getenv("READINESS_CHECKS", "mongo,vector_store,embeddings,llm").split(",") if c.strip()
+]
+READINESS_CRITICAL = [
+    c.strip() for c in os.getenv("READINESS_CRITICAL", "mongo,vector_store").split(",") if c.strip()
+]
+READINESS_INTERVAL_SECONDS = float(os.getenv("READINESS_INTERVAL_SECONDS", "15"))
+READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", "5"))
+READINESS_STALE_SECONDS = float(os.getenv("READINESS_STALE_SECONDS", "60"))
+
+# CORS Configuration - comma separated origins for production
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
+
+# Debug mode
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
@@ -0,0 +1,73 @@
+"""
+Pytest configuration for the server tests.
+
+config.py exits when required variables are missing, so unit tests that
+never touch the real services get placeholder values here. Real values
+from the environment or .env always win.
+"""
+
+import os
+import uuid
+
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+
+for _name in (
+    "GOOGLE_API_KEY",
+    "PINECONE_API_KEY",
+    "COHERE_API_KEY",
+    "RAZORPAY_KEY_ID",
+    "RAZORPAY_KEY_SECRET",
+    "PINECONE_HOST",
+):
+    os.environ.setdefault(_name, "test")
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+
+# test_pipeline.py is an end-to-end script against a running server, not a pytest module
+collect_ignore = ["test_pipeline.py"]
+
+
+# Database tests run against a real (local) mongod and are skipped without one
+MONGODB_TEST_URI = os.getenv("MONGODB_TEST_URI", "mongodb://localhost:27017")
+
+
+@pytest.fixture
+def mongo_test_db():
+    """(uri, db_name) of a throwaway database on the test mongod; dropped afterwards"""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    
+    client = MongoClient(MONGODB_TEST_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"No MongoDB reachable at {MONGODB_TEST_URI} (set MONGODB_TEST_URI)")
+    
+    db_name = f"legaleagle_test_{uuid.uuid4().hex[:8]}"
+    try:
+        yield MONGODB_TEST_URI, db_name
+    finally:
+        client.drop_database(db_name)
+        client.close()
+
+
+@pytest.fixture
+def mongo_replset_db(mongo_test_db):
+    """
+    Like mongo_test_db, but skipped unless the test mongod is a replica set
+    (change streams). A single node is enough:
+        mongod --replSet rs0  then  mongosh --eval "rs.initiate()"
+    """
+    from pymongo import MongoClient
+    
+    client = MongoClient(MONGODB_TEST_URI, serverSelectionTimeoutMS=1000)
+    try:
+        if not client.admin.command("hello").get("setName"):
+            pytest.skip(f"MongoDB at {MONGODB_TEST_URI} is not a replica set (change streams unavailable)")
+    finally:
+        client.close()
+    return mongo_test_db
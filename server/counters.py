@@ -0,0 +1,120 @@
+"""
+Write-behind aggregation of non-gating user counters.
+
+Analytics counters such as query_count don't decide anything on the request
+path, so instead of an $inc on the user's document per request they are
+summed in memory per user and written with one unordered bulk_write every
+COUNTER_FLUSH_SECONDS (sooner once COUNTER_MAX_PENDING_USERS users are
+pending) and on shutdown. Gating counters (chat_count, document_count) stay
+synchronous in quota.py.
+
+A worker that dies without a clean shutdown loses at most one interval of
+counts; a flush that fails is merged back and retried on the next one.
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+from config import COUNTER_FLUSH_SECONDS, COUNTER_MAX_PENDING_USERS
+
+
+class CounterAggregator:
+    """Per-user counter increments buffered in memory and flushed in bulk"""
+
+    def __init__(
+        self,
+        database,
+        flush_seconds: float = COUNTER_FLUSH_SECONDS,
+        max_pending_users: int = COUNTER_MAX_PENDING_USERS
+    ):
+        self.database = database
+        self.flush_seconds = flush_seconds
+        self.max_pending_users = max_pending_users
+        self._pending: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._touched: Dict[str, datetime] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.failures = 0
+
+    def add(self, user_id: str, field: str, amount: int = 1):
+        """Count `amount` towards a user's counter (no I/O)"""
+        self._pending[user_id][field] += amount
+        self._touched[user_id] = datetime.utcnow()
+        if len(self._pending) >= self.max_pending_users:
+            self._wake.set()
+
+    def pending(self, user_id: str) -> Dict[str, int]:
+        """Increments not written yet for a user"""
+        return dict(self._pending.get(user_id, {}))
+
+    async def flush(self) -> int:
+        """Write every pending increment in one bulk_write. Returns the number of users written."""
+        if not self._pending:
+            return 0
+        pending, touched = self._pending, self._touched
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._touched = {}
+
+        operations = [
+            UpdateOne(
+                {"user_id": user_id},
+                {"$inc": dict(fields), "$max": {"updated_at": touched[user_id]}}
+            )
+            for user_id, fields in pending.items()
+        ]
+        try:
+            await self.database.users.bulk_write(operations, ordered=False)
+        except Exception:
+            # Put the counts back so the next flush retries them
+            self.failures += 1
+            for user_id, fields in pending.items():
+                for field, amount in fields.items():
+                    self._pending[user_id][field] += amount
+                self._touched[user_id] = max(touched[user_id], self._touched.get(user_id, touched[user_id]))
+            raise
+        self.flushes += 1
+        return len(operations)
+
+    def start(self):
+        """Start the periodic flush (call from the app lifespan)"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ Final counter flush failed, {len(self._pending)} users' counts lost: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Counter flush failed, retrying in {self.flush_seconds}s: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending_users": len(self._pending),
+            "flushes": self.flushes,
+            "failures": self.failures
+        }
@@ -1,472 +1,841 @@
-from datetime import datetime
-from typing import Optional, List
-from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
-from pinecone import Pinecone
-
-from config import (
-    MONGODB_URI, 
-    MONGODB_DB_NAME, 
-    MONGODB_CHATS_COLLECTION,
-    MONGODB_MESSAGES_COLLECTION,
-    MONGODB_DOCUMENTS_COLLECTION,
-    MONGODB_USERS_COLLECTION,
-    MONGODB_PAYMENTS_COLLECTION,
-    PINECONE_API_KEY,
-    PINECONE_INDEX_NAME,
-    FREE_CHAT_LIMIT,
-    FREE_DOCUMENT_LIMIT,
-    PREMIUM_QUERIES_LIMIT
-)
-
-
-class Database:
-    """MongoDB Database Handler for Chat Persistence"""
-    
-    def __init__(self):
-        self.client: Optional[AsyncIOMotorClient] = None
-        self.db = None
-        self.chats = None
-        self.messages = None
-        self.documents = None
-        self.users = None
-        self.payments = None
-        
-    async def connect(self):
-        """Connect to MongoDB"""
-        self.client = AsyncIOMotorClient(MONGODB_URI)
-        self.db = self.client[MONGODB_DB_NAME]
-        self.chats = self.db[MONGODB_CHATS_COLLECTION]
-        self.messages = self.db[MONGODB_MESSAGES_COLLECTION]
-        self.documents = self.db[MONGODB_DOCUMENTS_COLLECTION]
-        self.users = self.db[MONGODB_USERS_COLLECTION]
-        self.payments = self.db[MONGODB_PAYMENTS_COLLECTION]
-        
-        # Create indexes for better query performance
-        await self.chats.create_index("user_id")
-        await self.chats.create_index("created_at")
-        await self.messages.create_index("chat_id")
-        await self.messages.create_index("created_at")
-        await self.documents.create_index("chat_id")
-        await self.users.create_index("user_id", unique=True)
-        await self.payments.create_index("user_id")
-        await self.payments.create_index("razorpay_order_id")
-        
-        print("✅ Connected to MongoDB")
-        
-    async def disconnect(self):
-        """Disconnect from MongoDB"""
-        if self.client:
-            self.client.close()
-            print("🔌 Disconnected from MongoDB")
-    
-    # ==================== CHAT OPERATIONS ====================
-    
-    async def create_chat(
-        self, 
-        user_id: str, 
-        title: str = "New Chat",
-        prompt_template: str = "legal_assistant"
-    ) -> str:
-        """Create a new chat session"""
-        chat = {
-            "user_id": user_id,
-            "title": title,
-            "prompt_template": prompt_template,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "is_active": True
-        }
-        result = await self.chats.insert_one(chat)
-        return str(result.inserted_id)
-    
-    async def get_chat(self, chat_id: str) -> Optional[dict]:
-        """Get a single chat by ID"""
-        chat = await self.chats.find_one({"_id": ObjectId(chat_id)})
-        if chat:
-            chat["_id"] = str(chat["_id"])
-        return chat
-    
-    async def get_user_chats(self, user_id: str, limit: int = 50) -> List[dict]:
-        """Get all chats for a user"""
-        cursor = self.chats.find(
-            {"user_id": user_id, "is_active": True}
-        ).sort("updated_at", -1).limit(limit)
-        
-        chats = []
-        async for chat in cursor:
-            chat["_id"] = str(chat["_id"])
-            chats.append(chat)
-        return chats
-    
-    async def update_chat(self, chat_id: str, updates: dict) -> bool:
-        """Update chat metadata"""
-        updates["updated_at"] = datetime.utcnow()
-        result = await self.chats.update_one(
-            {"_id": ObjectId(chat_id)},
-            {"$set": updates}
-        )
-        return result.modified_count > 0
-    
-    async def delete_chat(self, chat_id: str) -> bool:
-        """
-        Delete a chat and all associated data:
-        - Messages from MongoDB
-        - Documents metadata from MongoDB
-        - Vectors from Pinecone (namespace = chat_id)
-        """
-        try:
-            # 1. Delete messages
-            await self.messages.delete_many({"chat_id": chat_id})
-            
-            # 2. Delete document metadata
-            await self.documents.delete_many({"chat_id": chat_id})
-            
-            # 3. Delete vectors from Pinecone
-            await self._delete_pinecone_namespace(chat_id)
-            
-            # 4. Delete the chat itself
-            result = await self.chats.delete_one({"_id": ObjectId(chat_id)})
-            
-            return result.deleted_count > 0
-            
-        except Exception as e:
-            print(f"Error deleting chat: {e}")
-            return False
-    
-    async def _delete_pinecone_namespace(self, namespace: str):
-        """Delete all vectors in a Pinecone namespace"""
-        try:
-            pc = Pinecone(api_key=PINECONE_API_KEY)
-            index = pc.Index(PINECONE_INDEX_NAME)
-            
-            # Delete all vectors in the namespace
-            index.delete(delete_all=True, namespace=namespace)
-            print(f"✅ Deleted Pinecone namespace: {namespace}")
-            
-        except Exception as e:
-            print(f"Error deleting Pinecone namespace: {e}")
-    
-    # ==================== MESSAGE OPERATIONS ====================
-    
-    async def add_message(
-        self, 
-        chat_id: str, 
-        role: str, 
-        content: str,
-        sources: List[int] = None,
-        metadata: dict = None
-    ) -> str:
-        """Add a message to a chat"""
-        message = {
-            "chat_id": chat_id,
-            "role": role,  # "user" or "assistant"
-            "content": content,
-            "sources": sources or [],
-            "metadata": metadata or {},
-            "created_at": datetime.utcnow()
-        }
-        result = await self.messages.insert_one(message)
-        
-        # Update chat's updated_at timestamp
-        await self.update_chat(chat_id, {})
-        
-        # Auto-generate chat title from first user message
-        if role == "user":
-            chat = await self.get_chat(chat_id)
-            if chat and chat.get("title") == "New Chat":
-                title = content[:50] + "..." if len(content) > 50 else content
-                await self.update_chat(chat_id, {"title": title})
-        
-        return str(result.inserted_id)
-    
-    async def get_chat_messages(
-        self, 
-        chat_id: str, 
-        limit: int = 100
-    ) -> List[dict]:
-        """Get all messages for a chat"""
-        cursor = self.messages.find(
-            {"chat_id": chat_id}
-        ).sort("created_at", 1).limit(limit)
-        
-        messages = []
-        async for msg in cursor:
-            msg["_id"] = str(msg["_id"])
-            messages.append(msg)
-        return messages
-    
-    async def get_chat_context(
-        self, 
-        chat_id: str, 
-        max_messages: int = 10
-    ) -> List[dict]:
-        """Get recent messages for context (for RAG)"""
-        cursor = self.messages.find(
-            {"chat_id": chat_id}
-        ).sort("created_at", -1).limit(max_messages)
-        
-        messages = []
-        async for msg in cursor:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        
-        # Reverse to get chronological order
-        return list(reversed(messages))
-    
-    # ==================== DOCUMENT OPERATIONS ====================
-    
-    async def add_document(
-        self, 
-        chat_id: str, 
-        filename: str,
-        num_chunks: int,
-        file_size: int = 0
-    ) -> str:
-        """Track uploaded documents"""
-        doc = {
-            "chat_id": chat_id,
-            "filename": filename,
-            "num_chunks": num_chunks,
-            "file_size": file_size,
-            "uploaded_at": datetime.utcnow()
-        }
-        result = await self.documents.insert_one(doc)
-        return str(result.inserted_id)
-    
-    async def get_chat_documents(self, chat_id: str) -> List[dict]:
-        """Get all documents uploaded to a chat"""
-        cursor = self.documents.find({"chat_id": chat_id})
-        
-        docs = []
-        async for doc in cursor:
-            doc["_id"] = str(doc["_id"])
-            docs.append(doc)
-        return docs
-    
-    async def delete_document(self, document_id: str, chat_id: str) -> bool:
-        """Delete a specific document from a chat"""
-        try:
-            # Get document info
-            doc = await self.documents.find_one({"_id": ObjectId(document_id)})
-            if not doc:
-                return False
-            
-            # Delete from MongoDB
-            await self.documents.delete_one({"_id": ObjectId(document_id)})
-            
-            # Note: For Pinecone, we'd need to track vector IDs per document
-            # For simplicity, we're not implementing per-document vector deletion
-            # The full namespace deletion happens on chat delete
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error deleting document: {e}")
-            return False
-
-    # ==================== USER OPERATIONS ====================
-    
-    async def get_or_create_user(self, user_id: str) -> dict:
-        """Get user or create if doesn't exist"""
-        user = await self.users.find_one({"user_id": user_id})
-        
-        if not user:
-            user = {
-                "user_id": user_id,
-                "is_premium": False,
-                "chat_count": 0,
-                "document_count": 0,
-                "query_count": 0,
-                "remaining_queries": 0,  # 0 for free users, -1 for premium (unlimited)
-                "total_payments": 0,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            await self.users.insert_one(user)
-        
-        return user
-    
-    async def get_user(self, user_id: str) -> Optional[dict]:
-        """Get user by ID"""
-        return await self.users.find_one({"user_id": user_id})
-    
-    async def increment_user_chat_count(self, user_id: str) -> dict:
-        """Increment user's chat count"""
-        result = await self.users.find_one_and_update(
-            {"user_id": user_id},
-            {
-                "$inc": {"chat_count": 1},
-                "$set": {"updated_at": datetime.utcnow()}
-            },
-            return_document=True
-        )
-        return result
-    
-    async def increment_user_document_count(self, user_id: str) -> dict:
-        """Increment user's document count"""
-        result = await self.users.find_one_and_update(
-            {"user_id": user_id},
-            {
-                "$inc": {"document_count": 1},
-                "$set": {"updated_at": datetime.utcnow()}
-            },
-            return_document=True
-        )
-        return result
-    
-    async def increment_user_query_count(self, user_id: str) -> dict:
-        """Increment user's query count (premium users have unlimited queries)"""
-        user = await self.get_user(user_id)
-        
-        update = {
-            "$inc": {"query_count": 1},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-        
-        # Premium users have unlimited queries, so we don't decrement
-        # remaining_queries will always be -1 for premium users
-        
-        result = await self.users.find_one_and_update(
-            {"user_id": user_id},
-            update,
-            return_document=True
-        )
-        
-        return result
-    
-    async def check_user_limits(self, user_id: str) -> dict:
-        """Check if user has exceeded free limits"""
-        user = await self.get_or_create_user(user_id)
-        
-        is_premium = user.get("is_premium", False)
-        chat_count = user.get("chat_count", 0)
-        document_count = user.get("document_count", 0)
-        remaining_queries = user.get("remaining_queries", 0)
-        
-        if is_premium:
-            return {
-                "can_create_chat": True,
-                "can_upload_document": True,
-                "can_query": True,  # Premium users have unlimited queries
-                "is_premium": True,
-                "chat_count": chat_count,
-                "document_count": document_count,
-                "remaining_queries": -1,  # -1 indicates unlimited
-                "chat_limit": None,
-                "document_limit": None,
-                "message": "Premium user with unlimited access"
-            }
-        
-        can_create_chat = chat_count < FREE_CHAT_LIMIT
-        can_upload = document_count < FREE_DOCUMENT_LIMIT
-        
-        # Free users can always query within their existing chats
-        # They just can't create MORE chats beyond the limit
-        return {
-            "can_create_chat": can_create_chat,
-            "can_upload_document": can_upload,
-            "can_query": True,  # Free users can always query within their chats
-            "is_premium": False,
-            "chat_count": chat_count,
-            "document_count": document_count,
-            "remaining_queries": 0,
-            "chat_limit": FREE_CHAT_LIMIT,
-            "document_limit": FREE_DOCUMENT_LIMIT,
-            "message": "Free tier limits apply"
-        }
-    
-    async def upgrade_to_premium(self, user_id: str, queries: int = PREMIUM_QUERIES_LIMIT) -> dict:
-        """Upgrade user to premium with unlimited queries"""
-        result = await self.users.find_one_and_update(
-            {"user_id": user_id},
-            {
-                "$set": {
-                    "is_premium": True,
-                    "remaining_queries": -1,  # -1 indicates unlimited
-                    "updated_at": datetime.utcnow()
-                },
-                "$inc": {
-                    "total_payments": 1
-                }
-            },
-            return_document=True
-        )
-        return result
-
-    # ==================== PAYMENT OPERATIONS ====================
-    
-    async def create_payment(
-        self,
-        user_id: str,
-        razorpay_order_id: str,
-        amount: int,
-        currency: str = "INR"
-    ) -> str:
-        """Create a payment record"""
-        payment = {
-            "user_id": user_id,
-            "razorpay_order_id": razorpay_order_id,
-            "razorpay_payment_id": None,
-            "razorpay_signature": None,
-            "amount": amount,
-            "currency": currency,
-            "status": "created",
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        result = await self.payments.insert_one(payment)
-        return str(result.inserted_id)
-    
-    async def update_payment_success(
-        self,
-        razorpay_order_id: str,
-        razorpay_payment_id: str,
-        razorpay_signature: str
-    ) -> bool:
-        """Update payment record on successful payment"""
-        result = await self.payments.update_one(
-            {"razorpay_order_id": razorpay_order_id},
-            {
-                "$set": {
-                    "razorpay_payment_id": razorpay_payment_id,
-                    "razorpay_signature": razorpay_signature,
-                    "status": "success",
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        return result.modified_count > 0
-    
-    async def update_payment_failed(self, razorpay_order_id: str, error: str = None) -> bool:
-        """Update payment record on failed payment"""
-        result = await self.payments.update_one(
-            {"razorpay_order_id": razorpay_order_id},
-            {
-                "$set": {
-                    "status": "failed",
-                    "error": error,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        return result.modified_count > 0
-    
-    async def get_payment_by_order_id(self, razorpay_order_id: str) -> Optional[dict]:
-        """Get payment by Razorpay order ID"""
-        return await self.payments.find_one({"razorpay_order_id": razorpay_order_id})
-    
-    async def get_user_payments(self, user_id: str) -> List[dict]:
-        """Get all payments for a user"""
-        cursor = self.payments.find({"user_id": user_id}).sort("created_at", -1)
-        payments = []
-        async for payment in cursor:
-            payment["_id"] = str(payment["_id"])
-            payments.append(payment)
-        return payments
-
-
-# Global database instance
-db = Database()
+import json
+import base64
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional, List, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import (
+    MONGODB_URI, 
+    MONGODB_DB_NAME, 
+    MONGODB_CHATS_COLLECTION,
+    MONGODB_MESSAGES_COLLECTION,
+    MONGODB_DOCUMENTS_COLLECTION,
+    MONGODB_USERS_COLLECTION,
+    MONGODB_PAYMENTS_COLLECTION,
+    MONGODB_MESSAGE_BUCKETS_COLLECTION,
+    MONGODB_ARCHIVES_COLLECTION,
+    MESSAGE_STORAGE,
+    MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE,
+    FREE_CHAT_LIMIT,
+    FREE_DOCUMENT_LIMIT,
+    PREMIUM_QUERIES_LIMIT,
+    CHAT_CACHE_TTL_SECONDS,
+    USER_CACHE_TTL_SECONDS,
+    RECORD_CACHE_MAX_ENTRIES
+)
+from cache import RecordCache
+from counters import CounterAggregator
+from message_buckets import MessageBuckets
+from metrics import MongoCommandMetrics
+from migrations import SCHEMA_VERSION, get_schema_version
+
+
+DEFAULT_CHAT_TITLE = "New Chat"
+
+# Fields the list/history endpoints actually return (messages skip the metadata blobs)
+CHAT_LIST_PROJECTION = {
+    "user_id": 1, "title": 1, "prompt_template": 1, "created_at": 1, "updated_at": 1, "is_active": 1
+}
+MESSAGE_PROJECTION = {"chat_id": 1, "role": 1, "content": 1, "sources": 1, "created_at": 1}
+
+
+def make_chat_title(content: str) -> str:
+    """Chat title derived from the first user message"""
+    return content[:50] + "..." if len(content) > 50 else content
+
+
+def new_user_fields(now: datetime) -> dict:
+    """Field defaults of a new (free tier) user document"""
+    return {
+        "is_premium": False,
+        "chat_count": 0,
+        "document_count": 0,
+        "query_count": 0,
+        "remaining_queries": 0,  # 0 for free users, -1 for premium (unlimited)
+        "total_payments": 0,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def mongo_time(value: datetime) -> datetime:
+    """Truncate to the millisecond precision MongoDB stores, so cached and read-back values match"""
+    return value.replace(microsecond=value.microsecond - value.microsecond % 1000)
+
+
+# ==================== PAGINATION ====================
+
+def encode_cursor(sort_value: datetime, doc_id) -> str:
+    """Opaque page cursor for the (sort_value, _id) position of the last item on a page"""
+    payload = json.dumps({"t": sort_value.isoformat(), "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a page cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def encode_position_cursor(pos: int) -> str:
+    """Opaque page cursor for bucketed messages (position of the last message on a page)"""
+    payload = json.dumps({"p": pos}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_position_cursor(cursor: str) -> int:
+    """Decode a bucketed-message cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))["p"])
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_filter(field: str, cursor: Optional[str], descending: bool) -> dict:
+    """
+    Filter selecting everything after a cursor in (field, _id) order.
+    The range on `field` keeps the index scan bounded; _id only breaks ties.
+    """
+    if not cursor:
+        return {}
+    sort_value, doc_id = decode_cursor(cursor)
+    if descending:
+        return {field: {"$lte": sort_value}, "$or": [{field: {"$lt": sort_value}}, {"_id": {"$lt": doc_id}}]}
+    return {field: {"$gte": sort_value}, "$or": [{field: {"$gt": sort_value}}, {"_id": {"$gt": doc_id}}]}
+
+
+class Database:
+    """MongoDB Database Handler for Chat Persistence"""
+    
+    def __init__(
+        self,
+        uri: str = MONGODB_URI,
+        db_name: str = MONGODB_DB_NAME,
+        message_storage: str = MESSAGE_STORAGE
+    ):
+        self.uri = uri
+        self.db_name = db_name
+        self.bucketed = message_storage == "buckets"
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db = None
+        self.chats = None
+        self.messages = None
+        self.documents = None
+        self.users = None
+        self.payments = None
+        self.message_buckets: Optional[MessageBuckets] = None
+        self.archives = None
+        
+        # Hot chat/user records, kept fresh by this class's writes
+        self.chat_cache = RecordCache("chat", CHAT_CACHE_TTL_SECONDS, RECORD_CACHE_MAX_ENTRIES)
+        self.user_cache = RecordCache("user", USER_CACHE_TTL_SECONDS, RECORD_CACHE_MAX_ENTRIES, id_field="_id")
+        # Non-gating usage counters, written behind in bulk
+        self.counters = CounterAggregator(self)
+        
+    async def connect(self, **client_options):
+        """
+        Connect to MongoDB (extra options are passed to the Motor client).
+        Call from the worker's lifespan: a client must not cross a fork.
+        """
+        options = {
+            "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+            "minPoolSize": MONGODB_MIN_POOL_SIZE,
+            # Per-command latency histograms for /metrics
+            "event_listeners": [MongoCommandMetrics()],
+            **client_options
+        }
+        self.client = AsyncIOMotorClient(self.uri, **options)
+        self.db = self.client[self.db_name]
+        self.chats = self.db[MONGODB_CHATS_COLLECTION]
+        self.messages = self.db[MONGODB_MESSAGES_COLLECTION]
+        self.documents = self.db[MONGODB_DOCUMENTS_COLLECTION]
+        self.users = self.db[MONGODB_USERS_COLLECTION]
+        self.payments = self.db[MONGODB_PAYMENTS_COLLECTION]
+        self.message_buckets = MessageBuckets(self.db[MONGODB_MESSAGE_BUCKETS_COLLECTION])
+        self.archives = self.db[MONGODB_ARCHIVES_COLLECTION]
+        
+        # Indexes are created by migrations.py, not on every worker boot.
+        # The Motor client connects lazily, so startup doesn't wait on MongoDB.
+        
+        print("✅ Connected to MongoDB")
+        
+    async def verify_schema(self, strict: bool = False) -> Optional[int]:
+        """
+        Check the applied schema version against the one this build expects.
+        Logs when the database is behind or unreachable; raises instead when strict.
+        """
+        try:
+            version = await get_schema_version(self.db)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"⚠️ Could not check the database schema version: {e}")
+            return None
+        
+        if version < SCHEMA_VERSION:
+            message = (
+                f"Database schema is at version {version}, this build expects {SCHEMA_VERSION}. "
+                f"Run: python migrations.py up"
+            )
+            if strict:
+                raise RuntimeError(message)
+            print(f"⚠️ {message}")
+        else:
+            print(f"✅ Database schema version {version}")
+        return version
+    
+    async def ping(self):
+        """Round trip to the server (readiness check); raises if unreachable"""
+        await self.client.admin.command("ping")
+    
+    async def disconnect(self):
+        """Disconnect from MongoDB"""
+        if self.client:
+            self.client.close()
+            print("🔌 Disconnected from MongoDB")
+    
+    # ==================== CHAT OPERATIONS ====================
+    
+    async def create_chat(
+        self, 
+        user_id: str, 
+        title: str = DEFAULT_CHAT_TITLE,
+        prompt_template: str = "legal_assistant"
+    ) -> str:
+        """Create a new chat session"""
+        chat = {
+            "user_id": user_id,
+            "title": title,
+            "prompt_template": prompt_template,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "is_active": True
+        }
+        result = await self.chats.insert_one(chat)
+        return str(result.inserted_id)
+    
+    async def get_chat(self, chat_id: str) -> Optional[dict]:
+        """Get a single chat by ID (served from the record cache when hot)"""
+        chat = self.chat_cache.get(chat_id)
+        if chat is not None:
+            return chat
+        
+        chat = await self.chats.find_one({"_id": ObjectId(chat_id)})
+        if not chat or "deleted_at" in chat:
+            # Tombstoned chats are gone as far as readers are concerned
+            return None
+        chat["_id"] = str(chat["_id"])
+        self.chat_cache.set(chat_id, chat)
+        return chat
+    
+    async def get_user_chats(self, user_id: str, limit: int = 50) -> List[dict]:
+        """Get the most recent chats for a user"""
+        chats, _ = await self.get_user_chats_page(user_id, limit)
+        return chats
+    
+    async def get_user_chats_page(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of a user's chats, most recently updated first.
+        Returns (chats, next_cursor); next_cursor is None on the last page.
+        """
+        query = {"user_id": user_id, "is_active": True, **keyset_filter("updated_at", cursor, descending=True)}
+        # Fetch one extra to know whether another page exists
+        docs = await self.chats.find(query, CHAT_LIST_PROJECTION).sort(
+            [("updated_at", -1), ("_id", -1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
+        
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1]["updated_at"], docs[-1]["_id"])
+        for chat in docs:
+            chat["_id"] = str(chat["_id"])
+        return docs, next_cursor
+    
+    async def get_user_chat_titles(self, user_id: str, limit: int = 200) -> dict:
+        """Map chat_id -> title for a user's active chats (most recent first)"""
+        cursor = self.chats.find(
+            {"user_id": user_id, "is_active": True},
+            {"title": 1}
+        ).sort([("updated_at", -1), ("_id", -1)]).limit(limit)
+        
+        return {str(chat["_id"]): chat.get("title", "") async for chat in cursor}
+    
+    async def update_chat(self, chat_id: str, updates: dict) -> bool:
+        """Update chat metadata"""
+        updates["updated_at"] = datetime.utcnow()
+        result = await self.chats.update_one(
+            {"_id": ObjectId(chat_id)},
+            {"$set": updates}
+        )
+        self.chat_cache.invalidate(chat_id)
+        return result.modified_count > 0
+    
+    # ==================== CHAT DELETION ====================
+    # DELETE only tombstones the chat; deleter.py purges its data in the
+    # background and records completion on the tombstone.
+    
+    async def tombstone_chat(self, chat_id: str) -> bool:
+        """Hide a chat from every read and queue it for purging"""
+        now = datetime.utcnow()
+        result = await self.chats.update_one(
+            {"_id": ObjectId(chat_id), "deleted_at": {"$exists": False}},
+            {"$set": {
+                "is_active": False,
+                "deleted_at": now,
+                "deletion_status": "pending",
+                "deletion_attempts": 0,
+                "deletion_next_attempt": now,
+                "updated_at": now
+            }}
+        )
+        self.chat_cache.invalidate(chat_id)
+        return result.modified_count > 0
+    
+    async def claim_chat_deletion(self, lease_seconds: float) -> Optional[dict]:
+        """
+        Claim one due deletion (pending, or running with an expired lease
+        after a worker died) so only one worker purges a chat at a time.
+        """
+        now = datetime.utcnow()
+        return await self.chats.find_one_and_update(
+            {"$or": [
+                {"deletion_status": "pending", "deletion_next_attempt": {"$lte": now}},
+                {"deletion_status": "running", "deletion_lease_until": {"$lte": now}}
+            ]},
+            {"$set": {
+                "deletion_status": "running",
+                "deletion_lease_until": now + timedelta(seconds=lease_seconds)
+            }},
+            projection={"_id": 1, "deletion_attempts": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def purge_chat_messages(self, chat_id: str, batch_size: int) -> int:
+        """
+        Delete a chat's messages in bounded batches, from both storage modes
+        (and the cold archive) so nothing is left orphaned. Returns the number deleted.
+        """
+        parts = await self.archives.find({"chat_id": chat_id}, {"count": 1}).to_list(length=None)
+        if parts:
+            await self.archives.delete_many({"chat_id": chat_id})
+        deleted = sum(part.get("count", 0) for part in parts)
+        deleted += await self.message_buckets.delete_chat(chat_id)
+        while True:
+            batch = await self.messages.find(
+                {"chat_id": chat_id}, {"_id": 1}
+            ).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                return deleted
+            result = await self.messages.delete_many({"_id": {"$in": [msg["_id"] for msg in batch]}})
+            deleted += result.deleted_count
+    
+    async def purge_chat_documents(self, chat_id: str) -> int:
+        """Delete a chat's document metadata. Returns the number deleted."""
+        result = await self.documents.delete_many({"chat_id": chat_id})
+        return result.deleted_count
+    
+    async def complete_chat_deletion(self, chat_id: str, stats: dict):
+        """Record a finished purge on the tombstone"""
+        await self.chats.update_one(
+            {"_id": ObjectId(chat_id)},
+            {
+                "$set": {"deletion_status": "done", "purged_at": datetime.utcnow(), "deletion_stats": stats},
+                "$unset": {"deletion_lease_until": "", "deletion_next_attempt": "", "deletion_error": ""}
+            }
+        )
+    
+    async def fail_chat_deletion(self, chat_id: str, error: str, retry_in: float):
+        """Put a failed purge back in the queue with a backoff"""
+        await self.chats.update_one(
+            {"_id": ObjectId(chat_id)},
+            {
+                "$set": {
+                    "deletion_status": "pending",
+                    "deletion_next_attempt": datetime.utcnow() + timedelta(seconds=retry_in),
+                    "deletion_error": error
+                },
+                "$inc": {"deletion_attempts": 1},
+                "$unset": {"deletion_lease_until": ""}
+            }
+        )
+    
+    # ==================== MESSAGE OPERATIONS ====================
+    
+    def _title_update(self, title: str, now: datetime) -> list:
+        """
+        Pipeline update that bumps updated_at and replaces the default
+        title in the same round trip (no read-before-write).
+        """
+        return [{
+            "$set": {
+                "updated_at": now,
+                "title": {
+                    "$cond": [
+                        {"$eq": ["$title", DEFAULT_CHAT_TITLE]},
+                        {"$literal": title},
+                        "$title"
+                    ]
+                }
+            }
+        }]
+    
+    def _bump_cached_chat(self, chat_id: str, now: datetime, title: str = None):
+        """Mirror a chat bump (and _title_update) on the cached record so hot chats stay in memory"""
+        chat = self.chat_cache.peek(chat_id)
+        if chat is None:
+            return
+        changes = {"updated_at": mongo_time(now)}
+        if title is not None and chat.get("title") == DEFAULT_CHAT_TITLE:
+            changes["title"] = title
+        self.chat_cache.update(chat_id, changes)
+    
+    async def _append_bucketed(self, chat_id: str, chat_update: list, messages: List[dict]):
+        """
+        Bucket mode: allocate positions for `messages` from chats.message_count
+        in the same round trip as the chat bump, then $push them into buckets.
+        """
+        count_stage = {"message_count": {"$add": [{"$ifNull": ["$message_count", 0]}, len(messages)]}}
+        chat = await self.chats.find_one_and_update(
+            {"_id": ObjectId(chat_id)},
+            [{"$set": {**chat_update[0]["$set"], **count_stage}}],
+            projection={"message_count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if chat is None:
+            raise ValueError(f"Chat not found: {chat_id}")
+        for message in messages:
+            message["_id"] = ObjectId()
+            message.pop("chat_id", None)
+        await self.message_buckets.append(chat_id, chat["message_count"] - len(messages), messages)
+    
+    async def add_message(
+        self, 
+        chat_id: str, 
+        role: str, 
+        content: str,
+        sources: List[int] = None,
+        metadata: dict = None
+    ) -> str:
+        """Add a message to a chat"""
+        now = datetime.utcnow()
+        message = {
+            "chat_id": chat_id,
+            "role": role,  # "user" or "assistant"
+            "content": content,
+            "sources": sources or [],
+            "metadata": metadata or {},
+            "created_at": now
+        }
+        # Update chat's updated_at timestamp (and auto-title from first user message)
+        title = make_chat_title(content) if role == "user" else None
+        if title is not None:
+            update = self._title_update(title, now)
+        else:
+            update = [{"$set": {"updated_at": now}}]
+        
+        if self.bucketed:
+            await self._append_bucketed(chat_id, update, [message])
+            message_id = message["_id"]
+        else:
+            result = await self.messages.insert_one(message)
+            await self.chats.update_one({"_id": ObjectId(chat_id)}, update)
+            message_id = result.inserted_id
+        self._bump_cached_chat(chat_id, now, title)
+        
+        return str(message_id)
+    
+    async def add_exchange(
+        self,
+        chat_id: str,
+        question: str,
+        answer: str,
+        user_id: str = None,
+        sources: List[int] = None,
+        metadata: dict = None,
+        asked_at: datetime = None,
+        count_query: bool = True
+    ) -> Tuple[str, str]:
+        """
+        Persist a question and its answer in one write path:
+        - one insert_many for both messages
+          (bucket mode: one $push after the chat bump allocates positions)
+        - one conditional update for the chat's updated_at / auto-title
+        The writes are independent, so they run concurrently. The user's
+        query_count (when count_query is set) is written behind by self.counters.
+        
+        Returns:
+            Tuple of (user_message_id, assistant_message_id)
+        """
+        now = datetime.utcnow()
+        user_message = {
+            "chat_id": chat_id,
+            "role": "user",
+            "content": question,
+            "sources": [],
+            "metadata": {},
+            "created_at": asked_at or now
+        }
+        assistant_message = {
+            "chat_id": chat_id,
+            "role": "assistant",
+            "content": answer,
+            "sources": sources or [],
+            "metadata": metadata or {},
+            "created_at": now
+        }
+        
+        chat_update = self._title_update(make_chat_title(question), now)
+        if self.bucketed:
+            # Bucket positions come from the chat bump, so that write goes first
+            writes = [self._append_bucketed(chat_id, chat_update, [user_message, assistant_message])]
+        else:
+            writes = [
+                self.messages.insert_many([user_message, assistant_message], ordered=True),
+                self.chats.update_one({"_id": ObjectId(chat_id)}, chat_update)
+            ]
+        
+        await asyncio.gather(*writes)
+        
+        self._bump_cached_chat(chat_id, now, make_chat_title(question))
+        if count_query and user_id:
+            self.counters.add(user_id, "query_count")
+        
+        return str(user_message["_id"]), str(assistant_message["_id"])
+    
+    async def get_chat_messages(
+        self, 
+        chat_id: str, 
+        limit: int = 100
+    ) -> List[dict]:
+        """Get the first messages of a chat in chronological order"""
+        messages, _ = await self.get_chat_messages_page(chat_id, limit)
+        return messages
+    
+    async def get_chat_messages_page(
+        self,
+        chat_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of a chat's messages in chronological order.
+        Returns (messages, next_cursor); next_cursor is None on the last page.
+        """
+        if self.bucketed:
+            after = decode_position_cursor(cursor) if cursor else None
+            rows = await self.message_buckets.read_after(chat_id, after, limit + 1)
+            if len(rows) > limit:
+                rows = rows[:limit]
+                return rows, encode_position_cursor(rows[-1]["pos"])
+            return rows, None
+        
+        query = {"chat_id": chat_id, **keyset_filter("created_at", cursor, descending=False)}
+        # _id breaks created_at ties between messages written together
+        docs = await self.messages.find(query, MESSAGE_PROJECTION).sort(
+            [("created_at", 1), ("_id", 1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
+        
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+        for msg in docs:
+            msg["_id"] = str(msg["_id"])
+        return docs, next_cursor
+    
+    async def get_chat_context(
+        self, 
+        chat_id: str, 
+        max_messages: int = 10
+    ) -> List[dict]:
+        """Get recent messages for context (for RAG)"""
+        if self.bucketed:
+            rows = await self.message_buckets.read_recent(chat_id, max_messages)
+            return [{"role": row["role"], "content": row["content"]} for row in rows]
+        
+        cursor = self.messages.find(
+            {"chat_id": chat_id}
+        ).sort([("created_at", -1), ("_id", -1)]).limit(max_messages)
+        
+        messages = []
+        async for msg in cursor:
+            messages.append({
+                "role": msg["role"],
+                "content": msg["content"]
+            })
+        
+        # Reverse to get chronological order
+        return list(reversed(messages))
+    
+    # ==================== DOCUMENT OPERATIONS ====================
+    
+    async def add_document(
+        self, 
+        chat_id: str, 
+        filename: str,
+        num_chunks: int,
+        file_size: int = 0
+    ) -> str:
+        """Track uploaded documents"""
+        doc = {
+            "chat_id": chat_id,
+            "filename": filename,
+            "num_chunks": num_chunks,
+            "file_size": file_size,
+            "uploaded_at": datetime.utcnow()
+        }
+        result = await self.documents.insert_one(doc)
+        return str(result.inserted_id)
+    
+    async def get_chat_documents(self, chat_id: str) -> List[dict]:
+        """Get all documents uploaded to a chat"""
+        cursor = self.documents.find({"chat_id": chat_id})
+        
+        docs = []
+        async for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            docs.append(doc)
+        return docs
+    
+    async def delete_document(self, document_id: str, chat_id: str) -> bool:
+        """Delete a specific document from a chat"""
+        try:
+            # Get document info
+            doc = await self.documents.find_one({"_id": ObjectId(document_id)})
+            if not doc:
+                return False
+            
+            # Delete from MongoDB
+            await self.documents.delete_one({"_id": ObjectId(document_id)})
+            
+            # Note: For Pinecone, we'd need to track vector IDs per document
+            # For simplicity, we're not implementing per-document vector deletion
+            # The full namespace deletion happens on chat delete
+            
+            return True
+            
+        except Exception as e:
+            print(f"Error deleting document: {e}")
+            return False
+
+    # ==================== USER OPERATIONS ====================
+    
+    async def get_or_create_user(self, user_id: str) -> dict:
+        """Get user or create if doesn't exist (one atomic upsert on a cache miss)"""
+        user = self.user_cache.get(user_id)
+        if user is not None:
+            return user
+        
+        try:
+            user = await self.users.find_one_and_update(
+                {"user_id": user_id},
+                {"$setOnInsert": new_user_fields(mongo_time(datetime.utcnow()))},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost a concurrent first-time upsert; the user exists now
+            user = await self.users.find_one({"user_id": user_id})
+        
+        self.user_cache.set(user_id, user)
+        return user
+    
+    async def get_user(self, user_id: str) -> Optional[dict]:
+        """Get user by ID (served from the record cache when hot)"""
+        user = self.user_cache.get(user_id)
+        if user is not None:
+            return user
+        
+        user = await self.users.find_one({"user_id": user_id})
+        if user:
+            self.user_cache.set(user_id, user)
+        return user
+    
+    def _cache_user(self, user_id: str, user: Optional[dict]) -> Optional[dict]:
+        """Write-through for find_one_and_update results"""
+        if user:
+            self.user_cache.set(user_id, user)
+        else:
+            self.user_cache.invalidate(user_id)
+        return user
+    
+    async def increment_user_chat_count(self, user_id: str) -> dict:
+        """Increment user's chat count"""
+        result = await self.users.find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$inc": {"chat_count": 1},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            return_document=True
+        )
+        return self._cache_user(user_id, result)
+    
+    async def increment_user_document_count(self, user_id: str) -> dict:
+        """Increment user's document count"""
+        result = await self.users.find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$inc": {"document_count": 1},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            return_document=True
+        )
+        return self._cache_user(user_id, result)
+    
+    async def increment_user_query_count(self, user_id: str, amount: int = 1):
+        """
+        Count queries for a user. query_count gates nothing (premium users are
+        unlimited, free users always query), so it is written behind in bulk.
+        """
+        self.counters.add(user_id, "query_count", amount)
+    
+    async def check_user_limits(self, user_id: str) -> dict:
+        """Check if user has exceeded free limits"""
+        user = await self.get_or_create_user(user_id)
+        
+        is_premium = user.get("is_premium", False)
+        chat_count = user.get("chat_count", 0)
+        document_count = user.get("document_count", 0)
+        remaining_queries = user.get("remaining_queries", 0)
+        
+        if is_premium:
+            return {
+                "can_create_chat": True,
+                "can_upload_document": True,
+                "can_query": True,  # Premium users have unlimited queries
+                "is_premium": True,
+                "chat_count": chat_count,
+                "document_count": document_count,
+                "remaining_queries": -1,  # -1 indicates unlimited
+                "chat_limit": None,
+                "document_limit": None,
+                "message": "Premium user with unlimited access"
+            }
+        
+        can_create_chat = chat_count < FREE_CHAT_LIMIT
+        can_upload = document_count < FREE_DOCUMENT_LIMIT
+        
+        # Free users can always query within their existing chats
+        # They just can't create MORE chats beyond the limit
+        return {
+            "can_create_chat": can_create_chat,
+            "can_upload_document": can_upload,
+            "can_query": True,  # Free users can always query within their chats
+            "is_premium": False,
+            "chat_count": chat_count,
+            "document_count": document_count,
+            "remaining_queries": 0,
+            "chat_limit": FREE_CHAT_LIMIT,
+            "document_limit": FREE_DOCUMENT_LIMIT,
+            "message": "Free tier limits apply"
+        }
+    
+    async def upgrade_to_premium(self, user_id: str, queries: int = PREMIUM_QUERIES_LIMIT) -> dict:
+        """Upgrade user to premium with unlimited queries"""
+        result = await self.users.find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$set": {
+                    "is_premium": True,
+                    "remaining_queries": -1,  # -1 indicates unlimited
+                    "updated_at": datetime.utcnow()
+                },
+                "$inc": {
+                    "total_payments": 1
+                }
+            },
+            return_document=True
+        )
+        return self._cache_user(user_id, result)
+
+    # ==================== PAYMENT OPERATIONS ====================
+    
+    async def create_payment(
+        self,
+        user_id: str,
+        razorpay_order_id: str,
+        amount: int,
+        currency: str = "INR"
+    ) -> str:
+        """Create a payment record"""
+        payment = {
+            "user_id": user_id,
+            "razorpay_order_id": razorpay_order_id,
+            "razorpay_payment_id": None,
+            "razorpay_signature": None,
+            "amount": amount,
+            "currency": currency,
+            "status": "created",
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+        result = await self.payments.insert_one(payment)
+        return str(result.inserted_id)
+    
+    async def update_payment_success(
+        self,
+        razorpay_order_id: str,
+        razorpay_payment_id: str,
+        razorpay_signature: str
+    ) -> bool:
+        """Update payment record on successful payment"""
+        result = await self.payments.update_one(
+            {"razorpay_order_id": razorpay_order_id},
+            {
+                "$set": {
+                    "razorpay_payment_id": razorpay_payment_id,
+                    "razorpay_signature": razorpay_signature,
+                    "status": "success",
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
+        return result.modified_count > 0
+    
+    async def update_payment_failed(self, razorpay_order_id: str, error: str = None) -> bool:
+        """Update payment record on failed payment"""
+        result = await self.payments.update_one(
+            {"razorpay_order_id": razorpay_order_id},
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": error,
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
+        return result.modified_count > 0
+    
+    async def get_payment_by_order_id(self, razorpay_order_id: str) -> Optional[dict]:
+        """Get payment by Razorpay order ID"""
+        return await self.payments.find_one({"razorpay_order_id": razorpay_order_id})
+    
+    async def get_user_payments(self, user_id: str) -> List[dict]:
+        """Get all payments for a user"""
+        cursor = self.payments.find({"user_id": user_id}).sort("created_at", -1)
+        payments = []
+        async for payment in cursor:
+            payment["_id"] = str(payment["_id"])
+            payments.append(payment)
+        return payments
+
+
+# Global database instance
+db = Database()
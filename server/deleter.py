@@ -0,0 +1,120 @@
+"""
+Background cascading chat deletion.
+
+DELETE /chats/{chat_id} only tombstones the chat (reads hide it at once) and
+wakes this deleter. The deleter claims due tombstones with a lease, deletes
+messages in batches, then document metadata, then the chat's vector
+namespace through the process-wide store client, and records completion on
+the tombstone. Failures are retried with exponential backoff; a worker that
+dies mid-purge loses its lease and another worker picks the chat up.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from config import (
+    DELETION_BATCH_SIZE,
+    DELETION_POLL_SECONDS,
+    DELETION_LEASE_SECONDS,
+    DELETION_RETRY_BASE_SECONDS,
+    DELETION_RETRY_MAX_SECONDS
+)
+from database import Database, db
+from vector_store import VectorStore, get_vector_store
+
+
+class ChatDeleter:
+    """Purges tombstoned chats in the background"""
+
+    def __init__(
+        self,
+        database: Database,
+        store: Optional[VectorStore] = None,
+        batch_size: int = DELETION_BATCH_SIZE,
+        poll_seconds: float = DELETION_POLL_SECONDS,
+        lease_seconds: float = DELETION_LEASE_SECONDS
+    ):
+        self.database = database
+        self._store = store
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def store(self) -> VectorStore:
+        # Resolved lazily so the pooled process-wide client is reused
+        if self._store is None:
+            self._store = get_vector_store()
+        return self._store
+
+    async def schedule(self, chat_id: str) -> bool:
+        """Tombstone a chat and wake the deleter. False if it was already deleted."""
+        scheduled = await self.database.tombstone_chat(chat_id)
+        if scheduled:
+            self._wake.set()
+        return scheduled
+
+    def start(self):
+        """Start the background loop (call from the app lifespan)"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop; an interrupted purge is resumed when its lease expires"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        print("🧹 Chat deleter started")
+        while True:
+            try:
+                # Drain everything that is due, then sleep until woken or polled
+                while await self.run_once():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Chat deleter error: {e}")
+            
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def run_once(self) -> bool:
+        """Purge one due chat. Returns False when nothing was due."""
+        job = await self.database.claim_chat_deletion(self.lease_seconds)
+        if job is None:
+            return False
+        
+        chat_id = str(job["_id"])
+        attempts = job.get("deletion_attempts", 0)
+        start = time.perf_counter()
+        try:
+            stats = {
+                "messages": await self.database.purge_chat_messages(chat_id, self.batch_size),
+                "documents": await self.database.purge_chat_documents(chat_id)
+            }
+            # The store client is blocking; keep it off the event loop
+            await asyncio.to_thread(self.store.delete_namespace, chat_id)
+            await self.database.complete_chat_deletion(chat_id, stats)
+            print(f"✅ Purged chat {chat_id} in {time.perf_counter() - start:.2f}s: {stats}")
+        except Exception as e:
+            retry_in = min(DELETION_RETRY_BASE_SECONDS * (2 ** attempts), DELETION_RETRY_MAX_SECONDS)
+            await self.database.fail_chat_deletion(chat_id, str(e), retry_in)
+            print(f"⚠️ Purging chat {chat_id} failed (attempt {attempts + 1}), retrying in {retry_in:.0f}s: {e}")
+        return True
+
+
+# Global chat deleter instance
+deleter = ChatDeleter(db)
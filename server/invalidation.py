@@ -0,0 +1,168 @@
+"""
+Cross-worker cache invalidation over MongoDB change streams.
+
+Each worker keeps its own chat/user RecordCaches. A write made by another
+worker (or host) would leave them stale until the TTL runs out, so every
+worker follows change streams on the chats and users collections and evicts
+the entries they touch.
+
+Events for a worker's own writes are recognised by updated_at: writers
+mirror their changes into the local cache (write-through), so when the
+event's updated_at equals the cached one the entry is already current and
+is kept. Anything else - a newer updated_at, a write that doesn't set it, a
+replace or a delete - evicts.
+
+If the stream breaks and cannot resume from its last token, events may have
+been missed, so the caches are cleared. Change streams need a replica set;
+on a standalone mongod the invalidator logs once and the caches fall back to
+TTL expiry.
+"""
+
+import asyncio
+from typing import Callable, Hashable, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from cache import RecordCache
+from config import CACHE_INVALIDATION, CACHE_INVALIDATION_RETRY_SECONDS
+from database import Database, db
+
+
+# Only what eviction needs leaves the server
+PIPELINE = [
+    {"$match": {"operationType": {"$in": ["update", "replace", "delete"]}}},
+    {"$project": {
+        "operationType": 1,
+        "documentKey": 1,
+        "updateDescription.updatedFields.updated_at": 1,
+        "fullDocument.updated_at": 1
+    }}
+]
+
+# "$changeStream is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+# The resume token is no longer in the oplog
+RESUME_FAILED = {136, 280, 286}
+
+
+def event_updated_at(event: dict):
+    """updated_at written by a change event, or None if it didn't set one"""
+    if event["operationType"] == "update":
+        return event.get("updateDescription", {}).get("updatedFields", {}).get("updated_at")
+    if event["operationType"] == "replace":
+        return event.get("fullDocument", {}).get("updated_at")
+    return None
+
+
+class CacheInvalidator:
+    """Evicts this worker's cached chats/users when any worker changes them"""
+
+    def __init__(
+        self,
+        database: Database,
+        enabled: bool = CACHE_INVALIDATION == "changestream",
+        retry_seconds: float = CACHE_INVALIDATION_RETRY_SECONDS
+    ):
+        self.database = database
+        self.enabled = enabled
+        self.retry_seconds = retry_seconds
+        self._tasks = []
+        self._ready = {}
+        self.events = 0
+        self.evictions = 0
+        self.resets = 0
+        self.status = "stopped"
+
+    def apply(self, cache: RecordCache, key: Optional[Hashable], event: dict) -> bool:
+        """Evict `key` if the event makes its cached record stale. True if evicted."""
+        self.events += 1
+        if key is None:
+            return False
+        record = cache.peek(key)
+        if record is None:
+            return False
+        updated_at = event_updated_at(event)
+        if updated_at is not None and updated_at == record.get("updated_at"):
+            # This worker's own write, already mirrored in the cache
+            return False
+        cache.invalidate(key)
+        self.evictions += 1
+        return True
+
+    def start(self):
+        """Start following chats and users (call from the app lifespan)"""
+        if not self.enabled or self._tasks:
+            return
+        database = self.database
+        watches = [
+            ("chats", database.chats, database.chat_cache, lambda doc_id: str(doc_id)),
+            ("users", database.users, database.user_cache, database.user_cache.key_for_id),
+        ]
+        self.status = "starting"
+        for name, collection, cache, key_of in watches:
+            self._ready[name] = asyncio.Event()
+            self._tasks.append(asyncio.create_task(self._watch(name, collection, cache, key_of)))
+
+    async def wait_ready(self, timeout: float = 10):
+        """Wait until both change streams are open (events before that are not seen)"""
+        await asyncio.wait_for(asyncio.gather(*[ready.wait() for ready in self._ready.values()]), timeout)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._ready = {}
+        self.status = "stopped"
+
+    async def _watch(self, name: str, collection, cache: RecordCache, key_of: Callable):
+        resume_token = None
+        while True:
+            try:
+                async with collection.watch(PIPELINE, resume_after=resume_token) as stream:
+                    self._ready[name].set()
+                    self.status = "watching"
+                    print(f"👀 Cache invalidation following {name}")
+                    async for event in stream:
+                        resume_token = stream.resume_token
+                        self.apply(cache, key_of(event["documentKey"]["_id"]), event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    self.status = "unsupported"
+                    self._ready[name].set()
+                    print(f"⚠️ Change streams unavailable ({e}); {name} cache relies on TTL expiry")
+                    return
+                print(f"⚠️ {name} change stream failed: {e}")
+                if e.code in RESUME_FAILED:
+                    resume_token = None
+            except PyMongoError as e:
+                print(f"⚠️ {name} change stream failed: {e}")
+
+            if resume_token is None:
+                # Can't tell what changed while the stream was down
+                self._reset(cache)
+            self.status = "reconnecting"
+            await asyncio.sleep(self.retry_seconds)
+
+    def _reset(self, cache: RecordCache):
+        cache.clear()
+        self.resets += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "status": self.status,
+            "events": self.events,
+            "evictions": self.evictions,
+            "resets": self.resets
+        }
+
+
+# Global invalidator instance
+invalidator = CacheInvalidator(db)
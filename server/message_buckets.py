@@ -0,0 +1,101 @@
+"""
+Bucketed message storage (MESSAGE_STORAGE=buckets).
+
+Each chat's messages live in fixed-size bucket documents:
+
+    {chat_id, seq, count, first_at, last_at, messages: [{_id, pos, role, ...}]}
+
+A message's position in its chat is allocated from chats.message_count, and
+position // bucket_size picks the bucket, so an append is one $push upsert
+and a history page or the recent context reads one or two documents instead
+of one document per message.
+"""
+
+import asyncio
+from itertools import groupby
+from typing import List, Optional
+
+from config import MESSAGE_BUCKET_SIZE
+
+
+class MessageBuckets:
+    """Chat messages grouped into fixed-size bucket documents"""
+
+    def __init__(self, collection, bucket_size: int = MESSAGE_BUCKET_SIZE):
+        self.collection = collection
+        self.bucket_size = bucket_size
+
+    def bucket_of(self, pos: int) -> int:
+        return pos // self.bucket_size
+
+    async def append(self, chat_id: str, first_pos: int, messages: List[dict]):
+        """
+        Store messages at consecutive positions starting at first_pos.
+        Messages that straddle a bucket boundary cost one upsert per bucket.
+        """
+        for offset, message in enumerate(messages):
+            message["pos"] = first_pos + offset
+
+        writes = []
+        for seq, group in groupby(messages, key=lambda m: self.bucket_of(m["pos"])):
+            group = list(group)
+            writes.append(self.collection.update_one(
+                {"chat_id": chat_id, "seq": seq},
+                {
+                    # $sort keeps the bucket ordered even if concurrent appends land out of order
+                    "$push": {"messages": {"$each": group, "$sort": {"pos": 1}}},
+                    "$inc": {"count": len(group)},
+                    "$min": {"first_at": group[0]["created_at"]},
+                    "$max": {"last_at": group[-1]["created_at"]}
+                },
+                upsert=True
+            ))
+        await asyncio.gather(*writes)
+
+    def _flatten(self, chat_id: str, buckets: List[dict]) -> List[dict]:
+        """Bucket documents -> message rows shaped like the messages collection"""
+        rows = []
+        for bucket in buckets:
+            for message in bucket.get("messages", []):
+                rows.append({
+                    "_id": str(message["_id"]),
+                    "chat_id": chat_id,
+                    "pos": message["pos"],
+                    "role": message["role"],
+                    "content": message["content"],
+                    "sources": message.get("sources", []),
+                    "created_at": message["created_at"]
+                })
+        return rows
+
+    async def read_after(self, chat_id: str, after_pos: Optional[int], count: int) -> List[dict]:
+        """Up to `count` messages after position after_pos (from the start if None), oldest first"""
+        start = 0 if after_pos is None else after_pos + 1
+        first_seq = self.bucket_of(start)
+        # Enough buckets to cover `count` messages starting mid-bucket
+        buckets = await self.collection.find(
+            {"chat_id": chat_id, "seq": {"$gte": first_seq}},
+            {"messages.metadata": 0}
+        ).sort("seq", 1).limit(count // self.bucket_size + 2).to_list(length=None)
+
+        rows = [row for row in self._flatten(chat_id, buckets) if row["pos"] >= start]
+        return rows[:count]
+
+    async def read_recent(self, chat_id: str, count: int) -> List[dict]:
+        """The last `count` messages, oldest first"""
+        # The newest bucket may be nearly empty, so one extra bucket covers `count`
+        buckets = await self.collection.find(
+            {"chat_id": chat_id},
+            {"messages": {"$slice": -count}}
+        ).sort("seq", -1).limit(count // self.bucket_size + 2).to_list(length=None)
+
+        rows = self._flatten(chat_id, reversed(buckets))
+        return rows[-count:]
+
+    async def delete_chat(self, chat_id: str) -> int:
+        """Delete every bucket of a chat. Returns the number of messages removed."""
+        buckets = await self.collection.find({"chat_id": chat_id}, {"count": 1}).to_list(length=None)
+        if not buckets:
+            return 0
+        await self.collection.delete_many({"_id": {"$in": [bucket["_id"] for bucket in buckets]}})
+        return sum(bucket.get("count", 0) for bucket in buckets)
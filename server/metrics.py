@@ -0,0 +1,209 @@
+"""
+Prometheus metrics, served at /metrics.
+
+- legaleagle_request_duration_seconds{method,route,status}: per-route latency
+  (route is the path template, e.g. /chats/{chat_id}, so ids don't explode
+  cardinality)
+- legaleagle_stage_duration_seconds{stage}: where /ask and /upload time goes
+  (queue_wait, query_embed, vector_search, llm_generate, persist, pdf_parse,
+  split, chunk_embed, upsert)
+- legaleagle_mongo_command_duration_seconds{command}: every MongoDB command,
+  from a pymongo command listener
+- legaleagle_chunks_ingested_total, legaleagle_llm_tokens_total{direction,model},
+  legaleagle_cache_lookups_total{cache,result},
+  legaleagle_admission_rejections_total{operation,reason}
+
+The same stage and Mongo timings are also summed per request (request_timings)
+for the Server-Timing response header.
+
+With several worker processes each worker has its own registry, so serve.py
+points PROMETHEUS_MULTIPROC_DIR at a shared directory and /metrics on any
+worker aggregates all of them.
+"""
+
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from pymongo import monitoring
+
+
+# 5 ms (cached reads, Mongo round trips) up to a minute (long generations)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGES = (
+    "queue_wait", "query_embed", "vector_search", "llm_generate", "persist",
+    "pdf_parse", "split", "chunk_embed", "upsert"
+)
+
+# Server-Timing metric each stage is reported under; "db" is every Mongo command
+SERVER_TIMING_NAMES = {
+    "queue_wait": "queue",
+    "query_embed": "embed",
+    "chunk_embed": "embed",
+    "vector_search": "retrieve",
+    "llm_generate": "llm",
+    "persist": "persist",
+    "pdf_parse": "parse",
+    "split": "split",
+    "upsert": "upsert"
+}
+# Always present in the header, even at 0
+SERVER_TIMING_DEFAULTS = ("db", "embed", "retrieve", "llm", "persist")
+
+REQUEST_LATENCY = Histogram(
+    "legaleagle_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "legaleagle_stage_duration_seconds",
+    "Latency of one RAG or ingestion stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+MONGO_LATENCY = Histogram(
+    "legaleagle_mongo_command_duration_seconds",
+    "MongoDB command latency",
+    ["command"],
+    buckets=LATENCY_BUCKETS
+)
+CHUNKS_INGESTED = Counter(
+    "legaleagle_chunks_ingested",
+    "Document chunks embedded and stored"
+)
+LLM_TOKENS = Counter(
+    "legaleagle_llm_tokens",
+    "LLM tokens sent (in) and generated (out)",
+    ["direction", "model"]
+)
+CACHE_LOOKUPS = Counter(
+    "legaleagle_cache_lookups",
+    "Record cache lookups by result",
+    ["cache", "result"]
+)
+ADMISSION_REJECTIONS = Counter(
+    "legaleagle_admission_rejections",
+    "Requests turned away with 429 by admission control",
+    ["operation", "reason"]
+)
+
+# Export every stage from the first scrape, not only after it first runs
+for _stage in STAGES:
+    STAGE_LATENCY.labels(_stage)
+
+
+# ==================== PER-REQUEST TIMINGS ====================
+
+class RequestTimings:
+    """Milliseconds spent per Server-Timing metric during one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._ms: Dict[str, float] = defaultdict(float)
+        # Mongo commands report from Motor's executor threads
+        self._lock = Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self._ms[name] += seconds * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        """{metric: ms} including "total" (time since the request started)"""
+        with self._lock:
+            timings = {name: 0.0 for name in SERVER_TIMING_DEFAULTS}
+            timings.update(self._ms)
+        timings["total"] = (time.perf_counter() - self.started) * 1000
+        return {name: round(ms, 2) for name, ms in timings.items()}
+
+    def header(self) -> str:
+        """Server-Timing header value, e.g. "db;dur=4.1, embed;dur=88.0, ..." """
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.as_dict().items())
+
+
+# Timings of the request being served. None outside a request.
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def request_timings():
+    """Collect stage and Mongo timings for the duration of one request"""
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _request_timings.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into legaleagle_stage_duration_seconds{stage=name} and the request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(name).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(SERVER_TIMING_NAMES.get(name, name), elapsed)
+
+
+def record_token_usage(usage_metadata: dict):
+    """Count tokens from a langchain UsageMetadataCallbackHandler ({model: usage})"""
+    for model, usage in usage_metadata.items():
+        LLM_TOKENS.labels("in", model).inc(usage.get("input_tokens", 0))
+        LLM_TOKENS.labels("out", model).inc(usage.get("output_tokens", 0))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Observes the duration of every command a Mongo client sends. Motor runs
+    commands in a thread with a copy of the caller's context, so the
+    request's timings are still reachable here.
+    """
+
+    def started(self, event):
+        pass
+
+    def _observe(self, event):
+        seconds = event.duration_micros / 1e6
+        MONGO_LATENCY.labels(event.command_name).observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add("db", seconds)
+
+    def succeeded(self, event):
+        self._observe(event)
+
+    def failed(self, event):
+        self._observe(event)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """(body, content type) for a /metrics scrape"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
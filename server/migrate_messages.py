@@ -0,0 +1,153 @@
+"""
+Move chat messages between the two MESSAGE_STORAGE modes.
+
+    documents -> buckets   one document per message -> fixed-size bucket documents
+    buckets -> documents   the reverse, e.g. to roll back
+
+Each chat is rebuilt from the source collection, so the tool is idempotent
+and can be re-run after an interruption. Source data is only removed with
+--delete-source. Run it while writes are paused (or before switching
+MESSAGE_STORAGE), then restart the API with the new mode.
+
+Usage:
+    python migrate_messages.py --to buckets [--chat-id ID] [--delete-source] [--dry-run]
+    python migrate_messages.py --to documents [--chat-id ID] [--delete-source] [--dry-run]
+"""
+
+import sys
+import argparse
+from itertools import groupby
+
+from bson import ObjectId
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import BulkWriteError
+
+from config import (
+    MONGODB_URI,
+    MONGODB_DB_NAME,
+    MONGODB_CHATS_COLLECTION,
+    MONGODB_MESSAGES_COLLECTION,
+    MONGODB_MESSAGE_BUCKETS_COLLECTION,
+    MESSAGE_BUCKET_SIZE
+)
+
+
+def build_buckets(chat_id: str, messages: list, bucket_size: int) -> list:
+    """Bucket documents for a chat's messages (already in chronological order)"""
+    entries = []
+    for pos, msg in enumerate(messages):
+        entries.append({
+            "_id": msg["_id"],
+            "pos": pos,
+            "role": msg["role"],
+            "content": msg["content"],
+            "sources": msg.get("sources", []),
+            "metadata": msg.get("metadata", {}),
+            "created_at": msg["created_at"]
+        })
+
+    buckets = []
+    for seq, group in groupby(entries, key=lambda entry: entry["pos"] // bucket_size):
+        group = list(group)
+        buckets.append({
+            "chat_id": chat_id,
+            "seq": seq,
+            "count": len(group),
+            "first_at": group[0]["created_at"],
+            "last_at": group[-1]["created_at"],
+            "messages": group
+        })
+    return buckets
+
+
+def to_buckets(db, chat_ids: list, bucket_size: int, delete_source: bool, dry_run: bool) -> int:
+    chats = db[MONGODB_CHATS_COLLECTION]
+    messages = db[MONGODB_MESSAGES_COLLECTION]
+    buckets = db[MONGODB_MESSAGE_BUCKETS_COLLECTION]
+    moved = 0
+
+    for chat_id in chat_ids:
+        rows = list(messages.find({"chat_id": chat_id}).sort([("created_at", ASCENDING), ("_id", ASCENDING)]))
+        if not rows:
+            continue
+        docs = build_buckets(chat_id, rows, bucket_size)
+        print(f"📦 {chat_id}: {len(rows)} messages -> {len(docs)} buckets")
+        moved += len(rows)
+        if dry_run:
+            continue
+
+        # Rebuild from the source so re-runs and partial runs converge
+        buckets.delete_many({"chat_id": chat_id})
+        buckets.insert_many(docs, ordered=True)
+        chats.update_one({"_id": ObjectId(chat_id)}, {"$set": {"message_count": len(rows)}})
+        if delete_source:
+            messages.delete_many({"chat_id": chat_id})
+
+    return moved
+
+
+def to_documents(db, chat_ids: list, delete_source: bool, dry_run: bool) -> int:
+    messages = db[MONGODB_MESSAGES_COLLECTION]
+    buckets = db[MONGODB_MESSAGE_BUCKETS_COLLECTION]
+    moved = 0
+
+    for chat_id in chat_ids:
+        rows = []
+        for bucket in buckets.find({"chat_id": chat_id}).sort("seq", ASCENDING):
+            for entry in bucket["messages"]:
+                rows.append({
+                    "_id": entry["_id"],
+                    "chat_id": chat_id,
+                    "role": entry["role"],
+                    "content": entry["content"],
+                    "sources": entry.get("sources", []),
+                    "metadata": entry.get("metadata", {}),
+                    "created_at": entry["created_at"]
+                })
+        if not rows:
+            continue
+        print(f"📄 {chat_id}: {len(rows)} messages <- buckets")
+        moved += len(rows)
+        if dry_run:
+            continue
+
+        # Original _ids make re-runs skip what was already copied
+        try:
+            messages.insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+        if delete_source:
+            buckets.delete_many({"chat_id": chat_id})
+
+    return moved
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Migrate chat messages between storage modes")
+    parser.add_argument("--to", choices=["buckets", "documents"], required=True)
+    parser.add_argument("--chat-id", action="append", help="Only migrate these chats (repeatable)")
+    parser.add_argument("--delete-source", action="store_true", help="Remove migrated source data")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--uri", default=MONGODB_URI)
+    parser.add_argument("--db", default=MONGODB_DB_NAME)
+    args = parser.parse_args(argv)
+
+    client = MongoClient(args.uri)
+    db = client[args.db]
+    try:
+        if args.to == "buckets":
+            chat_ids = args.chat_id or db[MONGODB_MESSAGES_COLLECTION].distinct("chat_id")
+            moved = to_buckets(db, chat_ids, MESSAGE_BUCKET_SIZE, args.delete_source, args.dry_run)
+        else:
+            chat_ids = args.chat_id or db[MONGODB_MESSAGE_BUCKETS_COLLECTION].distinct("chat_id")
+            moved = to_documents(db, chat_ids, args.delete_source, args.dry_run)
+    finally:
+        client.close()
+
+    print(f"✅ {'Would migrate' if args.dry_run else 'Migrated'} {moved} messages in {len(chat_ids)} chats to {args.to}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Versioned schema and index migrations.
+
+Workers don't create indexes on boot. Every schema change is a numbered
+migration that this CLI applies once (e.g. from the deploy pipeline before
+workers roll out); the applied version is stored in MongoDB and workers
+only check it at startup (SCHEMA_CHECK).
+
+Index builds within a migration run concurrently: one createIndexes command
+per collection, all collections at once. On MongoDB 4.2+ builds only hold
+an exclusive lock at the start and end, so reads and writes continue while
+they run.
+
+Usage:
+    python migrations.py status
+    python migrations.py up [--to VERSION]
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, NamedTuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from config import (
+    MONGODB_URI,
+    MONGODB_DB_NAME,
+    MONGODB_CHATS_COLLECTION,
+    MONGODB_MESSAGES_COLLECTION,
+    MONGODB_DOCUMENTS_COLLECTION,
+    MONGODB_USERS_COLLECTION,
+    MONGODB_PAYMENTS_COLLECTION,
+    MONGODB_MESSAGE_BUCKETS_COLLECTION,
+    MONGODB_MIGRATIONS_COLLECTION,
+    MONGODB_ARCHIVES_COLLECTION
+)
+
+
+SCHEMA_DOC_ID = "schema"
+LOCK_DOC_ID = "lock"
+# A crashed run releases its lock after this long
+LOCK_SECONDS = 3600
+INDEX_NOT_FOUND = 27
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[object], Awaitable[None]]
+
+
+async def build_indexes(db, indexes: dict):
+    """Create {collection: [IndexModel]} with one createIndexes per collection, concurrently"""
+    await asyncio.gather(*[
+        db[collection].create_indexes(models) for collection, models in indexes.items()
+    ])
+
+
+async def drop_indexes(db, indexes: dict):
+    """Drop {collection: [index name]}, ignoring indexes that don't exist"""
+    for collection, names in indexes.items():
+        for name in names:
+            try:
+                await db[collection].drop_index(name)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+
+
+# ==================== MIGRATIONS ====================
+
+async def _initial_indexes(db):
+    await build_indexes(db, {
+        MONGODB_CHATS_COLLECTION: [IndexModel("user_id"), IndexModel("created_at")],
+        MONGODB_MESSAGES_COLLECTION: [IndexModel("chat_id"), IndexModel("created_at")],
+        MONGODB_DOCUMENTS_COLLECTION: [IndexModel("chat_id")],
+        MONGODB_USERS_COLLECTION: [IndexModel("user_id", unique=True)],
+        MONGODB_PAYMENTS_COLLECTION: [IndexModel("user_id"), IndexModel("razorpay_order_id")],
+    })
+
+
+async def _compound_query_indexes(db):
+    # Filter + sort of every list/history query, so results come straight
+    # off the index (test_query_plans.py checks each query against these)
+    await build_indexes(db, {
+        MONGODB_CHATS_COLLECTION: [
+            IndexModel([("user_id", 1), ("is_active", 1), ("updated_at", -1), ("_id", -1)])
+        ],
+        MONGODB_MESSAGES_COLLECTION: [IndexModel([("chat_id", 1), ("created_at", 1), ("_id", 1)])],
+        MONGODB_PAYMENTS_COLLECTION: [IndexModel([("user_id", 1), ("created_at", -1)])],
+    })
+
+
+async def _deletion_queue_index(db):
+    await build_indexes(db, {
+        MONGODB_CHATS_COLLECTION: [
+            IndexModel([("deletion_status", 1), ("deletion_next_attempt", 1)], sparse=True)
+        ],
+    })
+
+
+async def _message_bucket_index(db):
+    await build_indexes(db, {
+        MONGODB_MESSAGE_BUCKETS_COLLECTION: [IndexModel([("chat_id", 1), ("seq", 1)], unique=True)],
+    })
+
+
+async def _drop_superseded_indexes(db):
+    # Prefixes of the compound indexes, or never used by a query
+    await drop_indexes(db, {
+        MONGODB_CHATS_COLLECTION: ["user_id_1", "created_at_1"],
+        MONGODB_MESSAGES_COLLECTION: ["chat_id_1", "created_at_1"],
+        MONGODB_PAYMENTS_COLLECTION: ["user_id_1"],
+    })
+
+
+async def _archive_indexes(db):
+    await build_indexes(db, {
+        # Idle-chat scan of the archive job
+        MONGODB_CHATS_COLLECTION: [IndexModel([("archived_at", 1), ("updated_at", 1)])],
+        MONGODB_ARCHIVES_COLLECTION: [IndexModel([("chat_id", 1), ("part", 1)], unique=True)],
+    })
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Initial indexes", _initial_indexes),
+    Migration(2, "Compound indexes for list/history queries", _compound_query_indexes),
+    Migration(3, "Chat deletion queue index", _deletion_queue_index),
+    Migration(4, "Message bucket index", _message_bucket_index),
+    Migration(5, "Drop indexes superseded by compound indexes", _drop_superseded_indexes),
+    Migration(6, "Cold archive indexes", _archive_indexes),
+]
+
+# Version this build of the server expects
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+# ==================== RUNNER ====================
+
+async def get_schema_version(db) -> int:
+    """Applied schema version (0 for a database that was never migrated)"""
+    doc = await db[MONGODB_MIGRATIONS_COLLECTION].find_one({"_id": SCHEMA_DOC_ID}, {"version": 1})
+    return doc["version"] if doc else 0
+
+
+async def _acquire_lock(db, owner: str):
+    now = datetime.utcnow()
+    try:
+        await db[MONGODB_MIGRATIONS_COLLECTION].find_one_and_update(
+            {"_id": LOCK_DOC_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=LOCK_SECONDS)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        lock = await db[MONGODB_MIGRATIONS_COLLECTION].find_one({"_id": LOCK_DOC_ID})
+        raise RuntimeError(f"Migrations are already running ({lock.get('owner')}, until {lock.get('expires_at')})")
+
+
+async def _release_lock(db, owner: str):
+    await db[MONGODB_MIGRATIONS_COLLECTION].delete_one({"_id": LOCK_DOC_ID, "owner": owner})
+
+
+async def migrate(db, target: int = SCHEMA_VERSION) -> List[Migration]:
+    """Apply every migration up to `target` that isn't applied yet. Returns those applied."""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    await _acquire_lock(db, owner)
+    try:
+        current = await get_schema_version(db)
+        pending = [m for m in MIGRATIONS if current < m.version <= target]
+        for migration in pending:
+            start = time.perf_counter()
+            await migration.apply(db)
+            duration_ms = round((time.perf_counter() - start) * 1000)
+            # Recorded after each step, so an interrupted run resumes where it stopped
+            await db[MONGODB_MIGRATIONS_COLLECTION].update_one(
+                {"_id": SCHEMA_DOC_ID},
+                {
+                    "$set": {"version": migration.version, "updated_at": datetime.utcnow()},
+                    "$push": {"applied": {
+                        "version": migration.version,
+                        "description": migration.description,
+                        "applied_at": datetime.utcnow(),
+                        "duration_ms": duration_ms
+                    }}
+                },
+                upsert=True
+            )
+            print(f"✅ {migration.version}: {migration.description} ({duration_ms} ms)")
+        return pending
+    finally:
+        await _release_lock(db, owner)
+
+
+# ==================== CLI ====================
+
+async def _main(args) -> int:
+    client = AsyncIOMotorClient(args.uri)
+    db = client[args.db]
+    try:
+        current = await get_schema_version(db)
+        if args.command == "status":
+            print(f"Database schema version: {current} (this build expects {SCHEMA_VERSION})")
+            for migration in MIGRATIONS:
+                mark = "✅" if migration.version <= current else "⏳"
+                print(f"  {mark} {migration.version}: {migration.description}")
+            return 0 if current >= SCHEMA_VERSION else 1
+
+        applied = await migrate(db, args.to)
+        if not applied:
+            print(f"Already at version {current}")
+        return 0
+    finally:
+        client.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="LegalEagle schema migrations")
+    parser.add_argument("command", choices=["status", "up"])
+    parser.add_argument("--to", type=int, default=SCHEMA_VERSION, help="Target version (default: latest)")
+    parser.add_argument("--uri", default=MONGODB_URI)
+    parser.add_argument("--db", default=MONGODB_DB_NAME)
+    return asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
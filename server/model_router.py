@@ -0,0 +1,137 @@
+import re
+from collections import deque
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Optional
+
+from config import (
+    LLM_TEMPERATURE,
+    MODEL_ROUTING_ENABLED,
+    LLM_FAST_MODEL,
+    LLM_STRONG_MODEL,
+    LLM_FAST_MAX_OUTPUT_TOKENS,
+    ROUTER_FAST_MAX_QUERY_CHARS,
+    ROUTER_FAST_MAX_CONTEXT_CHARS,
+    ROUTER_FAST_MAX_CLAUSES,
+    ROUTER_STRONG_TEMPLATES
+)
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+FAST_ROUTE = "fast"
+STRONG_ROUTE = "strong"
+
+# Words that signal the user wants reasoning rather than a lookup
+COMPLEX_QUERY_PATTERN = re.compile(
+    r"\b(analy[sz]e|analysis|risks?|compare|comparison|implications?|assess|"
+    r"evaluate|review|summari[sz]e|summary|draft|explain why|why|how does|"
+    r"pros and cons|advantages|liabilit(y|ies)|loopholes?|negotiat\w*|recommend\w*)\b",
+    re.IGNORECASE
+)
+
+# Clause separators used to estimate how many things a query asks for
+CLAUSE_SPLIT_PATTERN = re.compile(r"[?;]|,|\band\b|\bor\b|\balso\b", re.IGNORECASE)
+
+# Number of recent latency samples kept per route for percentiles
+LATENCY_WINDOW = 500
+
+
+class ModelRouter:
+    """
+    Picks between a fast and a strong LLM for each query.
+
+    Routing looks at the prompt template, the query length and complexity,
+    and how much retrieved context will be stuffed into the prompt.
+    """
+
+    def __init__(self):
+        self._llms: Dict[tuple, "ChatGoogleGenerativeAI"] = {}
+        self._lock = Lock()
+        self._samples = {FAST_ROUTE: deque(maxlen=LATENCY_WINDOW), STRONG_ROUTE: deque(maxlen=LATENCY_WINDOW)}
+        self._counts = {FAST_ROUTE: 0, STRONG_ROUTE: 0}
+        self._totals = {FAST_ROUTE: 0.0, STRONG_ROUTE: 0.0}
+
+    def choose_route(self, query: str, prompt_template: str, context_chars: int = 0) -> str:
+        """Return FAST_ROUTE or STRONG_ROUTE for a query"""
+        if not MODEL_ROUTING_ENABLED:
+            return STRONG_ROUTE
+
+        if prompt_template in ROUTER_STRONG_TEMPLATES:
+            return STRONG_ROUTE
+
+        text = query.strip()
+        if len(text) > ROUTER_FAST_MAX_QUERY_CHARS:
+            return STRONG_ROUTE
+
+        if COMPLEX_QUERY_PATTERN.search(text):
+            return STRONG_ROUTE
+
+        clauses = [c for c in CLAUSE_SPLIT_PATTERN.split(text) if c.strip()]
+        if len(clauses) > ROUTER_FAST_MAX_CLAUSES:
+            return STRONG_ROUTE
+
+        if context_chars > ROUTER_FAST_MAX_CONTEXT_CHARS:
+            return STRONG_ROUTE
+
+        return FAST_ROUTE
+
+    def get_model_name(self, route: str) -> str:
+        """Get the model configured for a route"""
+        return LLM_FAST_MODEL if route == FAST_ROUTE else LLM_STRONG_MODEL
+
+    def get_llm(self, route: str, temperature: float = None) -> "ChatGoogleGenerativeAI":
+        """Get a cached LLM client for a route"""
+        temperature = temperature or LLM_TEMPERATURE
+        key = (route, temperature)
+
+        llm = self._llms.get(key)
+        if llm is None:
+            # Imported on first use so importing the app stays fast
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            
+            kwargs = {}
+            if route == FAST_ROUTE:
+                # Short answers are what make the fast route fast
+                kwargs["max_output_tokens"] = LLM_FAST_MAX_OUTPUT_TOKENS
+            llm = ChatGoogleGenerativeAI(
+                model=self.get_model_name(route),
+                temperature=temperature,
+                **kwargs
+            )
+            self._llms[key] = llm
+        return llm
+
+    def record_latency(self, route: str, seconds: float):
+        """Record generation latency for a route"""
+        with self._lock:
+            self._samples[route].append(seconds)
+            self._counts[route] += 1
+            self._totals[route] += seconds
+
+    def get_stats(self) -> dict:
+        """Per-route latency metrics (seconds)"""
+        stats = {}
+        with self._lock:
+            for route, samples in self._samples.items():
+                ordered = sorted(samples)
+                count = self._counts[route]
+                stats[route] = {
+                    "model": self.get_model_name(route),
+                    "requests": count,
+                    "avg_seconds": round(self._totals[route] / count, 4) if count else None,
+                    "p50_seconds": _percentile(ordered, 0.50),
+                    "p95_seconds": _percentile(ordered, 0.95),
+                    "p99_seconds": _percentile(ordered, 0.99),
+                    "last_seconds": round(samples[-1], 4) if samples else None
+                }
+        return {"routing_enabled": MODEL_ROUTING_ENABLED, "routes": stats}
+
+
+def _percentile(ordered: list, q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return round(ordered[index], 4)
+
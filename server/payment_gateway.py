@@ -0,0 +1,190 @@
+"""
+Payment gateway adapters.
+
+Routes talk to a PaymentGateway instead of the synchronous Razorpay SDK, so a
+slow checkout call never blocks the event loop:
+
+- RazorpayGateway - Razorpay's REST API over one pooled keep-alive
+  httpx.AsyncClient per process, with connect/read timeouts and retries
+  (PAYMENT_GATEWAY_BACKEND=razorpay, the default)
+- FakePaymentGateway - in-memory orders and locally signed payments for
+  tests and offline development (PAYMENT_GATEWAY_BACKEND=fake)
+"""
+
+import hmac
+import asyncio
+import hashlib
+import secrets
+from threading import Lock
+from typing import Dict, Optional
+
+import httpx
+
+from config import (
+    RAZORPAY_KEY_ID,
+    RAZORPAY_KEY_SECRET,
+    RAZORPAY_API_URL,
+    PAYMENT_GATEWAY_BACKEND,
+    PAYMENT_TIMEOUT_SECONDS,
+    PAYMENT_CONNECT_TIMEOUT_SECONDS,
+    PAYMENT_MAX_RETRIES,
+    PAYMENT_MAX_CONNECTIONS
+)
+
+
+class PaymentGatewayError(Exception):
+    """The gateway rejected a request, failed, or could not be reached"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def payment_signature(key_secret: str, order_id: str, payment_id: str) -> str:
+    """Razorpay checkout signature: HMAC-SHA256 of "order_id|payment_id" """
+    return hmac.new(key_secret.encode(), f"{order_id}|{payment_id}".encode(), hashlib.sha256).hexdigest()
+
+
+class PaymentGateway:
+    """Interface for payment providers"""
+
+    key_id: str
+
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: dict) -> dict:
+        """Create an order; returns the provider's order (with "id")"""
+        raise NotImplementedError
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        """Check the signature the checkout returned for a payment"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Release pooled connections"""
+
+
+# ==================== RAZORPAY ====================
+
+class RazorpayGateway(PaymentGateway):
+    """Razorpay REST API over a pooled async HTTP client"""
+
+    # Worth retrying: throttling and server-side failures
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        key_id: str = RAZORPAY_KEY_ID,
+        key_secret: str = RAZORPAY_KEY_SECRET,
+        base_url: str = RAZORPAY_API_URL,
+        timeout: float = PAYMENT_TIMEOUT_SECONDS,
+        connect_timeout: float = PAYMENT_CONNECT_TIMEOUT_SECONDS,
+        max_retries: int = PAYMENT_MAX_RETRIES,
+        max_connections: int = PAYMENT_MAX_CONNECTIONS,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.max_retries = max_retries
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(key_id, key_secret),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        """
+        Send a request, retrying transport errors, throttling and 5xx with
+        backoff. A retried order create can leave an extra unpaid order at
+        Razorpay, which is harmless: only the returned order is checked out.
+        """
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise PaymentGatewayError(f"Payment gateway unreachable: {e!r}")
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                if last_attempt or response.status_code not in self.RETRY_STATUS:
+                    try:
+                        detail = response.json().get("error", {}).get("description", response.text)
+                    except ValueError:
+                        detail = response.text
+                    raise PaymentGatewayError(f"Payment gateway error: {detail}", response.status_code)
+            await asyncio.sleep(0.2 * 2 ** attempt)
+
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: dict) -> dict:
+        return await self._request("POST", "/orders", json={
+            "amount": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "notes": notes
+        })
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        expected = payment_signature(self.key_secret, order_id, payment_id)
+        return hmac.compare_digest(expected, signature or "")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# ==================== FAKE ====================
+
+class FakePaymentGateway(PaymentGateway):
+    """In-memory gateway: orders are stored locally and payments signed with sign()"""
+
+    def __init__(self, key_id: str = "rzp_test_fake", key_secret: str = "fake_secret"):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.orders: Dict[str, dict] = {}
+
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: dict) -> dict:
+        order = {
+            "id": f"order_{secrets.token_hex(7)}",
+            "entity": "order",
+            "amount": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "notes": notes,
+            "status": "created"
+        }
+        self.orders[order["id"]] = order
+        return order
+
+    def sign(self, order_id: str, payment_id: str) -> str:
+        """The signature a successful checkout would return"""
+        return payment_signature(self.key_secret, order_id, payment_id)
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        return order_id in self.orders and hmac.compare_digest(self.sign(order_id, payment_id), signature or "")
+
+
+_gateway: Optional[PaymentGateway] = None
+_gateway_lock = Lock()
+
+
+def get_payment_gateway() -> PaymentGateway:
+    """Get the process-wide payment gateway for the configured backend"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                if PAYMENT_GATEWAY_BACKEND == "razorpay":
+                    _gateway = RazorpayGateway()
+                elif PAYMENT_GATEWAY_BACKEND == "fake":
+                    _gateway = FakePaymentGateway()
+                else:
+                    raise ValueError(f"Unknown PAYMENT_GATEWAY_BACKEND: {PAYMENT_GATEWAY_BACKEND}")
+    return _gateway
+
+
+async def close_payment_gateway():
+    """Close the process-wide gateway if it was created (call on shutdown)"""
+    global _gateway
+    if _gateway is not None:
+        await _gateway.close()
+        _gateway = None
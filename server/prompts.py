@@ -1,5 +1,7 @@
-from typing import Dict, List
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate
 
 
 # ==================== PROMPT TEMPLATES ====================
@@ -251,10 +253,12 @@ CHAT HISTORY:
 }
 
 
-def get_prompt_template(template_id: str) -> ChatPromptTemplate:
+def get_prompt_template(template_id: str) -> "ChatPromptTemplate":
     """
     Get a LangChain ChatPromptTemplate for the given template ID.
     """
+    from langchain_core.prompts import ChatPromptTemplate
+    
     if template_id not in PROMPT_TEMPLATES:
         template_id = "legal_assistant"  # Default fallback
     
@@ -0,0 +1,109 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+# Number of set bits for every byte value, used for Hamming distance on packed codes
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+class Quantizer:
+    """
+    Compact first-stage representation of L2-normalized vectors.
+
+    Codes are only used to shortlist candidates; the local vector store
+    rescores the shortlist against the full-precision vectors.
+    """
+
+    name = "none"
+    dtype = np.float32
+    has_scales = False
+
+    def code_width(self, dim: int) -> int:
+        """Number of code elements stored per vector"""
+        raise NotImplementedError
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Encode normalized vectors. Returns (codes, per-row scales or None)."""
+        raise NotImplementedError
+
+    def score(self, codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of every code row to a normalized query (higher is closer)"""
+        raise NotImplementedError
+
+
+class Int8Quantizer(Quantizer):
+    """Symmetric int8 codes with one float32 scale per vector (4x smaller)"""
+
+    name = "int8"
+    dtype = np.int8
+    has_scales = True
+
+    def code_width(self, dim: int) -> int:
+        return dim
+
+    def encode(self, vectors):
+        max_abs = np.abs(vectors).max(axis=1)
+        max_abs[max_abs == 0] = 1.0
+        scales = (max_abs / 127.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+
+    def score(self, codes, scales, query):
+        return (codes @ query) * scales
+
+
+class BinaryQuantizer(Quantizer):
+    """One sign bit per dimension, compared by Hamming distance (32x smaller)"""
+
+    name = "binary"
+    dtype = np.uint8
+
+    def code_width(self, dim: int) -> int:
+        return (dim + 7) // 8
+
+    def encode(self, vectors):
+        return np.packbits(vectors > 0, axis=1), None
+
+    def score(self, codes, scales, query):
+        query_bits = np.packbits(query > 0)
+        distances = POPCOUNT_TABLE[np.bitwise_xor(codes, query_bits)].sum(axis=1)
+        return -distances.astype(np.float32)
+
+
+class TruncateQuantizer(Quantizer):
+    """Leading dimensions only, re-normalized (dim / truncate_dim smaller)"""
+
+    name = "truncate"
+    dtype = np.float32
+
+    def __init__(self, truncate_dim: int):
+        self.truncate_dim = truncate_dim
+
+    def code_width(self, dim: int) -> int:
+        return min(self.truncate_dim, dim)
+
+    def encode(self, vectors):
+        codes = np.ascontiguousarray(vectors[:, :self.truncate_dim], dtype=np.float32)
+        norms = np.linalg.norm(codes, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return codes / norms, None
+
+    def score(self, codes, scales, query):
+        truncated = query[:codes.shape[1]]
+        norm = np.linalg.norm(truncated) or 1.0
+        return codes @ (truncated / norm)
+
+
+def get_quantizer(mode: str, truncate_dim: int = 256) -> Optional[Quantizer]:
+    """Get the quantizer for a VECTOR_QUANTIZATION mode (None = full precision only)"""
+    mode = (mode or "none").lower()
+    if mode == "none":
+        return None
+    if mode == "int8":
+        return Int8Quantizer()
+    if mode == "binary":
+        return BinaryQuantizer()
+    if mode == "truncate":
+        return TruncateQuantizer(truncate_dim)
+    raise ValueError(f"Unknown VECTOR_QUANTIZATION mode: {mode}")
@@ -0,0 +1,110 @@
+"""
+Atomic quota reservations for free-tier limits.
+
+A reservation is one conditional find_one_and_update on the users
+collection: it increments the counter only if the user is premium or still
+under the limit, and upserts the user on first use. Concurrent requests
+can't race past FREE_CHAT_LIMIT / FREE_DOCUMENT_LIMIT, and a gated request
+needs a single round trip instead of check + increment.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import FREE_CHAT_LIMIT, FREE_DOCUMENT_LIMIT
+from database import Database, db, mongo_time, new_user_fields
+
+
+# resource -> (users counter field, free-tier limit)
+QUOTAS = {
+    "chat": ("chat_count", FREE_CHAT_LIMIT),
+    "document": ("document_count", FREE_DOCUMENT_LIMIT),
+}
+
+
+class QuotaExceeded(Exception):
+    """Raised when a free-tier user has no capacity left for a resource"""
+
+    def __init__(self, resource: str, limit: int):
+        self.resource = resource
+        self.limit = limit
+        super().__init__(f"Free tier {resource} limit of {limit} reached")
+
+
+class QuotaService:
+    """Reserve and release free-tier capacity on the users collection"""
+
+    def __init__(self, database: Database):
+        self.database = database
+
+    async def reserve(self, user_id: str, resource: str) -> dict:
+        """
+        Take one unit of a resource for a user. Returns the updated user.
+        
+        Raises:
+            QuotaExceeded: the user is not premium and is at the limit
+        """
+        field, limit = QUOTAS[resource]
+        now = mongo_time(datetime.utcnow())
+        insert_fields = new_user_fields(now)
+        insert_fields.pop(field)
+        insert_fields.pop("updated_at")
+        
+        # When the filter doesn't match an existing user (at the limit), the
+        # upsert collides with the unique user_id index instead of inserting.
+        # A collision can also be a concurrent first-time upsert, so retry once.
+        for attempt in range(2):
+            try:
+                user = await self.database.users.find_one_and_update(
+                    {
+                        "user_id": user_id,
+                        # $not/$gte also matches older users missing the counter
+                        "$or": [{"is_premium": True}, {field: {"$not": {"$gte": limit}}}]
+                    },
+                    {
+                        "$inc": {field: 1},
+                        "$set": {"updated_at": now},
+                        "$setOnInsert": insert_fields
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                self.database.user_cache.set(user_id, user)
+                return user
+            except DuplicateKeyError:
+                continue
+        
+        raise QuotaExceeded(resource, limit)
+
+    async def release(self, user_id: str, resource: str):
+        """Give back a unit taken by reserve() when the gated work failed"""
+        field, _ = QUOTAS[resource]
+        user = await self.database.users.find_one_and_update(
+            {"user_id": user_id, field: {"$gt": 0}},
+            {"$inc": {field: -1}, "$set": {"updated_at": mongo_time(datetime.utcnow())}},
+            return_document=ReturnDocument.AFTER
+        )
+        if user:
+            self.database.user_cache.set(user_id, user)
+        else:
+            self.database.user_cache.invalidate(user_id)
+
+    @asynccontextmanager
+    async def reservation(self, user_id: str, resource: str):
+        """Reserve a unit for the body of the block; released if the block raises"""
+        user = await self.reserve(user_id, resource)
+        try:
+            yield user
+        except BaseException:
+            try:
+                await self.release(user_id, resource)
+            except Exception as e:
+                print(f"Error releasing {resource} quota for {user_id}: {e}")
+            raise
+
+
+# Global quota service instance
+quota = QuotaService(db)
@@ -1,170 +1,267 @@
-from typing import List, Optional, Tuple
-from pinecone import Pinecone
-from langchain_cohere import CohereEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_pinecone import PineconeVectorStore
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-
-from config import (
-    PINECONE_API_KEY,
-    PINECONE_INDEX_NAME,
-    EMBEDDING_MODEL,
-    LLM_MODEL,
-    LLM_TEMPERATURE
-)
-from prompts import get_prompt_template, PROMPT_TEMPLATES
-
-
-class RAGPipeline:
-    """
-    RAG (Retrieval-Augmented Generation) Pipeline for LegalEagle.
-    Handles document retrieval and LLM-based question answering.
-    """
-    
-    def __init__(self):
-        self.embeddings = CohereEmbeddings(model=EMBEDDING_MODEL)
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
-        self.index = self.pc.Index(PINECONE_INDEX_NAME)
-        
-    def get_vectorstore(self, namespace: str) -> PineconeVectorStore:
-        """Get a vectorstore for a specific namespace (chat_id)"""
-        return PineconeVectorStore(
-            index_name=PINECONE_INDEX_NAME,
-            embedding=self.embeddings,
-            namespace=namespace
-        )
-    
-    def get_llm(self, temperature: float = None) -> ChatGoogleGenerativeAI:
-        """Get the LLM instance"""
-        return ChatGoogleGenerativeAI(
-            model=LLM_MODEL,
-            temperature=temperature or LLM_TEMPERATURE
-        )
-    
-    def format_chat_history(self, messages: List[dict]) -> str:
-        """Format chat history for inclusion in prompt"""
-        if not messages:
-            return "No previous conversation."
-        
-        formatted = []
-        for msg in messages[-10:]:  # Last 10 messages for context
-            role = "User" if msg["role"] == "user" else "Assistant"
-            formatted.append(f"{role}: {msg['content']}")
-        
-        return "\n".join(formatted)
-    
-    async def query(
-        self,
-        query: str,
-        chat_id: str,
-        prompt_template: str = "legal_assistant",
-        chat_history: List[dict] = None,
-        top_k: int = 5
-    ) -> Tuple[str, List[int]]:
-        """
-        Execute RAG query.
-        
-        Args:
-            query: User's question
-            chat_id: Chat ID (used as Pinecone namespace)
-            prompt_template: Which prompt template to use
-            chat_history: Previous messages for context
-            top_k: Number of documents to retrieve
-            
-        Returns:
-            Tuple of (answer, source_pages)
-        """
-        try:
-            # 1. Get vectorstore for this chat's namespace
-            vectorstore = self.get_vectorstore(namespace=chat_id)
-            
-            # 2. Get the prompt template
-            prompt = get_prompt_template(prompt_template)
-            
-            # 3. Format chat history
-            history_str = self.format_chat_history(chat_history or [])
-            
-            # 4. Setup LLM
-            llm = self.get_llm()
-            
-            # 5. Create the RAG chain
-            question_answer_chain = create_stuff_documents_chain(llm, prompt)
-            rag_chain = create_retrieval_chain(
-                vectorstore.as_retriever(search_kwargs={"k": top_k}),
-                question_answer_chain
-            )
-            
-            # 6. Execute the chain
-            response = rag_chain.invoke({
-                "input": query,
-                "chat_history": history_str
-            })
-            
-            # 7. Extract source pages
-            source_pages = []
-            if "context" in response and response["context"]:
-                raw_pages = [doc.metadata.get("page", 0) for doc in response["context"]]
-                source_pages = sorted(list(set(p + 1 for p in raw_pages)))
-            
-            return response["answer"], source_pages
-            
-        except Exception as e:
-            print(f"RAG Query Error: {e}")
-            # Return a helpful error message
-            if "namespace" in str(e).lower() or "empty" in str(e).lower():
-                return "I don't have any documents to reference yet. Please upload a document first.", []
-            raise e
-    
-    async def similarity_search(
-        self,
-        query: str,
-        chat_id: str,
-        top_k: int = 5
-    ) -> List[dict]:
-        """
-        Perform similarity search without LLM generation.
-        Useful for finding relevant document sections.
-        """
-        vectorstore = self.get_vectorstore(namespace=chat_id)
-        docs = vectorstore.similarity_search(query, k=top_k)
-        
-        return [
-            {
-                "content": doc.page_content,
-                "page": doc.metadata.get("page", 0) + 1,
-                "source": doc.metadata.get("source", "Unknown")
-            }
-            for doc in docs
-        ]
-    
-    def check_namespace_exists(self, namespace: str) -> bool:
-        """Check if a namespace has any vectors"""
-        try:
-            stats = self.index.describe_index_stats()
-            namespaces = stats.get("namespaces", {})
-            return namespace in namespaces and namespaces[namespace].get("vector_count", 0) > 0
-        except Exception as e:
-            print(f"Error checking namespace: {e}")
-            return False
-    
-    def get_namespace_stats(self, namespace: str) -> dict:
-        """Get statistics for a namespace"""
-        try:
-            stats = self.index.describe_index_stats()
-            namespaces = stats.get("namespaces", {})
-            
-            if namespace in namespaces:
-                return {
-                    "exists": True,
-                    "vector_count": namespaces[namespace].get("vector_count", 0)
-                }
-            return {"exists": False, "vector_count": 0}
-            
-        except Exception as e:
-            print(f"Error getting namespace stats: {e}")
-            return {"exists": False, "vector_count": 0, "error": str(e)}
-
-
-# Global RAG pipeline instance
-rag_pipeline = RAGPipeline()
+import time
+import heapq
+import asyncio
+from itertools import chain
+from threading import Lock
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from config import EMBEDDING_MODEL, SEARCH_FANOUT_CONCURRENCY
+from metrics import stage, record_token_usage
+from model_router import ModelRouter, STRONG_ROUTE
+from prompts import get_prompt_template, PROMPT_TEMPLATES
+from vector_store import VectorStore, get_vector_store, TEXT_KEY
+
+if TYPE_CHECKING:
+    # langchain, Cohere and Gemini take seconds to import; they are loaded
+    # when the pipeline is first built (in the worker lifespan), not with main
+    from langchain_core.documents import Document
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+class RAGPipeline:
+    """
+    RAG (Retrieval-Augmented Generation) Pipeline for LegalEagle.
+    Handles document retrieval and LLM-based question answering.
+    """
+    
+    def __init__(self):
+        from langchain_cohere import CohereEmbeddings
+        
+        self.embeddings = CohereEmbeddings(model=EMBEDDING_MODEL)
+        self.store: VectorStore = get_vector_store()
+        self.router = ModelRouter()
+        
+    def retrieve(self, query: str, namespace: str, top_k: int = 5) -> List[Tuple["Document", float]]:
+        """Embed the query and fetch the top_k chunks (with scores) from a namespace"""
+        from langchain_core.documents import Document
+        
+        with stage("query_embed"):
+            vector = self.embeddings.embed_query(query)
+        with stage("vector_search"):
+            matches = self.store.query(namespace, vector, top_k)
+        
+        results = []
+        for match in matches:
+            metadata = dict(match["metadata"])
+            text = metadata.pop(TEXT_KEY, "")
+            metadata["id"] = match["id"]
+            results.append((Document(page_content=text, metadata=metadata), match["score"]))
+        return results
+    
+    def get_llm(self, temperature: float = None, route: str = STRONG_ROUTE) -> "ChatGoogleGenerativeAI":
+        """Get the LLM instance for a routing decision (defaults to the strong model)"""
+        return self.router.get_llm(route, temperature)
+    
+    def ping_embeddings(self):
+        """Check the embedding API is reachable and the key valid (a model lookup, no embedding is billed)"""
+        self.embeddings.client.models.get(EMBEDDING_MODEL)
+    
+    def ping_llm(self):
+        """Check the LLM API is reachable (a free token count, no generation)"""
+        self.get_llm().get_num_tokens("ping")
+    
+    def format_chat_history(self, messages: List[dict]) -> str:
+        """Format chat history for inclusion in prompt"""
+        if not messages:
+            return "No previous conversation."
+        
+        formatted = []
+        for msg in messages[-10:]:  # Last 10 messages for context
+            role = "User" if msg["role"] == "user" else "Assistant"
+            formatted.append(f"{role}: {msg['content']}")
+        
+        return "\n".join(formatted)
+    
+    async def query(
+        self,
+        query: str,
+        chat_id: str,
+        prompt_template: str = "legal_assistant",
+        chat_history: List[dict] = None,
+        top_k: int = 5,
+        debug_info: Optional[dict] = None
+    ) -> Tuple[str, List[int]]:
+        """
+        Execute RAG query.
+        
+        Args:
+            query: User's question
+            chat_id: Chat ID (used as the vector store namespace)
+            prompt_template: Which prompt template to use
+            chat_history: Previous messages for context
+            top_k: Number of documents to retrieve
+            debug_info: If given, filled with the route, model, retrieved
+                chunks (id, score) and token counts
+            
+        Returns:
+            Tuple of (answer, source_pages)
+        """
+        from langchain.chains.combine_documents import create_stuff_documents_chain
+        from langchain_core.callbacks import UsageMetadataCallbackHandler
+        
+        try:
+            # 1. Retrieve context up front so its size can inform routing.
+            #    Blocking SDK calls run off the event loop so concurrent
+            #    requests (up to the admission caps) actually overlap.
+            retrieved = await asyncio.to_thread(self.retrieve, query, chat_id, top_k)
+            docs = [doc for doc, _ in retrieved]
+            
+            # 2. Get the prompt template
+            prompt = get_prompt_template(prompt_template)
+            
+            # 3. Format chat history
+            history_str = self.format_chat_history(chat_history or [])
+            
+            # 4. Route to the fast or strong LLM
+            context_chars = sum(len(doc.page_content) for doc in docs)
+            route = self.router.choose_route(query, prompt_template, context_chars)
+            llm = self.get_llm(route=route)
+            
+            # 5. Generate the answer from the retrieved documents
+            question_answer_chain = create_stuff_documents_chain(llm, prompt)
+            usage = UsageMetadataCallbackHandler()
+            start = time.perf_counter()
+            with stage("llm_generate"):
+                answer = await asyncio.to_thread(question_answer_chain.invoke, {
+                    "input": query,
+                    "chat_history": history_str,
+                    "context": docs
+                }, config={"callbacks": [usage]})
+            self.router.record_latency(route, time.perf_counter() - start)
+            record_token_usage(usage.usage_metadata)
+            
+            if debug_info is not None:
+                debug_info.update({
+                    "route": route,
+                    "model": self.router.get_model_name(route),
+                    "chunks": [
+                        {
+                            "id": doc.metadata.get("id", ""),
+                            "score": score,
+                            "page": doc.metadata.get("page", 0) + 1,
+                            "source": doc.metadata.get("source", "Unknown")
+                        }
+                        for doc, score in retrieved
+                    ],
+                    "context_chars": context_chars,
+                    # None when the provider reported no usage
+                    "prompt_tokens": sum(u.get("input_tokens", 0) for u in usage.usage_metadata.values()) if usage.usage_metadata else None,
+                    "completion_tokens": sum(u.get("output_tokens", 0) for u in usage.usage_metadata.values()) if usage.usage_metadata else None
+                })
+            
+            # 6. Extract source pages
+            source_pages = []
+            if docs:
+                raw_pages = [doc.metadata.get("page", 0) for doc in docs]
+                source_pages = sorted(list(set(p + 1 for p in raw_pages)))
+            
+            return answer, source_pages
+            
+        except Exception as e:
+            print(f"RAG Query Error: {e}")
+            # Return a helpful error message
+            if "namespace" in str(e).lower() or "empty" in str(e).lower():
+                return "I don't have any documents to reference yet. Please upload a document first.", []
+            raise e
+    
+    async def similarity_search(
+        self,
+        query: str,
+        chat_id: str,
+        top_k: int = 5
+    ) -> List[dict]:
+        """
+        Perform similarity search without LLM generation.
+        Useful for finding relevant document sections.
+        """
+        retrieved = await asyncio.to_thread(self.retrieve, query, chat_id, top_k)
+        docs = [doc for doc, _ in retrieved]
+        
+        return [
+            {
+                "content": doc.page_content,
+                "page": doc.metadata.get("page", 0) + 1,
+                "source": doc.metadata.get("source", "Unknown")
+            }
+            for doc in docs
+        ]
+    
+    async def search_namespaces(
+        self,
+        query: str,
+        namespaces: List[str],
+        top_k: int = 5,
+        max_concurrency: int = SEARCH_FANOUT_CONCURRENCY
+    ) -> List[dict]:
+        """
+        Search several namespaces (chats) at once and merge by score.
+        
+        The query is embedded once and the per-namespace searches run
+        concurrently, bounded by max_concurrency, so total latency stays
+        close to a single-namespace search.
+        """
+        if not namespaces:
+            return []
+        
+        with stage("query_embed"):
+            vector = await asyncio.to_thread(self.embeddings.embed_query, query)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def search_one(namespace: str) -> List[dict]:
+            async with semaphore:
+                try:
+                    with stage("vector_search"):
+                        matches = await asyncio.to_thread(self.store.query, namespace, vector, top_k)
+                except Exception as e:
+                    # One bad namespace should not fail the whole search
+                    print(f"Namespace search error ({namespace}): {e}")
+                    return []
+            return [{**match, "namespace": namespace} for match in matches]
+        
+        per_namespace = await asyncio.gather(*(search_one(ns) for ns in namespaces))
+        best = heapq.nlargest(top_k, chain.from_iterable(per_namespace), key=lambda m: m["score"])
+        
+        return [
+            {
+                "chat_id": match["namespace"],
+                "content": match["metadata"].get(TEXT_KEY, ""),
+                "page": match["metadata"].get("page", 0) + 1,
+                "source": match["metadata"].get("source", "Unknown"),
+                "score": match["score"]
+            }
+            for match in best
+        ]
+    
+    def check_namespace_exists(self, namespace: str) -> bool:
+        """Check if a namespace has any vectors"""
+        try:
+            return self.store.namespace_stats(namespace)["vector_count"] > 0
+        except Exception as e:
+            print(f"Error checking namespace: {e}")
+            return False
+    
+    def get_namespace_stats(self, namespace: str) -> dict:
+        """Get statistics for a namespace"""
+        try:
+            return self.store.namespace_stats(namespace)
+        except Exception as e:
+            print(f"Error getting namespace stats: {e}")
+            return {"exists": False, "vector_count": 0, "error": str(e)}
+
+
+_pipeline: Optional[RAGPipeline] = None
+_pipeline_lock = Lock()
+
+
+def get_rag_pipeline() -> RAGPipeline:
+    """
+    Get the process-wide RAG pipeline. Its Cohere, Gemini and vector store
+    clients are created on first use - in the worker's lifespan, after the
+    serving process has started the worker - never at import time.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = RAGPipeline()
+    return _pipeline
@@ -0,0 +1,182 @@
+"""
+Readiness and liveness from cached dependency checks.
+
+Every worker probes its own MongoDB client, vector store, embedding API and
+LLM API on a background interval (READINESS_INTERVAL_SECONDS), with a
+timeout per probe, and keeps the last result and latency of each. The
+/health/ready and /health/live routes answer from that cache, so a load
+balancer polling every second costs the dependencies nothing.
+
+A worker is ready when every READINESS_CRITICAL check passed recently
+enough (READINESS_STALE_SECONDS). Non-critical checks (by default the
+embedding and LLM APIs, which every worker shares) are reported but never
+take a worker out of rotation: pulling all workers at once would turn a
+provider outage into a full one.
+"""
+
+import time
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import (
+    READINESS_CHECKS,
+    READINESS_CRITICAL,
+    READINESS_INTERVAL_SECONDS,
+    READINESS_TIMEOUT_SECONDS,
+    READINESS_STALE_SECONDS
+)
+from database import db
+from rag_pipeline import get_rag_pipeline
+from vector_store import get_vector_store
+
+
+Probe = Callable[[], Awaitable[None]]
+
+
+class ReadinessMonitor:
+    """Runs dependency probes in the background and caches their results"""
+
+    def __init__(
+        self,
+        critical: List[str] = READINESS_CRITICAL,
+        interval_seconds: float = READINESS_INTERVAL_SECONDS,
+        timeout_seconds: float = READINESS_TIMEOUT_SECONDS,
+        stale_seconds: float = READINESS_STALE_SECONDS
+    ):
+        self.critical = set(critical)
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.stale_seconds = stale_seconds
+        self._probes: Dict[str, Probe] = {}
+        self.results: Dict[str, dict] = {}
+        self.started_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, probe: Probe):
+        """Add a check; `probe` raises when the dependency is unusable"""
+        self._probes[name] = probe
+
+    async def _run_probe(self, name: str, probe: Probe) -> dict:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(probe(), timeout=self.timeout_seconds)
+            status, error = "ok", None
+        except asyncio.TimeoutError:
+            status, error = "fail", f"timed out after {self.timeout_seconds}s"
+        except Exception as e:
+            status, error = "fail", f"{type(e).__name__}: {e}"
+        result = {
+            "status": status,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "checked_at": datetime.utcnow(),
+            "critical": name in self.critical,
+            "_monotonic": time.monotonic()
+        }
+        if error:
+            result["error"] = error[:300]
+        return result
+
+    async def check_once(self) -> Dict[str, dict]:
+        """Run every probe concurrently and replace the cached results"""
+        names = list(self._probes)
+        results = await asyncio.gather(*(self._run_probe(name, self._probes[name]) for name in names))
+        for name, result in zip(names, results):
+            previous = self.results.get(name)
+            if result["status"] == "fail" and (previous is None or previous["status"] == "ok"):
+                print(f"⚠️ Readiness check '{name}' failed: {result.get('error')}")
+            elif result["status"] == "ok" and previous is not None and previous["status"] == "fail":
+                print(f"✅ Readiness check '{name}' recovered")
+        # One assignment, so readers never see a half-updated set
+        self.results = dict(zip(names, results))
+        return self.results
+
+    def ready(self) -> Tuple[bool, dict]:
+        """(ready, report) from the cache; never does I/O"""
+        now = time.monotonic()
+        checks = {}
+        ready = True
+        for name in self._probes:
+            result = self.results.get(name)
+            if result is None:
+                check = {"status": "unknown", "critical": name in self.critical}
+            else:
+                check = {k: v for k, v in result.items() if not k.startswith("_")}
+                age = now - result["_monotonic"]
+                check["age_seconds"] = round(age, 1)
+                if age > self.stale_seconds:
+                    check["status"] = "stale"
+            if check["critical"] and check["status"] != "ok":
+                ready = False
+            checks[name] = check
+        return ready, {"status": "ready" if ready else "not_ready", "checks": checks}
+
+    def live(self) -> dict:
+        """Liveness: answering at all means the event loop is serving requests"""
+        return {
+            "status": "alive",
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "checker_running": self._task is not None and not self._task.done()
+        }
+
+    def start(self):
+        """Start the background checks (call from the app lifespan); the first runs immediately"""
+        if self._task is None and self._probes:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check_once()
+            except Exception as e:
+                print(f"⚠️ Readiness checks errored: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+# ==================== DEPENDENCY PROBES ====================
+
+async def ping_mongo():
+    await db.ping()
+
+
+async def ping_vector_store():
+    await asyncio.to_thread(get_vector_store().ping)
+
+
+async def ping_embeddings():
+    await asyncio.to_thread(get_rag_pipeline().ping_embeddings)
+
+
+async def ping_llm():
+    await asyncio.to_thread(get_rag_pipeline().ping_llm)
+
+
+PROBES: Dict[str, Probe] = {
+    "mongo": ping_mongo,
+    "vector_store": ping_vector_store,
+    "embeddings": ping_embeddings,
+    "llm": ping_llm
+}
+
+
+def build_monitor(checks: List[str] = READINESS_CHECKS) -> ReadinessMonitor:
+    """A monitor with the configured dependency checks registered"""
+    monitor = ReadinessMonitor()
+    for name in checks:
+        if name not in PROBES:
+            raise ValueError(f"Unknown readiness check: {name} (expected one of {', '.join(PROBES)})")
+        monitor.register(name, PROBES[name])
+    return monitor
+
+
+# Global readiness monitor instance
+readiness = build_monitor()
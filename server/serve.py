@@ -0,0 +1,90 @@
+"""
+Production entry point: several uvicorn worker processes behind one socket.
+
+The parent process only binds the socket and supervises; each worker is a
+fresh (spawned) interpreter that imports main and creates its own MongoDB,
+Pinecone, Cohere and Gemini clients in the app lifespan, so no client or
+connection pool is ever shared across processes. CPU-bound request work
+(parsing, serialization, local vector search) spreads across cores.
+
+Supervisor signals (uvicorn's multiprocess manager):
+    SIGHUP           rolling restart, one worker at a time (e.g. after a deploy)
+    SIGTTIN/SIGTTOU  add/remove a worker
+    SIGINT/SIGTERM   graceful shutdown; in-flight requests get
+                     GRACEFUL_SHUTDOWN_SECONDS to finish
+Workers that die are replaced. With WORKER_MAX_REQUESTS set, each worker
+exits after that many requests and is replaced too (caps slow leaks).
+
+Workers write their Prometheus metrics to PROMETHEUS_MULTIPROC_DIR (a fresh
+temp directory unless set), so a /metrics scrape of any worker covers all.
+
+Usage:
+    python serve.py [--workers N] [--host HOST] [--port PORT]
+"""
+
+import os
+import sys
+import glob
+import shutil
+import argparse
+import tempfile
+
+import uvicorn
+
+from config import HOST, PORT, WEB_CONCURRENCY, GRACEFUL_SHUTDOWN_SECONDS, WORKER_MAX_REQUESTS
+
+
+def prepare_metrics_dir(workers: int) -> bool:
+    """
+    Give the workers a shared, empty Prometheus multiprocess directory.
+    True if a temporary one was created (remove it on exit).
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        if workers <= 1:
+            return False
+        path = tempfile.mkdtemp(prefix="legaleagle-metrics-")
+        # Inherited by the spawned workers
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+        return True
+    os.makedirs(path, exist_ok=True)
+    # Files from a previous run would be summed into this one's metrics
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+    return False
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the LegalEagle API with multiple worker processes")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY,
+                        help="Worker processes (0 = one per CPU core)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--graceful-shutdown", type=int, default=GRACEFUL_SHUTDOWN_SECONDS)
+    parser.add_argument("--max-requests", type=int, default=WORKER_MAX_REQUESTS,
+                        help="Recycle a worker after this many requests (0 = never)")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    temporary_metrics_dir = prepare_metrics_dir(workers)
+    print(f"🦅 Starting LegalEagle API with {workers} worker(s) on {args.host}:{args.port}")
+    try:
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            timeout_graceful_shutdown=args.graceful_shutdown,
+            limit_max_requests=args.max_requests or None,
+            # Workers are behind a load balancer; don't log every request twice
+            access_log=False,
+            proxy_headers=True
+        )
+    finally:
+        if temporary_metrics_dir:
+            shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
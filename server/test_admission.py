@@ -0,0 +1,167 @@
+"""
+Admission control tests (no services needed).
+
+Usage:
+    pytest test_admission.py
+"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, ConcurrencyLimiter, Overloaded, UserRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_concurrency_never_exceeds_the_cap():
+    peak = 0
+
+    async def scenario():
+        limiter = ConcurrencyLimiter("llm", limit=3, max_queue=20, max_wait=5)
+
+        async def work():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.active)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(work() for _ in range(12)))
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert peak == 3
+    assert limiter.admitted == 12 and limiter.active == 0 and limiter.waiting == 0
+
+
+def test_full_queue_is_rejected_immediately_with_retry_after():
+    async def scenario():
+        limiter = ConcurrencyLimiter("ingest", limit=1, max_queue=1, max_wait=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        assert limiter.active == 1 and limiter.waiting == 1
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(Overloaded) as rejected:
+            async with limiter.slot():
+                pass
+        assert loop.time() - start < 0.05
+        release.set()
+        await asyncio.gather(holder, queued)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "queue_full"
+    assert rejected.retry_after >= 1
+
+
+def test_waiting_longer_than_max_wait_is_rejected():
+    async def scenario():
+        limiter = ConcurrencyLimiter("llm", limit=1, max_queue=10, max_wait=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded, match="wait_timeout"):
+            async with limiter.slot():
+                pass
+        assert limiter.waiting == 0
+        release.set()
+        await holder
+        # The timed-out waiter did not leak a slot
+        async with limiter.slot():
+            assert limiter.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_expected_wait_over_budget_is_rejected_without_queueing():
+    async def scenario():
+        limiter = ConcurrencyLimiter("llm", limit=1, max_queue=10, max_wait=2)
+        limiter.admitted, limiter.mean_hold_seconds = 100, 5.0
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as rejected:
+            async with limiter.slot():
+                pass
+        release.set()
+        await holder
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "overloaded" and rejected.retry_after == 5
+
+
+def test_zero_limit_is_uncapped():
+    async def scenario():
+        limiter = ConcurrencyLimiter("embed", limit=0, max_queue=0)
+        async with limiter.slot():
+            async with limiter.slot():
+                return limiter.active
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_user_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    users = UserRateLimiter(rate_per_minute=60, burst=3, timer=clock)
+
+    for _ in range(3):
+        users.take("u1", "llm")
+    with pytest.raises(Overloaded) as limited:
+        users.take("u1", "llm")
+    assert limited.value.reason == "user_rate_limited" and limited.value.retry_after == 1
+
+    # Other users are unaffected
+    users.take("u2", "llm")
+    clock.now += 1.0
+    users.take("u1", "llm")
+
+
+def test_rate_limited_user_never_takes_a_slot():
+    async def scenario():
+        controller = AdmissionController(
+            {"llm": ConcurrencyLimiter("llm", limit=1, max_queue=0)},
+            UserRateLimiter(rate_per_minute=1, burst=1)
+        )
+        async with controller.admit("llm", "u1"):
+            pass
+        with pytest.raises(Overloaded, match="user_rate_limited"):
+            async with controller.admit("llm", "u1"):
+                pass
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["llm"]["admitted"] == 1 and stats["users"]["limited"] == 1
+
+
+def test_overloaded_becomes_429_with_retry_after():
+    import main
+
+    response = asyncio.run(main.overloaded_handler(None, Overloaded("llm", "queue_full", 2.2)))
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
@@ -0,0 +1,129 @@
+"""
+Cold archive tests.
+
+The blob round trip runs anywhere zstandard is installed; the archive /
+rehydrate scenarios run against a local mongod (MONGODB_TEST_URI, default
+mongodb://localhost:27017) in both message storage modes.
+
+Usage:
+    pytest test_archive.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("zstandard")
+
+from archive import ChatArchiver, pack_messages, unpack_messages
+from database import Database
+from deleter import ChatDeleter
+from migrations import migrate
+from test_deleter import FakeStore
+
+
+def test_blob_round_trip_keeps_ids_and_dates():
+    messages = [
+        {"_id": ObjectId(), "chat_id": "c1", "pos": i, "role": "user", "content": "The lessee shall " * 40,
+         "sources": [1, 2], "metadata": {"model": "fast"}, "created_at": datetime(2025, 1, 1, 12, 0, i)}
+        for i in range(20)
+    ]
+    blob = pack_messages(messages)
+    assert unpack_messages(blob) == messages
+    # Repetitive legal prose compresses well
+    assert len(blob) * 5 < sum(len(m["content"]) for m in messages)
+
+
+async def connect(uri: str, db_name: str, message_storage: str) -> Database:
+    database = Database(uri=uri, db_name=db_name, message_storage=message_storage)
+    await database.connect()
+    await migrate(database.db)
+    return database
+
+
+async def idle_chat(database: Database, exchanges: int, days_ago: int) -> str:
+    chat_id = await database.create_chat(user_id="u1")
+    for i in range(exchanges):
+        await database.add_exchange(chat_id=chat_id, question=f"Q{i}", answer=f"A{i}", metadata={"i": i})
+    await database.chats.update_one(
+        {"_id": ObjectId(chat_id)},
+        {"$set": {"updated_at": datetime.utcnow() - timedelta(days=days_ago)}}
+    )
+    return chat_id
+
+
+@pytest.mark.parametrize("storage", ["documents", "buckets"])
+def test_archive_moves_idle_chats_out_and_rehydrates(mongo_test_db, storage):
+    async def scenario():
+        database = await connect(*mongo_test_db, storage)
+        archiver = ChatArchiver(database, after_days=30, messages_per_blob=4)
+        try:
+            cold = await idle_chat(database, exchanges=5, days_ago=60)
+            active = await idle_chat(database, exchanges=2, days_ago=1)
+            before, _ = await database.get_chat_messages_page(cold, 100)
+
+            results = await archiver.run_once(limit=10)
+            assert [r["chat_id"] for r in results] == [cold]
+            assert results[0]["messages"] == 10 and results[0]["parts"] == 3
+
+            # The hot tier only holds the active chat
+            assert await database.messages.count_documents({"chat_id": cold}) == 0
+            assert await database.message_buckets.collection.count_documents({"chat_id": cold}) == 0
+            assert await database.archives.count_documents({"chat_id": cold}) == 3
+            assert (await database.get_chat(cold))["archived_at"]
+            assert len(await database.get_chat_messages(active)) == 4
+            assert await archiver.run_once(limit=10) == []
+
+            assert await archiver.rehydrate(cold) == 10
+            after, _ = await database.get_chat_messages_page(cold, 100)
+            assert after == before
+            assert "archived_at" not in await database.get_chat(cold)
+            assert await database.archives.count_documents({"chat_id": cold}) == 0
+
+            # Rehydrated chats keep working (and a second rehydrate is a no-op)
+            await database.add_exchange(chat_id=cold, question="Q5", answer="A5")
+            assert len(await database.get_chat_messages(cold)) == 12
+            assert await archiver.rehydrate(cold) == 0
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_archive_skips_chat_written_during_the_run(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db, "documents")
+        archiver = ChatArchiver(database, after_days=30)
+        try:
+            chat_id = await idle_chat(database, exchanges=2, days_ago=60)
+            [chat] = await archiver.find_idle_chats(limit=10)
+            await database.add_exchange(chat_id=chat_id, question="Back again", answer="Welcome")
+
+            assert await archiver.archive_chat(chat_id, chat["updated_at"]) is None
+            assert await database.archives.count_documents({"chat_id": chat_id}) == 0
+            assert len(await database.get_chat_messages(chat_id)) == 6
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_deleting_an_archived_chat_purges_its_archive(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db, "documents")
+        try:
+            chat_id = await idle_chat(database, exchanges=3, days_ago=60)
+            await ChatArchiver(database, after_days=30).run_once(limit=10)
+
+            deleter = ChatDeleter(database, store=FakeStore())
+            assert await deleter.schedule(chat_id)
+            assert await deleter.run_once()
+            assert await database.archives.count_documents({"chat_id": chat_id}) == 0
+            tombstone = await database.chats.find_one({"_id": ObjectId(chat_id)})
+            assert tombstone["deletion_stats"]["messages"] == 6
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
@@ -0,0 +1,64 @@
+"""
+Record cache tests (no MongoDB needed).
+
+Usage:
+    pytest test_cache.py
+"""
+
+from cache import RecordCache, request_scope
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = RecordCache("chat", ttl=30, timer=clock)
+    cache.set("c1", {"title": "Lease"})
+
+    clock.now = 29
+    assert cache.get("c1") == {"title": "Lease"}
+    clock.now = 31
+    assert cache.get("c1") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_returned_records_are_copies():
+    cache = RecordCache("chat", ttl=30)
+    cache.set("c1", {"title": "Lease"})
+
+    cache.get("c1")["title"] = "Mutated"
+    assert cache.get("c1")["title"] == "Lease"
+
+
+def test_update_and_invalidate():
+    cache = RecordCache("user", ttl=30)
+    cache.update("u1", {"query_count": 1})
+    assert cache.get("u1") is None
+
+    cache.set("u1", {"query_count": 1, "is_premium": False})
+    cache.update("u1", {"query_count": 2})
+    assert cache.get("u1") == {"query_count": 2, "is_premium": False}
+
+    cache.invalidate("u1")
+    assert cache.get("u1") is None
+
+
+def test_request_memo_works_with_ttl_cache_disabled():
+    cache = RecordCache("chat", ttl=0)
+    cache.set("c1", {"title": "Lease"})
+    assert cache.get("c1") is None
+
+    with request_scope():
+        cache.set("c1", {"title": "Lease"})
+        assert cache.get("c1") == {"title": "Lease"}
+        cache.invalidate("c1")
+        assert cache.get("c1") is None
+
+    # The memo does not outlive the request
+    assert cache.get("c1") is None
@@ -0,0 +1,101 @@
+"""
+Response compression tests (no services needed).
+
+Usage:
+    pytest test_compression.py
+"""
+
+import gzip
+import asyncio
+
+import brotli
+from fastapi.responses import Response, StreamingResponse
+
+from compression import CompressionMiddleware, choose_encoding
+
+
+BODY = b'{"messages": "' + b"Clause 12 survives termination. " * 100 + b'"}'
+
+
+def run(app, accept_encoding="br, gzip", minimum_size=1024):
+    """One GET through CompressionMiddleware(app); (status, headers, body)"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "query_string": b"",
+             "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=minimum_size)(scope, receive, send))
+    headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def respond(body=BODY, media_type="application/json", headers=None):
+    async def app(scope, receive, send):
+        await Response(body, media_type=media_type, headers=headers)(scope, receive, send)
+    return app
+
+
+def test_choose_encoding_prefers_brotli_and_honours_q_values():
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip, deflate, br", brotli_available=False) == "gzip"
+    assert choose_encoding("br;q=0, gzip;q=0.5") == "gzip"
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("") is None
+
+
+def test_large_json_is_compressed_and_round_trips():
+    status, headers, body = run(respond(), "br")
+    assert status == 200 and headers["content-encoding"] == "br"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(body) < len(BODY)
+    assert brotli.decompress(body) == BODY
+
+    _, headers, body = run(respond(), "gzip")
+    assert headers["content-encoding"] == "gzip" and gzip.decompress(body) == BODY
+
+
+def test_small_and_incompressible_bodies_are_left_alone():
+    _, headers, body = run(respond(b'{"ok": true}'))
+    assert "content-encoding" not in headers and body == b'{"ok": true}'
+    assert headers["vary"] == "Accept-Encoding"
+
+    _, headers, body = run(respond(BODY, media_type="application/pdf"))
+    assert "content-encoding" not in headers and "vary" not in headers and body == BODY
+
+
+def test_client_without_accept_encoding_gets_identity():
+    _, headers, body = run(respond(), "identity")
+    assert "content-encoding" not in headers and body == BODY
+
+
+def test_etag_is_weakened_on_compressed_responses():
+    _, headers, _ = run(respond(headers={"ETag": '"abc"'}), "gzip")
+    assert headers["etag"] == 'W/"abc"'
+
+
+def test_streamed_responses_are_compressed_chunk_by_chunk():
+    async def chunks():
+        for _ in range(5):
+            yield BODY
+
+    async def app(scope, receive, send):
+        await StreamingResponse(chunks(), media_type="text/plain")(scope, receive, send)
+
+    _, headers, body = run(app, "gzip")
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    assert gzip.decompress(body) == BODY * 5
+
+
+def test_app_responses_are_negotiated():
+    import main
+    from fastapi.testclient import TestClient
+
+    response = TestClient(main.app).get("/templates", headers={"Accept-Encoding": "br"})
+    assert response.status_code == 200 and response.headers["content-encoding"] == "br"
+    assert response.json()["templates"]
@@ -0,0 +1,94 @@
+"""
+Write-behind counter tests (no MongoDB needed).
+
+Usage:
+    pytest test_counters.py
+"""
+
+import asyncio
+
+import pytest
+
+from counters import CounterAggregator
+
+
+class FakeUsers:
+    """Records bulk_write calls; fails the first `failures` of them"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongod unavailable")
+        self.batches.append([(op._filter, op._doc) for op in operations])
+
+
+class FakeDatabase:
+    def __init__(self, users: FakeUsers):
+        self.users = users
+
+
+def increments(batch) -> dict:
+    return {query["user_id"]: update["$inc"] for query, update in batch}
+
+
+def test_increments_are_summed_into_one_bulk_write():
+    users = FakeUsers()
+    counters = CounterAggregator(FakeDatabase(users))
+    for _ in range(3):
+        counters.add("u1", "query_count")
+    counters.add("u2", "query_count", 2)
+
+    assert asyncio.run(counters.flush()) == 2
+    assert increments(users.batches[0]) == {"u1": {"query_count": 3}, "u2": {"query_count": 2}}
+    assert counters.pending("u1") == {}
+    # Nothing pending, no round trip
+    assert asyncio.run(counters.flush()) == 0
+    assert len(users.batches) == 1
+
+
+def test_failed_flush_keeps_counts_for_the_next_one():
+    users = FakeUsers(failures=1)
+    counters = CounterAggregator(FakeDatabase(users))
+    counters.add("u1", "query_count")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(counters.flush())
+    counters.add("u1", "query_count")
+    asyncio.run(counters.flush())
+
+    assert increments(users.batches[0]) == {"u1": {"query_count": 2}}
+    assert counters.failures == 1
+
+
+def test_periodic_flush_and_flush_on_stop():
+    users = FakeUsers()
+
+    async def scenario():
+        counters = CounterAggregator(FakeDatabase(users), flush_seconds=0.05)
+        counters.start()
+        counters.add("u1", "query_count")
+        await asyncio.sleep(0.2)
+        counters.add("u1", "query_count")
+        await counters.stop()
+
+    asyncio.run(scenario())
+    assert [increments(batch) for batch in users.batches] == [{"u1": {"query_count": 1}}] * 2
+
+
+def test_too_many_pending_users_flushes_early():
+    users = FakeUsers()
+
+    async def scenario():
+        counters = CounterAggregator(FakeDatabase(users), flush_seconds=60, max_pending_users=2)
+        counters.start()
+        counters.add("u1", "query_count")
+        counters.add("u2", "query_count")
+        await asyncio.sleep(0.05)
+        assert len(users.batches) == 1
+        await counters.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,203 @@
+"""
+Database write-path tests.
+
+Runs against a local mongod (MONGODB_TEST_URI, default mongodb://localhost:27017)
+and counts the commands each operation sends, so extra round trips fail the test.
+
+Usage:
+    pytest test_database.py
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo import monitoring
+
+from database import Database, encode_cursor, decode_cursor
+from migrations import migrate
+
+
+# Driver housekeeping that is not part of an operation's round trips
+HANDSHAKE_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Records the name of every command sent to the server"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in HANDSHAKE_COMMANDS:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def connect(uri: str, db_name: str, counter: CommandCounter) -> Database:
+    database = Database(uri=uri, db_name=db_name)
+    await database.connect(event_listeners=[counter])
+    await migrate(database.db)
+    return database
+
+
+def test_add_exchange_round_trips(mongo_test_db):
+    async def scenario():
+        counter = CommandCounter()
+        database = await connect(*mongo_test_db, counter)
+        try:
+            chat_id = await database.create_chat(user_id="u1")
+            await database.get_or_create_user("u1")
+
+            counter.commands.clear()
+            user_msg_id, assistant_msg_id = await database.add_exchange(
+                chat_id=chat_id,
+                question="What is the effective date?",
+                answer="January 1, 2025.",
+                user_id="u1",
+                sources=[1]
+            )
+
+            # One insert for both messages and one chat update; query_count is written behind
+            assert sorted(counter.commands) == ["insert", "update"]
+
+            messages = await database.get_chat_messages(chat_id)
+            assert [m["_id"] for m in messages] == [user_msg_id, assistant_msg_id]
+            assert [m["role"] for m in messages] == ["user", "assistant"]
+
+            chat = await database.get_chat(chat_id)
+            assert chat["title"] == "What is the effective date?"
+
+            assert database.counters.pending("u1") == {"query_count": 1}
+            await database.counters.flush()
+            user = await database.users.find_one({"user_id": "u1"})
+            assert user["query_count"] == 1
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_add_exchange_keeps_existing_title(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db, CommandCounter())
+        try:
+            chat_id = await database.create_chat(user_id="u1", title="Lease review")
+            await database.add_exchange(chat_id=chat_id, question="Who is the landlord?", answer="Acme LLC.")
+
+            chat = await database.get_chat(chat_id)
+            assert chat["title"] == "Lease review"
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_error_exchange_does_not_count_query(mongo_test_db):
+    async def scenario():
+        counter = CommandCounter()
+        database = await connect(*mongo_test_db, counter)
+        try:
+            chat_id = await database.create_chat(user_id="u1")
+            await database.get_or_create_user("u1")
+
+            counter.commands.clear()
+            await database.add_exchange(
+                chat_id=chat_id,
+                question="What is the term?",
+                answer="I encountered an error processing your request. Please try again.",
+                user_id="u1",
+                metadata={"error": "boom"},
+                count_query=False
+            )
+
+            assert sorted(counter.commands) == ["insert", "update"]
+            assert database.counters.pending("u1") == {}
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 3, 1, 12, 30, 45, 123000)
+    doc_id = ObjectId()
+
+    assert decode_cursor(encode_cursor(created_at, doc_id)) == (created_at, doc_id)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_message_pages_cover_history_once(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db, CommandCounter())
+        try:
+            chat_id = await database.create_chat(user_id="u1")
+            # Exchanges share a created_at, so pages must break ties on _id
+            for i in range(7):
+                await database.add_exchange(chat_id=chat_id, question=f"Q{i}", answer=f"A{i}")
+
+            seen, cursor = [], None
+            while True:
+                page, cursor = await database.get_chat_messages_page(chat_id, limit=3, cursor=cursor)
+                seen.extend(m["content"] for m in page)
+                if cursor is None:
+                    break
+
+            assert seen == [text for i in range(7) for text in (f"Q{i}", f"A{i}")]
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_chat_pages_most_recent_first(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db, CommandCounter())
+        try:
+            chat_ids = [await database.create_chat(user_id="u1", title=f"Chat {i}") for i in range(5)]
+
+            first, cursor = await database.get_user_chats_page("u1", limit=2)
+            rest, last_cursor = await database.get_user_chats_page("u1", limit=10, cursor=cursor)
+
+            assert [c["_id"] for c in first + rest] == list(reversed(chat_ids))
+            assert last_cursor is None
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_hot_records_are_read_once_and_kept_fresh(mongo_test_db):
+    async def scenario():
+        counter = CommandCounter()
+        database = await connect(*mongo_test_db, counter)
+        try:
+            chat_id = await database.create_chat(user_id="u1")
+            await database.get_or_create_user("u1")
+
+            counter.commands.clear()
+            await database.get_chat(chat_id)
+            await database.get_chat(chat_id)
+            await database.check_user_limits("u1")
+            assert counter.commands == ["find"]
+
+            await database.add_exchange(chat_id=chat_id, question="Who signs?", answer="Both parties.", user_id="u1")
+            await database.upgrade_to_premium("u1")
+
+            counter.commands.clear()
+            chat = await database.get_chat(chat_id)
+            user = await database.get_user("u1")
+            assert counter.commands == []
+            assert chat == {**(await database.chats.find_one({"_id": ObjectId(chat_id)})), "_id": chat_id}
+            assert user["query_count"] == 1 and user["is_premium"]
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
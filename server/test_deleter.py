@@ -0,0 +1,108 @@
+"""
+Background chat deletion tests.
+
+Runs against a local mongod (MONGODB_TEST_URI, default mongodb://localhost:27017)
+with an in-memory stand-in for the vector store.
+
+Usage:
+    pytest test_deleter.py
+"""
+
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from database import Database
+from migrations import migrate
+from deleter import ChatDeleter
+
+
+class FakeStore:
+    """Records namespace deletes; fails the first `failures` calls"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.deleted = []
+
+    def delete_namespace(self, namespace):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("vector store unavailable")
+        self.deleted.append(namespace)
+
+
+async def connect(uri: str, db_name: str) -> Database:
+    database = Database(uri=uri, db_name=db_name)
+    await database.connect()
+    await migrate(database.db)
+    return database
+
+
+async def seeded_chat(database: Database) -> str:
+    chat_id = await database.create_chat(user_id="u1")
+    for i in range(5):
+        await database.add_exchange(chat_id=chat_id, question=f"Q{i}", answer=f"A{i}")
+    await database.add_document(chat_id=chat_id, filename="lease.pdf", num_chunks=3)
+    return chat_id
+
+
+def test_delete_hides_chat_then_purges_in_batches(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db)
+        store = FakeStore()
+        deleter = ChatDeleter(database, store=store, batch_size=3)
+        try:
+            chat_id = await seeded_chat(database)
+            await database.get_chat(chat_id)
+
+            assert await deleter.schedule(chat_id)
+            assert not await deleter.schedule(chat_id)
+            assert await database.get_chat(chat_id) is None
+            assert await database.get_user_chats("u1") == []
+
+            assert await deleter.run_once()
+            assert not await deleter.run_once()
+
+            assert store.deleted == [chat_id]
+            assert await database.messages.count_documents({"chat_id": chat_id}) == 0
+            assert await database.documents.count_documents({"chat_id": chat_id}) == 0
+            tombstone = await database.chats.find_one({"_id": ObjectId(chat_id)})
+            assert tombstone["deletion_status"] == "done"
+            assert tombstone["deletion_stats"] == {"messages": 10, "documents": 1}
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_failed_purge_is_retried(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db)
+        store = FakeStore(failures=1)
+        deleter = ChatDeleter(database, store=store)
+        try:
+            chat_id = await seeded_chat(database)
+            await deleter.schedule(chat_id)
+
+            assert await deleter.run_once()
+            tombstone = await database.chats.find_one({"_id": ObjectId(chat_id)})
+            assert tombstone["deletion_status"] == "pending"
+            assert tombstone["deletion_attempts"] == 1
+            assert "unavailable" in tombstone["deletion_error"]
+
+            # Not due yet: backoff keeps it out of the queue
+            assert not await deleter.run_once()
+
+            await database.chats.update_one(
+                {"_id": ObjectId(chat_id)}, {"$set": {"deletion_next_attempt": datetime.utcnow()}}
+            )
+            assert await deleter.run_once()
+            assert store.deleted == [chat_id]
+            tombstone = await database.chats.find_one({"_id": ObjectId(chat_id)})
+            assert tombstone["deletion_status"] == "done"
+            assert "deletion_error" not in tombstone
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
@@ -0,0 +1,121 @@
+"""
+Cross-worker cache invalidation tests.
+
+Eviction rules are checked with hand-built change events; the end-to-end
+test runs two "workers" (Database instances) against a local single-node
+replica set (MONGODB_TEST_URI, see the mongo_replset_db fixture).
+
+Usage:
+    pytest test_invalidation.py
+"""
+
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from cache import RecordCache
+from database import Database
+from invalidation import CacheInvalidator
+from migrations import migrate
+
+
+T1 = datetime(2025, 6, 1, 12, 0, 0, 123000)
+T2 = datetime(2025, 6, 1, 12, 0, 5, 456000)
+
+
+def update_event(doc_id, **fields) -> dict:
+    return {
+        "operationType": "update",
+        "documentKey": {"_id": doc_id},
+        "updateDescription": {"updatedFields": fields}
+    }
+
+
+def test_foreign_writes_evict_and_own_writes_do_not():
+    invalidator = CacheInvalidator(Database(), enabled=True)
+    cache = RecordCache("chat", ttl=30)
+    cache.set("c1", {"title": "Lease", "updated_at": T1})
+
+    # Same updated_at as the cached record: this worker wrote it
+    assert not invalidator.apply(cache, "c1", update_event("c1", updated_at=T1))
+    assert cache.peek("c1") is not None
+
+    assert invalidator.apply(cache, "c1", update_event("c1", updated_at=T2))
+    assert cache.peek("c1") is None
+    assert (invalidator.events, invalidator.evictions) == (2, 1)
+
+
+def test_writes_without_updated_at_and_deletes_evict():
+    invalidator = CacheInvalidator(Database(), enabled=True)
+    cache = RecordCache("chat", ttl=30)
+
+    cache.set("c1", {"updated_at": T1})
+    assert invalidator.apply(cache, "c1", update_event("c1", archived_at=T2))
+
+    cache.set("c1", {"updated_at": T1})
+    assert invalidator.apply(cache, "c1", {"operationType": "delete", "documentKey": {"_id": "c1"}})
+
+    # Nothing cached, nothing to do
+    assert not invalidator.apply(cache, "c2", update_event("c2", updated_at=T2))
+    assert not invalidator.apply(cache, None, update_event("c3", updated_at=T2))
+
+
+def test_user_entries_are_found_by_document_id():
+    cache = RecordCache("user", ttl=30, id_field="_id")
+    oid = ObjectId()
+    cache.set("u1", {"_id": oid, "user_id": "u1", "updated_at": T1})
+
+    assert cache.key_for_id(oid) == "u1"
+    assert cache.key_for_id(ObjectId()) is None
+    cache.clear()
+    assert cache.key_for_id(oid) is None
+
+
+async def wait_for(condition, timeout: float = 10):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out waiting for invalidation"
+        await asyncio.sleep(0.05)
+
+
+def test_writes_on_one_worker_evict_the_other_workers_cache(mongo_replset_db):
+    uri, db_name = mongo_replset_db
+
+    async def scenario():
+        worker_a = Database(uri=uri, db_name=db_name)
+        worker_b = Database(uri=uri, db_name=db_name)
+        await worker_a.connect()
+        await worker_b.connect()
+        await migrate(worker_a.db)
+        invalidator = CacheInvalidator(worker_a, enabled=True, retry_seconds=0.1)
+        invalidator.start()
+        try:
+            await invalidator.wait_ready()
+            chat_id = await worker_a.create_chat(user_id="u1")
+            await worker_a.get_or_create_user("u1")
+            await worker_a.get_chat(chat_id)
+
+            # Worker A's own writes keep its (write-through) entries
+            await worker_a.add_exchange(chat_id=chat_id, question="Q", answer="A", user_id="u1")
+            await worker_a.update_chat(chat_id, {"title": "Lease"})
+            await worker_a.get_chat(chat_id)
+            # chat bump + query_count $inc + rename (inserts are filtered out)
+            await wait_for(lambda: invalidator.events >= 3)
+            assert worker_a.chat_cache.peek(chat_id) is not None
+            assert worker_a.user_cache.peek("u1") is not None
+
+            # Worker B's writes evict them
+            await worker_b.update_chat(chat_id, {"title": "Renamed elsewhere"})
+            await wait_for(lambda: worker_a.chat_cache.peek(chat_id) is None)
+            assert (await worker_a.get_chat(chat_id))["title"] == "Renamed elsewhere"
+
+            await worker_b.upgrade_to_premium("u1")
+            await wait_for(lambda: worker_a.user_cache.peek("u1") is None)
+            assert (await worker_a.get_user("u1"))["is_premium"]
+        finally:
+            await invalidator.stop()
+            await worker_a.disconnect()
+            await worker_b.disconnect()
+
+    asyncio.run(scenario())
@@ -0,0 +1,102 @@
+"""
+Bucketed message storage and migration tests.
+
+Runs against a local mongod (MONGODB_TEST_URI, default mongodb://localhost:27017).
+
+Usage:
+    pytest test_message_buckets.py
+"""
+
+import asyncio
+
+from pymongo import MongoClient
+
+from database import Database
+from migrations import migrate
+from migrate_messages import to_buckets, to_documents
+
+
+BUCKET_SIZE = 4
+
+
+async def connect(uri: str, db_name: str, storage: str) -> Database:
+    database = Database(uri=uri, db_name=db_name, message_storage=storage)
+    await database.connect()
+    await migrate(database.db)
+    database.message_buckets.bucket_size = BUCKET_SIZE
+    return database
+
+
+async def read_all(database: Database, chat_id: str, page_size: int) -> list:
+    contents, cursor = [], None
+    while True:
+        page, cursor = await database.get_chat_messages_page(chat_id, limit=page_size, cursor=cursor)
+        contents.extend(m["content"] for m in page)
+        if cursor is None:
+            return contents
+
+
+EXPECTED = [text for i in range(7) for text in (f"Q{i}", f"A{i}")]
+
+
+def test_bucketed_appends_pages_and_context(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db, "buckets")
+        try:
+            chat_id = await database.create_chat(user_id="u1")
+            for i in range(7):
+                await database.add_exchange(chat_id=chat_id, question=f"Q{i}", answer=f"A{i}")
+
+            buckets = await database.message_buckets.collection.find({"chat_id": chat_id}).sort("seq", 1).to_list(None)
+            assert [b["count"] for b in buckets] == [4, 4, 4, 2]
+            assert await database.messages.count_documents({}) == 0
+
+            assert await read_all(database, chat_id, page_size=5) == EXPECTED
+            context = await database.get_chat_context(chat_id, max_messages=5)
+            assert [m["content"] for m in context] == EXPECTED[-5:]
+            assert (await database.get_chat(chat_id))["title"] == "Q0"
+
+            assert await database.purge_chat_messages(chat_id, batch_size=10) == 14
+            assert await database.message_buckets.collection.count_documents({}) == 0
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_migration_round_trip(mongo_test_db):
+    uri, db_name = mongo_test_db
+
+    async def seed():
+        database = await connect(uri, db_name, "documents")
+        try:
+            chat_id = await database.create_chat(user_id="u1")
+            for i in range(7):
+                await database.add_exchange(chat_id=chat_id, question=f"Q{i}", answer=f"A{i}")
+            return chat_id
+        finally:
+            await database.disconnect()
+
+    async def read(storage: str, chat_id: str) -> list:
+        database = await connect(uri, db_name, storage)
+        try:
+            return await read_all(database, chat_id, page_size=3)
+        finally:
+            await database.disconnect()
+
+    chat_id = asyncio.run(seed())
+    client = MongoClient(uri)
+    try:
+        db = client[db_name]
+        # Running twice must not duplicate anything
+        to_buckets(db, [chat_id], BUCKET_SIZE, delete_source=False, dry_run=False)
+        assert to_buckets(db, [chat_id], BUCKET_SIZE, delete_source=True, dry_run=False) == 14
+        assert db.messages.count_documents({}) == 0
+        assert asyncio.run(read("buckets", chat_id)) == EXPECTED
+
+        to_documents(db, [chat_id], delete_source=False, dry_run=False)
+        to_documents(db, [chat_id], delete_source=True, dry_run=False)
+        assert db.messages.count_documents({}) == 14
+        assert asyncio.run(read("documents", chat_id)) == EXPECTED
+    finally:
+        client.close()
@@ -0,0 +1,127 @@
+"""
+Prometheus metrics tests (the app is exercised without its lifespan, so no
+MongoDB or model APIs are needed).
+
+Usage:
+    pytest test_metrics.py
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from cache import RecordCache
+from metrics import stage, record_token_usage
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_is_observed_even_when_it_raises():
+    before = sample("legaleagle_stage_duration_seconds_count", stage="split")
+    with stage("split"):
+        pass
+    with pytest.raises(ValueError):
+        with stage("split"):
+            raise ValueError("bad chunk")
+    assert sample("legaleagle_stage_duration_seconds_count", stage="split") == before + 2
+
+
+def test_token_usage_is_counted_per_model_and_direction():
+    before = sample("legaleagle_llm_tokens_total", direction="in", model="gemini-test")
+    record_token_usage({"gemini-test": {"input_tokens": 120, "output_tokens": 30, "total_tokens": 150}})
+    assert sample("legaleagle_llm_tokens_total", direction="in", model="gemini-test") == before + 120
+    assert sample("legaleagle_llm_tokens_total", direction="out", model="gemini-test") >= 30
+
+
+def test_cache_lookups_are_counted():
+    cache = RecordCache("metrics_test", ttl=60)
+    cache.set("a", {"_id": "a"})
+    cache.get("a")
+    cache.get("b")
+    assert sample("legaleagle_cache_lookups_total", cache="metrics_test", result="hit") == 1
+    assert sample("legaleagle_cache_lookups_total", cache="metrics_test", result="miss") == 1
+
+
+def test_requests_are_labelled_by_route_template():
+    import main
+
+    client = TestClient(main.app)
+    assert client.get("/templates/legal_assistant").status_code == 200
+    assert client.get("/templates/no_such_template").status_code == 404
+
+    body = client.get("/metrics").text
+    assert 'route="/templates/{template_id}",status="200"' in body
+    assert 'route="/templates/{template_id}",status="404"' in body
+    assert "no_such_template" not in body
+    assert 'legaleagle_stage_duration_seconds_count{stage="llm_generate"}' in body
+
+
+# ==================== SERVER-TIMING ====================
+
+def test_stages_and_mongo_commands_add_to_the_request_timings():
+    from types import SimpleNamespace
+    from metrics import MongoCommandMetrics, request_timings
+
+    with request_timings() as timings:
+        with stage("query_embed"):
+            time.sleep(0.002)
+        with stage("chunk_embed"):
+            time.sleep(0.002)
+        MongoCommandMetrics().succeeded(SimpleNamespace(command_name="find", duration_micros=2500))
+
+    result = timings.as_dict()
+    assert result["db"] == 2.5
+    assert result["embed"] >= 4 and result["llm"] == 0.0
+    header = timings.header()
+    assert header.startswith("db;dur=2.5, embed;dur=") and "persist;dur=0.0" in header and "total;dur=" in header
+
+
+def test_every_response_carries_server_timing():
+    import main
+
+    response = TestClient(main.app).get("/templates")
+    assert response.status_code == 200
+    names = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert names[:5] == ["db", "embed", "retrieve", "llm", "persist"] and "total" in names
+
+
+def test_debug_query_reports_retrieval_and_token_counts(monkeypatch, tmp_path):
+    import asyncio
+
+    from langchain_core.language_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+
+    from model_router import ModelRouter
+    from rag_pipeline import RAGPipeline
+    from vector_store import LocalVectorStore
+
+    class FakeEmbeddings:
+        def embed_query(self, text):
+            return [1.0, 0.0, 0.0, 0.0]
+
+    pipeline = RAGPipeline.__new__(RAGPipeline)
+    pipeline.embeddings = FakeEmbeddings()
+    pipeline.router = ModelRouter()
+    pipeline.store = LocalVectorStore(root=str(tmp_path), dim=4, quantization="none")
+    pipeline.store.upsert("chat1", ["c1", "c2"], [[1, 0, 0, 0], [0, 1, 0, 0]], [
+        {"text": "Termination needs 30 days notice.", "page": 2, "source": "lease.pdf"},
+        {"text": "Rent is due monthly.", "page": 0, "source": "lease.pdf"}
+    ])
+    reply = AIMessage(
+        content="30 days.",
+        usage_metadata={"input_tokens": 210, "output_tokens": 4, "total_tokens": 214},
+        response_metadata={"model_name": "fake-gemini"}
+    )
+    monkeypatch.setattr(pipeline, "get_llm", lambda route=None, temperature=None: GenericFakeChatModel(messages=iter([reply])))
+
+    debug_info = {}
+    answer, sources = asyncio.run(pipeline.query("Notice period?", "chat1", top_k=2, debug_info=debug_info))
+
+    assert answer == "30 days." and sources == [1, 3]
+    assert [chunk["id"] for chunk in debug_info["chunks"]] == ["c1", "c2"]
+    assert debug_info["chunks"][0]["score"] > debug_info["chunks"][1]["score"]
+    assert debug_info["prompt_tokens"] == 210 and debug_info["completion_tokens"] == 4
@@ -0,0 +1,82 @@
+"""
+Schema migration tests.
+
+The ordering check runs anywhere; the rest run against a local mongod
+(MONGODB_TEST_URI, default mongodb://localhost:27017).
+
+Usage:
+    pytest test_migrations.py
+"""
+
+import asyncio
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from database import Database
+from migrations import MIGRATIONS, SCHEMA_VERSION, get_schema_version, migrate, _acquire_lock
+
+
+def test_versions_are_sequential():
+    assert [m.version for m in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+    assert SCHEMA_VERSION == len(MIGRATIONS)
+
+
+def test_migrate_builds_indexes_once(mongo_test_db):
+    uri, db_name = mongo_test_db
+
+    async def scenario():
+        client = AsyncIOMotorClient(uri)
+        db = client[db_name]
+        try:
+            assert await get_schema_version(db) == 0
+            assert len(await migrate(db)) == SCHEMA_VERSION
+            assert await get_schema_version(db) == SCHEMA_VERSION
+            assert await migrate(db) == []
+
+            chat_indexes = await db.chats.index_information()
+            assert "user_id_1_is_active_1_updated_at_-1__id_-1" in chat_indexes
+            assert "user_id_1" not in chat_indexes
+            assert (await db.users.index_information())["user_id_1"]["unique"]
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_workers_only_verify_the_version(mongo_test_db):
+    uri, db_name = mongo_test_db
+
+    async def scenario():
+        database = Database(uri=uri, db_name=db_name)
+        await database.connect()
+        try:
+            # connect() no longer builds indexes
+            assert await database.db.list_collection_names() == []
+            assert await database.verify_schema() == 0
+            with pytest.raises(RuntimeError):
+                await database.verify_schema(strict=True)
+
+            await migrate(database.db)
+            assert await database.verify_schema(strict=True) == SCHEMA_VERSION
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_runs_are_locked_out(mongo_test_db):
+    uri, db_name = mongo_test_db
+
+    async def scenario():
+        client = AsyncIOMotorClient(uri)
+        db = client[db_name]
+        try:
+            await _acquire_lock(db, "other-host:1")
+            with pytest.raises(RuntimeError):
+                await migrate(db)
+            assert await get_schema_version(db) == 0
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,26 @@
+"""
+Response shape tests for the fast read-endpoint serialization.
+
+chat_to_dict / message_to_dict bypass model validation, so they must keep
+producing exactly what ChatResponse / MessageResponse would.
+
+Usage:
+    pytest test_models.py
+"""
+
+from datetime import datetime
+
+from models import ChatResponse, MessageResponse, chat_to_dict, message_to_dict
+
+
+def test_row_dicts_match_response_models():
+    now = datetime(2025, 1, 1, 9, 30, 0, 123000)
+    chat = {"_id": "c1", "user_id": "u1", "title": "Lease", "prompt_template": "legal_assistant",
+            "created_at": now, "updated_at": now, "is_active": True}
+    msg = {"_id": "m1", "chat_id": "c1", "role": "assistant", "content": "Yes.",
+           "sources": [2], "created_at": now}
+
+    assert chat_to_dict(chat) == ChatResponse.model_validate(chat_to_dict(chat)).model_dump()
+    assert message_to_dict(msg) == MessageResponse.model_validate(message_to_dict(msg)).model_dump()
+    assert set(chat_to_dict(chat)) == set(ChatResponse.model_fields)
+    assert set(message_to_dict(msg)) == set(MessageResponse.model_fields)
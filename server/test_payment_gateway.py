@@ -0,0 +1,129 @@
+"""
+Payment gateway tests (no network: Razorpay is replaced by an httpx mock transport).
+
+Usage:
+    pytest test_payment_gateway.py
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from payment_gateway import FakePaymentGateway, PaymentGatewayError, RazorpayGateway, payment_signature
+
+
+ORDER = {"amount": 49900, "currency": "INR", "receipt": "ord_u1_1", "notes": {"user_id": "u1"}}
+
+
+def razorpay(handler, max_retries: int = 2) -> RazorpayGateway:
+    return RazorpayGateway(
+        key_id="rzp_test_key",
+        key_secret="secret",
+        base_url="https://razorpay.test/v1",
+        max_retries=max_retries,
+        transport=httpx.MockTransport(handler)
+    )
+
+
+def test_create_order_posts_to_razorpay():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"id": "order_123", "status": "created"})
+
+    async def scenario():
+        gateway = razorpay(handler)
+        try:
+            return await gateway.create_order(**ORDER)
+        finally:
+            await gateway.close()
+
+    assert asyncio.run(scenario())["id"] == "order_123"
+    [request] = requests
+    assert request.method == "POST" and request.url.path == "/v1/orders"
+    assert request.headers["authorization"].startswith("Basic ")
+
+
+def test_transient_failures_are_retried():
+    responses = iter([
+        httpx.ConnectError("refused"),
+        httpx.Response(503, json={"error": {"description": "busy"}}),
+        httpx.Response(200, json={"id": "order_123"}),
+    ])
+
+    def handler(request):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def scenario():
+        gateway = razorpay(handler)
+        try:
+            return await gateway.create_order(**ORDER)
+        finally:
+            await gateway.close()
+
+    assert asyncio.run(scenario())["id"] == "order_123"
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error": {"description": "amount exceeds maximum"}})
+
+    async def scenario():
+        gateway = razorpay(handler)
+        try:
+            await gateway.create_order(**ORDER)
+        finally:
+            await gateway.close()
+
+    with pytest.raises(PaymentGatewayError, match="amount exceeds maximum") as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 400
+    assert len(calls) == 1
+
+
+def test_unreachable_gateway_raises_after_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("timed out")
+
+    async def scenario():
+        gateway = razorpay(handler, max_retries=1)
+        try:
+            await gateway.create_order(**ORDER)
+        finally:
+            await gateway.close()
+
+    with pytest.raises(PaymentGatewayError, match="unreachable"):
+        asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_signature_verification():
+    gateway = razorpay(lambda request: httpx.Response(500))
+    signature = payment_signature("secret", "order_1", "pay_1")
+
+    assert gateway.verify_payment_signature("order_1", "pay_1", signature)
+    assert not gateway.verify_payment_signature("order_1", "pay_2", signature)
+    assert not gateway.verify_payment_signature("order_1", "pay_1", None)
+    asyncio.run(gateway.close())
+
+
+def test_fake_gateway_round_trip():
+    gateway = FakePaymentGateway()
+    order = asyncio.run(gateway.create_order(**ORDER))
+
+    assert order["id"].startswith("order_") and order["amount"] == 49900
+    assert gateway.verify_payment_signature(order["id"], "pay_1", gateway.sign(order["id"], "pay_1"))
+    assert not gateway.verify_payment_signature(order["id"], "pay_1", "forged")
+    # Only orders it created can be paid
+    assert not gateway.verify_payment_signature("order_other", "pay_1", gateway.sign("order_other", "pay_1"))
@@ -356,7 +356,7 @@ class LegalEagleTest:
             return False
     
     def test_delete_chat(self) -> bool:
-        """Test deleting a chat (deletes from MongoDB and Pinecone)"""
+        """Test deleting a chat (data is purged from MongoDB and the vector store in the background)"""
         log_header("Testing Chat Deletion")
         
         if not self.chat_id:
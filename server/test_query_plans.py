@@ -0,0 +1,209 @@
+"""
+Query-plan regression suite for Database.
+
+Seeds a local mongod (MONGODB_TEST_URI) with realistic volumes, runs every
+read/update path of Database while recording the exact commands it sends,
+and asserts via explain() that each one is answered from an index with no
+in-memory SORT. A dropped or mismatched index fails here instead of
+showing up as production latency.
+
+Usage:
+    pytest test_query_plans.py
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+
+from archive import ChatArchiver
+from database import Database, encode_cursor
+from migrations import migrate
+from quota import QuotaService
+
+
+USERS = 40
+CHATS_PER_USER = 25
+MESSAGES_PER_CHAT = 60
+HOT_CHAT_MESSAGES = 3000
+
+# Commands that can be explained; inserts always go straight to the collection
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Stages that mean a collection scan or a blocking in-memory sort
+BAD_STAGES = {"COLLSCAN", "SORT"}
+INDEX_STAGES = {"IXSCAN", "IDHACK", "EXPRESS_IXSCAN", "EXPRESS_IDHACK", "COUNT_SCAN", "DISTINCT_SCAN"}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Keeps a copy of every explainable command sent to the server"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name in EXPLAINABLE:
+            self.commands.append((event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Driver/session fields that explain() rejects
+DRIVER_FIELDS = {"lsid", "txnNumber", "writeConcern", "readConcern", "apiVersion"}
+
+
+def explainable_command(command: dict) -> dict:
+    """Strip driver/session fields so the command can be wrapped in explain"""
+    return {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in DRIVER_FIELDS
+    }
+
+
+def plan_stages(plan) -> list:
+    """Every "stage" name in an explain plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+def winning_plan(explain: dict) -> dict:
+    """Winning plan from find/update/delete or aggregate explain output"""
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"]["winningPlan"]
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]["queryPlanner"]["winningPlan"]
+    raise AssertionError(f"Unrecognised explain output: {list(explain)}")
+
+
+def seed(uri: str, db_name: str) -> dict:
+    """Insert realistic volumes; returns ids used by the queries under test"""
+    client = MongoClient(uri)
+    db = client[db_name]
+    rng = random.Random(7)
+    start = datetime(2025, 1, 1)
+
+    chats, messages, documents, users, payments = [], [], [], [], []
+    for u in range(USERS):
+        user_id = f"user-{u}"
+        users.append({"user_id": user_id, "is_premium": u % 5 == 0, "chat_count": CHATS_PER_USER,
+                      "document_count": 0, "query_count": 0, "remaining_queries": 0,
+                      "total_payments": 0, "created_at": start, "updated_at": start})
+        payments.append({"user_id": user_id, "razorpay_order_id": f"order_{u}", "amount": 49900,
+                         "currency": "INR", "status": "created", "created_at": start, "updated_at": start})
+        for c in range(CHATS_PER_USER):
+            chat_id = ObjectId()
+            updated = start + timedelta(minutes=rng.randint(0, 500000))
+            chats.append({"_id": chat_id, "user_id": user_id, "title": f"Chat {c}",
+                          "prompt_template": "legal_assistant", "created_at": start,
+                          "updated_at": updated, "is_active": c % 10 != 0})
+            documents.append({"chat_id": str(chat_id), "filename": "contract.pdf", "num_chunks": 40,
+                              "file_size": 1000, "uploaded_at": start})
+            for m in range(MESSAGES_PER_CHAT):
+                messages.append({"chat_id": str(chat_id), "role": "user" if m % 2 == 0 else "assistant",
+                                 "content": "clause text " * 20, "sources": [1], "metadata": {},
+                                 "created_at": start + timedelta(seconds=m)})
+
+    hot_chat_id = str(chats[0]["_id"])
+    for m in range(HOT_CHAT_MESSAGES):
+        messages.append({"chat_id": hot_chat_id, "role": "user", "content": "long matter " * 20,
+                         "sources": [], "metadata": {}, "created_at": start + timedelta(seconds=10000 + m)})
+
+    db.chats.insert_many(chats)
+    db.messages.insert_many(messages)
+    db.documents.insert_many(documents)
+    db.users.insert_many(users)
+    db.payments.insert_many(payments)
+    client.close()
+
+    # Cursors from the middle of the hot chat and of user-0's chat list
+    middle = messages[-(HOT_CHAT_MESSAGES // 2)]
+    newest = max((c for c in chats if c["user_id"] == "user-0"), key=lambda c: (c["updated_at"], c["_id"]))
+
+    return {
+        "user_id": "user-0",
+        "chat_id": hot_chat_id,
+        "order_id": "order_0",
+        "message_cursor": encode_cursor(middle["created_at"], middle["_id"]),
+        "chat_cursor": encode_cursor(newest["updated_at"], newest["_id"]),
+    }
+
+
+async def flush_counters(database: Database, user_id: str):
+    await database.increment_user_query_count(user_id)
+    await database.counters.flush()
+
+
+# Every Database call whose query shape must stay index-backed
+QUERIES = {
+    "get_chat": lambda d, ids: d.get_chat(ids["chat_id"]),
+    "get_user_chats": lambda d, ids: d.get_user_chats(ids["user_id"]),
+    "get_user_chats_page": lambda d, ids: d.get_user_chats_page(ids["user_id"], 5, ids["chat_cursor"]),
+    "get_user_chat_titles": lambda d, ids: d.get_user_chat_titles(ids["user_id"]),
+    "update_chat": lambda d, ids: d.update_chat(ids["chat_id"], {"title": "Renamed"}),
+    "get_chat_messages": lambda d, ids: d.get_chat_messages(ids["chat_id"]),
+    "get_chat_messages_page": lambda d, ids: d.get_chat_messages_page(ids["chat_id"], 100, ids["message_cursor"]),
+    "get_chat_context": lambda d, ids: d.get_chat_context(ids["chat_id"]),
+    "get_chat_documents": lambda d, ids: d.get_chat_documents(ids["chat_id"]),
+    "get_user": lambda d, ids: d.get_user(ids["user_id"]),
+    "check_user_limits": lambda d, ids: d.check_user_limits(ids["user_id"]),
+    "flush_counters": lambda d, ids: flush_counters(d, ids["user_id"]),
+    "get_user_payments": lambda d, ids: d.get_user_payments(ids["user_id"]),
+    "get_payment_by_order_id": lambda d, ids: d.get_payment_by_order_id(ids["order_id"]),
+    "claim_chat_deletion": lambda d, ids: d.claim_chat_deletion(60),
+    "find_idle_chats": lambda d, ids: ChatArchiver(d, after_days=30).find_idle_chats(100),
+    "quota_reserve": lambda d, ids: QuotaService(d).reserve(ids["user_id"], "document"),
+    "add_exchange": lambda d, ids: d.add_exchange(ids["chat_id"], "Question?", "Answer.", user_id=ids["user_id"]),
+}
+
+
+@pytest.fixture
+def seeded_db(mongo_test_db):
+    uri, db_name = mongo_test_db
+    ids = seed(uri, db_name)
+    return uri, db_name, ids
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_query_uses_index_without_in_memory_sort(seeded_db, name):
+    uri, db_name, ids = seeded_db
+    recorder = CommandRecorder()
+
+    async def run():
+        database = Database(uri=uri, db_name=db_name)
+        await database.connect(event_listeners=[recorder])
+        await migrate(database.db)
+        recorder.commands.clear()
+        try:
+            await QUERIES[name](database, ids)
+        finally:
+            await database.disconnect()
+
+    asyncio.run(run())
+    assert recorder.commands, f"{name} sent no explainable commands"
+
+    client = MongoClient(uri)
+    try:
+        for command_name, command in recorder.commands:
+            explain = client[db_name].command(
+                {"explain": explainable_command(command), "verbosity": "queryPlanner"}
+            )
+            stages = plan_stages(winning_plan(explain))
+            assert not BAD_STAGES & set(stages), f"{name} ({command_name}) plan: {stages}"
+            assert INDEX_STAGES & set(stages), f"{name} ({command_name}) plan: {stages}"
+    finally:
+        client.close()
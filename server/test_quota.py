@@ -0,0 +1,91 @@
+"""
+Quota service tests.
+
+Runs against a local mongod (MONGODB_TEST_URI, default mongodb://localhost:27017);
+concurrent reservations must never exceed the free-tier limits.
+
+Usage:
+    pytest test_quota.py
+"""
+
+import asyncio
+
+import pytest
+
+from config import FREE_CHAT_LIMIT
+from database import Database
+from migrations import migrate
+from quota import QuotaService, QuotaExceeded
+
+
+async def connect(uri: str, db_name: str) -> Database:
+    database = Database(uri=uri, db_name=db_name)
+    await database.connect()
+    await migrate(database.db)
+    return database
+
+
+def test_concurrent_reservations_respect_limit(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db)
+        quota = QuotaService(database)
+        try:
+            results = await asyncio.gather(
+                *[quota.reserve("u1", "chat") for _ in range(FREE_CHAT_LIMIT + 5)],
+                return_exceptions=True
+            )
+
+            granted = [r for r in results if isinstance(r, dict)]
+            assert len(granted) == FREE_CHAT_LIMIT
+            assert all(isinstance(r, QuotaExceeded) for r in results if not isinstance(r, dict))
+            assert await database.users.count_documents({"user_id": "u1"}) == 1
+            assert (await database.users.find_one({"user_id": "u1"}))["chat_count"] == FREE_CHAT_LIMIT
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_premium_users_are_not_limited(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db)
+        quota = QuotaService(database)
+        try:
+            await database.get_or_create_user("u1")
+            await database.upgrade_to_premium("u1")
+            for _ in range(FREE_CHAT_LIMIT + 3):
+                await quota.reserve("u1", "chat")
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_failed_work_releases_reservation(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db)
+        quota = QuotaService(database)
+        try:
+            with pytest.raises(RuntimeError):
+                async with quota.reservation("u1", "document"):
+                    raise RuntimeError("embedding failed")
+
+            assert (await database.get_user("u1"))["document_count"] == 0
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_get_or_create_user_creates_one(mongo_test_db):
+    async def scenario():
+        database = await connect(*mongo_test_db)
+        try:
+            users = await asyncio.gather(*[database.get_or_create_user("u1") for _ in range(10)])
+
+            assert len({user["_id"] for user in users}) == 1
+            assert await database.users.count_documents({"user_id": "u1"}) == 1
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
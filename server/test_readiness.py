@@ -0,0 +1,110 @@
+"""
+Readiness monitor tests (probes are plain coroutines; no services needed).
+
+Usage:
+    pytest test_readiness.py
+"""
+
+import asyncio
+
+import pytest
+
+from readiness import ReadinessMonitor, build_monitor
+
+
+async def ok():
+    pass
+
+
+async def broken():
+    raise ConnectionError("connection refused")
+
+
+async def hangs():
+    await asyncio.sleep(10)
+
+
+def monitor(**probes) -> ReadinessMonitor:
+    m = ReadinessMonitor(critical=["mongo", "vector_store"], timeout_seconds=0.05, stale_seconds=60)
+    for name, probe in probes.items():
+        m.register(name, probe)
+    return m
+
+
+def test_not_ready_until_first_check():
+    m = monitor(mongo=ok)
+    ready, report = m.ready()
+    assert not ready
+    assert report["checks"]["mongo"]["status"] == "unknown"
+
+
+def test_results_are_cached_with_latency():
+    m = monitor(mongo=ok, vector_store=ok, llm=ok)
+    asyncio.run(m.check_once())
+
+    ready, report = m.ready()
+    assert ready and report["status"] == "ready"
+    mongo = report["checks"]["mongo"]
+    assert mongo["status"] == "ok" and mongo["critical"]
+    assert mongo["latency_ms"] >= 0 and "checked_at" in mongo
+
+
+def test_failing_critical_check_is_not_ready():
+    m = monitor(mongo=broken, vector_store=ok)
+    asyncio.run(m.check_once())
+
+    ready, report = m.ready()
+    assert not ready
+    assert "connection refused" in report["checks"]["mongo"]["error"]
+
+
+def test_failing_non_critical_check_is_reported_but_ready():
+    m = monitor(mongo=ok, vector_store=ok, llm=broken)
+    asyncio.run(m.check_once())
+
+    ready, report = m.ready()
+    assert ready
+    assert report["checks"]["llm"]["status"] == "fail"
+
+
+def test_hung_probe_times_out():
+    m = monitor(vector_store=hangs)
+    asyncio.run(m.check_once())
+
+    ready, report = m.ready()
+    assert not ready
+    assert "timed out" in report["checks"]["vector_store"]["error"]
+
+
+def test_stale_results_are_not_ready():
+    m = monitor(mongo=ok)
+    asyncio.run(m.check_once())
+    m.stale_seconds = 0
+
+    ready, report = m.ready()
+    assert not ready and report["checks"]["mongo"]["status"] == "stale"
+
+
+def test_background_checks_run_until_stopped():
+    calls = []
+
+    async def counted():
+        calls.append(1)
+
+    async def scenario():
+        m = monitor(mongo=counted)
+        m.interval_seconds = 0.02
+        m.start()
+        await asyncio.sleep(0.1)
+        assert m.live()["checker_running"]
+        await m.stop()
+        return m
+
+    m = asyncio.run(scenario())
+    assert len(calls) >= 2
+    assert not m.live()["checker_running"]
+
+
+def test_unknown_check_name_is_rejected():
+    with pytest.raises(ValueError, match="Unknown readiness check"):
+        build_monitor(["mongo", "redis"])
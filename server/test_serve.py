@@ -0,0 +1,44 @@
+"""
+Serving entry point tests (uvicorn.run is replaced; nothing is started).
+
+Usage:
+    pytest test_serve.py
+"""
+
+import serve
+
+
+def test_workers_and_lifecycle_options_reach_uvicorn(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **options: calls.append((app, options)))
+
+    assert serve.main(["--workers", "4", "--port", "9000", "--max-requests", "5000"]) == 0
+
+    [(app, options)] = calls
+    assert app == "main:app"
+    assert options["workers"] == 4 and options["port"] == 9000
+    assert options["limit_max_requests"] == 5000
+    assert options["timeout_graceful_shutdown"] == serve.GRACEFUL_SHUTDOWN_SECONDS
+
+
+def test_zero_workers_means_one_per_core(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **options: calls.append(options))
+    monkeypatch.setattr(serve.os, "cpu_count", lambda: 6)
+
+    serve.main(["--workers", "0"])
+    assert calls[0]["workers"] == 6
+    assert calls[0]["limit_max_requests"] is None
+
+
+def test_metrics_dir_is_shared_and_emptied(monkeypatch, tmp_path):
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    serve.prepare_metrics_dir(1)
+    assert "PROMETHEUS_MULTIPROC_DIR" not in serve.os.environ
+
+    (tmp_path / "counter_123.db").write_bytes(b"stale")
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    serve.prepare_metrics_dir(4)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,29 @@
+"""
+Cold start budget: `import main` must stay cheap and must not load the LLM,
+embedding, PDF or Pinecone SDKs (they load with the pipeline in the lifespan).
+
+Usage:
+    pytest test_startup.py
+    IMPORT_TIME_BUDGET_MS=800 pytest test_startup.py
+"""
+
+from benchmarks import IMPORT_TIME_BUDGET_MS, measure_import_time
+
+
+def test_import_main_is_within_budget_and_lazy():
+    # Best of two runs to ride out a cold disk cache
+    total_ms, children, leaked = min((measure_import_time("main") for _ in range(2)), key=lambda m: m[0])
+
+    assert leaked == [], f"Imported eagerly by main: {leaked}"
+    assert total_ms <= IMPORT_TIME_BUDGET_MS, (
+        f"import main took {total_ms:.0f} ms (budget {IMPORT_TIME_BUDGET_MS:.0f} ms); heaviest: {children[:5]}"
+    )
+
+
+def test_lazy_imports_still_resolve():
+    from model_router import ModelRouter, FAST_ROUTE
+    from prompts import get_prompt_template
+
+    prompt = get_prompt_template("legal_assistant")
+    assert {"input", "context", "chat_history"} <= set(prompt.input_variables)
+    assert ModelRouter().get_llm(FAST_ROUTE) is not None
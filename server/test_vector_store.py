@@ -0,0 +1,108 @@
+"""
+Offline tests for the local (memory-mapped) vector store backend.
+
+Usage:
+    pytest test_vector_store.py
+"""
+
+import numpy as np
+import pytest
+
+from vector_store import LocalVectorStore, TEXT_KEY
+
+
+DIM = 8
+
+
+def make_store(tmp_path) -> LocalVectorStore:
+    return LocalVectorStore(root=str(tmp_path), dim=DIM)
+
+
+def unit(index: int) -> list:
+    vec = np.zeros(DIM, dtype=np.float32)
+    vec[index] = 1.0
+    return vec.tolist()
+
+
+def test_query_returns_nearest_by_cosine(tmp_path):
+    store = make_store(tmp_path)
+    store.upsert(
+        "chat1",
+        ["a", "b", "c"],
+        [unit(0), unit(1), [1.0, 1.0, 0, 0, 0, 0, 0, 0]],
+        [{TEXT_KEY: "a", "page": 0}, {TEXT_KEY: "b", "page": 1}, {TEXT_KEY: "c", "page": 2}]
+    )
+
+    matches = store.query("chat1", [2.0, 0, 0, 0, 0, 0, 0, 0], top_k=2)
+
+    assert [m["id"] for m in matches] == ["a", "c"]
+    assert abs(matches[0]["score"] - 1.0) < 1e-6
+    assert matches[1]["metadata"]["page"] == 2
+
+
+def test_upsert_overwrites_existing_ids(tmp_path):
+    store = make_store(tmp_path)
+    store.upsert("chat1", ["a"], [unit(0)], [{TEXT_KEY: "old"}])
+    store.upsert("chat1", ["a"], [unit(3)], [{TEXT_KEY: "new"}])
+
+    assert store.namespace_stats("chat1") == {"exists": True, "vector_count": 1}
+    match = store.query("chat1", unit(3), top_k=1)[0]
+    assert match["metadata"][TEXT_KEY] == "new"
+
+
+def test_delete_keeps_remaining_rows_searchable(tmp_path):
+    store = make_store(tmp_path)
+    store.upsert("chat1", ["a", "b", "c"], [unit(0), unit(1), unit(2)], [{}, {}, {}])
+
+    store.delete("chat1", ["a"])
+
+    assert store.namespace_stats("chat1")["vector_count"] == 2
+    assert store.query("chat1", unit(2), top_k=1)[0]["id"] == "c"
+    assert "a" not in [m["id"] for m in store.query("chat1", unit(0), top_k=3)]
+
+
+def test_namespaces_are_isolated_and_deletable(tmp_path):
+    store = make_store(tmp_path)
+    store.upsert("chat1", ["a"], [unit(0)], [{}])
+    store.upsert("chat2", ["b"], [unit(0)], [{}])
+
+    store.delete_namespace("chat1")
+
+    assert store.query("chat1", unit(0)) == []
+    assert store.namespace_stats("chat1") == {"exists": False, "vector_count": 0}
+    assert store.query("chat2", unit(0))[0]["id"] == "b"
+
+
+def test_data_survives_reopen_and_growth(tmp_path):
+    store = make_store(tmp_path)
+    ids = [f"v{i}" for i in range(600)]
+    vectors = np.random.default_rng(0).normal(size=(600, DIM)).tolist()
+    store.upsert("chat1", ids, vectors, [{"i": i} for i in range(600)])
+
+    reopened = make_store(tmp_path)
+
+    assert reopened.namespace_stats("chat1")["vector_count"] == 600
+    assert reopened.query("chat1", vectors[123], top_k=1)[0]["id"] == "v123"
+
+
+@pytest.mark.parametrize("mode", ["int8", "binary", "truncate"])
+def test_quantized_search_rescores_exactly(tmp_path, mode):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(300, DIM))
+    store = LocalVectorStore(root=str(tmp_path), dim=DIM, quantization=mode, truncate_dim=4, rescore_multiplier=300)
+    store.upsert("chat1", [f"v{i}" for i in range(300)], vectors.tolist(), [{} for _ in range(300)])
+
+    match = store.query("chat1", vectors[42].tolist(), top_k=1)[0]
+
+    # With the whole namespace shortlisted, rescoring must recover the exact answer
+    assert match["id"] == "v42"
+    assert abs(match["score"] - 1.0) < 1e-5
+
+
+def test_changing_quantization_rebuilds_codes(tmp_path):
+    vectors = np.random.default_rng(2).normal(size=(50, DIM)).tolist()
+    make_store(tmp_path).upsert("chat1", [f"v{i}" for i in range(50)], vectors, [{} for _ in range(50)])
+
+    store = LocalVectorStore(root=str(tmp_path), dim=DIM, quantization="int8")
+
+    assert store.query("chat1", vectors[7], top_k=1)[0]["id"] == "v7"
@@ -0,0 +1,454 @@
+import json
+import os
+import re
+import shutil
+import hashlib
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    VECTOR_STORE_BACKEND,
+    PINECONE_API_KEY,
+    PINECONE_INDEX_NAME,
+    PINECONE_HOST,
+    PINECONE_DIMENSION,
+    PINECONE_UPSERT_BATCH_SIZE,
+    PINECONE_POOL_THREADS,
+    PINECONE_CONNECTION_POOL_SIZE,
+    LOCAL_VECTOR_STORE_DIR,
+    LOCAL_VECTOR_INITIAL_CAPACITY,
+    VECTOR_QUANTIZATION,
+    VECTOR_TRUNCATE_DIM,
+    VECTOR_RESCORE_MULTIPLIER
+)
+from quantization import Quantizer, get_quantizer
+
+
+# Metadata key holding the chunk text (same key LangChain's Pinecone store uses,
+# so vectors written before this module existed keep working)
+TEXT_KEY = "text"
+
+
+class VectorStore:
+    """
+    Interface for vector storage backends.
+    Every chat gets its own namespace (namespace = chat_id).
+    """
+
+    def upsert(
+        self,
+        namespace: str,
+        ids: List[str],
+        vectors: List[List[float]],
+        metadatas: List[dict]
+    ) -> int:
+        """Insert or overwrite vectors. Returns the number written."""
+        raise NotImplementedError
+
+    def query(self, namespace: str, vector: List[float], top_k: int = 5) -> List[dict]:
+        """Return the top_k matches as dicts with id, score and metadata"""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, ids: List[str]):
+        """Delete specific vectors from a namespace"""
+        raise NotImplementedError
+
+    def delete_namespace(self, namespace: str):
+        """Delete every vector in a namespace"""
+        raise NotImplementedError
+
+    def namespace_stats(self, namespace: str) -> dict:
+        """Return {"exists": bool, "vector_count": int} for a namespace"""
+        raise NotImplementedError
+
+    def ping(self):
+        """Raise if the store can't be reached (readiness check)"""
+        raise NotImplementedError
+
+
+# ==================== PINECONE BACKEND ====================
+
+class PineconeStore(VectorStore):
+    """Hosted Pinecone index. One client (and connection pool) per process."""
+
+    def __init__(self):
+        from pinecone import Pinecone
+
+        self.pc = Pinecone(api_key=PINECONE_API_KEY)
+        self.index = self.pc.Index(
+            PINECONE_INDEX_NAME,
+            host=PINECONE_HOST or "",
+            pool_threads=PINECONE_POOL_THREADS,
+            connection_pool_maxsize=PINECONE_CONNECTION_POOL_SIZE
+        )
+
+    def upsert(self, namespace, ids, vectors, metadatas) -> int:
+        records = [
+            {"id": vid, "values": list(vec), "metadata": meta}
+            for vid, vec, meta in zip(ids, vectors, metadatas)
+        ]
+        for start in range(0, len(records), PINECONE_UPSERT_BATCH_SIZE):
+            self.index.upsert(
+                vectors=records[start:start + PINECONE_UPSERT_BATCH_SIZE],
+                namespace=namespace
+            )
+        return len(records)
+
+    def query(self, namespace, vector, top_k=5) -> List[dict]:
+        response = self.index.query(
+            vector=list(vector),
+            top_k=top_k,
+            namespace=namespace,
+            include_metadata=True
+        )
+        return [
+            {"id": match.id, "score": match.score, "metadata": dict(match.metadata or {})}
+            for match in response.matches or []
+        ]
+
+    def delete(self, namespace, ids):
+        if ids:
+            self.index.delete(ids=list(ids), namespace=namespace)
+
+    def delete_namespace(self, namespace):
+        try:
+            self.index.delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            # Deleting a namespace that was never written is not an error
+            if getattr(e, "status", None) != 404:
+                raise
+
+    def namespace_stats(self, namespace) -> dict:
+        stats = self.index.describe_index_stats()
+        namespaces = stats.get("namespaces", {})
+        if namespace in namespaces:
+            return {"exists": True, "vector_count": namespaces[namespace].get("vector_count", 0)}
+        return {"exists": False, "vector_count": 0}
+
+    def ping(self):
+        self.index.describe_index_stats()
+
+
+# ==================== LOCAL BACKEND ====================
+
+class _LocalNamespace:
+    """
+    One namespace on disk:
+    - vectors.f32: float32 matrix (capacity x dim), memory-mapped, rows L2-normalized
+    - codes.<mode> / scales.f32: optional quantized first-stage index
+    - index.json: sidecar with row count, capacity, quantization, ids and metadata (row order)
+
+    With a quantizer, queries scan the compact codes to shortlist candidates
+    and only the shortlisted full-precision rows are read back for exact rescoring.
+    """
+
+    MATRIX_FILE = "vectors.f32"
+    SCALES_FILE = "scales.f32"
+    SIDECAR_FILE = "index.json"
+
+    def __init__(self, path: str, dim: int, quantizer: Optional[Quantizer] = None, rescore_multiplier: int = 4):
+        self.path = path
+        self.dim = dim
+        self.quantizer = quantizer
+        self.rescore_multiplier = rescore_multiplier
+        self.lock = Lock()
+        self.count = 0
+        self.capacity = 0
+        self.ids: List[str] = []
+        self.metadata: List[dict] = []
+        self.rows: Dict[str, int] = {}
+        self.matrix: Optional[np.memmap] = None
+        self.codes: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+        self._load()
+
+    @property
+    def matrix_path(self) -> str:
+        return os.path.join(self.path, self.MATRIX_FILE)
+
+    @property
+    def codes_path(self) -> str:
+        return os.path.join(self.path, f"codes.{self.quantizer.name}")
+
+    @property
+    def scales_path(self) -> str:
+        return os.path.join(self.path, self.SCALES_FILE)
+
+    @property
+    def sidecar_path(self) -> str:
+        return os.path.join(self.path, self.SIDECAR_FILE)
+
+    def _mapped_files(self) -> List[tuple]:
+        """(attribute, path, dtype, row width) for every memory-mapped file"""
+        files = [("matrix", self.matrix_path, np.float32, self.dim)]
+        if self.quantizer is not None:
+            files.append(("codes", self.codes_path, self.quantizer.dtype, self.quantizer.code_width(self.dim)))
+            if self.quantizer.has_scales:
+                files.append(("scales", self.scales_path, np.float32, 0))
+        return files
+
+    def _open(self):
+        for attr, path, dtype, width in self._mapped_files():
+            shape = (self.capacity, width) if width else (self.capacity,)
+            setattr(self, attr, np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+
+    def _flush(self):
+        for attr, _, _, _ in self._mapped_files():
+            mapped = getattr(self, attr)
+            if mapped is not None:
+                mapped.flush()
+
+    def _load(self):
+        if not os.path.exists(self.sidecar_path):
+            return
+        with open(self.sidecar_path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self.count = sidecar["count"]
+        self.capacity = sidecar["capacity"]
+        self.ids = sidecar["ids"]
+        self.metadata = sidecar["metadata"]
+        self.rows = {vid: row for row, vid in enumerate(self.ids)}
+
+        current_mode = self.quantizer.name if self.quantizer else "none"
+        if sidecar.get("quantization", "none") != current_mode:
+            # Quantization mode changed since this namespace was written:
+            # rebuild the first-stage codes from the full-precision vectors
+            self._resize_files(self.capacity)
+            if self.quantizer is not None and self.count:
+                codes, scales = self.quantizer.encode(np.asarray(self.matrix[:self.count]))
+                self.codes[:self.count] = codes
+                if scales is not None:
+                    self.scales[:self.count] = scales
+            self._flush()
+            self._save_sidecar()
+        else:
+            self._open()
+
+    def _save_sidecar(self):
+        tmp_path = self.sidecar_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "count": self.count,
+                "capacity": self.capacity,
+                "quantization": self.quantizer.name if self.quantizer else "none",
+                "ids": self.ids,
+                "metadata": self.metadata
+            }, f)
+        # Atomic swap so readers never see a half-written sidecar
+        os.replace(tmp_path, self.sidecar_path)
+
+    def _resize_files(self, capacity: int):
+        os.makedirs(self.path, exist_ok=True)
+        self._flush()
+        for attr, path, dtype, width in self._mapped_files():
+            setattr(self, attr, None)
+            # Growing a file zero-fills the new rows without rewriting old ones
+            with open(path, "ab") as f:
+                f.truncate(capacity * max(width, 1) * np.dtype(dtype).itemsize)
+        self.capacity = capacity
+        self._open()
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        new_capacity = max(LOCAL_VECTOR_INITIAL_CAPACITY, self.capacity or 1)
+        while new_capacity < needed:
+            new_capacity *= 2
+        self._resize_files(new_capacity)
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, metadatas: List[dict]) -> int:
+        with self.lock:
+            new_ids = [vid for vid in dict.fromkeys(ids) if vid not in self.rows]
+            self._ensure_capacity(self.count + len(new_ids))
+
+            rows = []
+            for vid, meta in zip(ids, metadatas):
+                row = self.rows.get(vid)
+                if row is None:
+                    row = self.count
+                    self.rows[vid] = row
+                    self.ids.append(vid)
+                    self.metadata.append(meta)
+                    self.count += 1
+                else:
+                    self.metadata[row] = meta
+                rows.append(row)
+
+            rows = np.asarray(rows)
+            self.matrix[rows] = vectors
+            if self.quantizer is not None:
+                codes, scales = self.quantizer.encode(vectors)
+                self.codes[rows] = codes
+                if scales is not None:
+                    self.scales[rows] = scales
+
+            self._flush()
+            self._save_sidecar()
+            return len(ids)
+
+    def query(self, vector: np.ndarray, top_k: int) -> List[dict]:
+        with self.lock:
+            if self.count == 0:
+                return []
+            k = min(top_k, self.count)
+
+            if self.quantizer is None:
+                rows = np.arange(self.count)
+                scores = self.matrix[:self.count] @ vector
+            else:
+                # Stage 1: shortlist on the compact codes
+                shortlist = min(self.count, k * self.rescore_multiplier)
+                scales = self.scales[:self.count] if self.scales is not None else None
+                approx = self.quantizer.score(self.codes[:self.count], scales, vector)
+                rows = np.sort(np.argpartition(-approx, shortlist - 1)[:shortlist])
+                # Stage 2: exact cosine on the full-precision rows (sorted for sequential reads)
+                scores = self.matrix[rows] @ vector
+
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": self.ids[rows[i]], "score": float(scores[i]), "metadata": dict(self.metadata[rows[i]])}
+                for i in top
+            ]
+
+    def delete(self, ids: List[str]):
+        with self.lock:
+            removed = False
+            for vid in ids:
+                row = self.rows.pop(vid, None)
+                if row is None:
+                    continue
+                last = self.count - 1
+                if row != last:
+                    # Move the last row into the hole to keep the matrices dense
+                    for attr, _, _, _ in self._mapped_files():
+                        mapped = getattr(self, attr)
+                        mapped[row] = mapped[last]
+                    self.ids[row] = self.ids[last]
+                    self.metadata[row] = self.metadata[last]
+                    self.rows[self.ids[row]] = row
+                self.ids.pop()
+                self.metadata.pop()
+                self.count -= 1
+                removed = True
+
+            if removed:
+                self._flush()
+                self._save_sidecar()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            for attr, _, _, _ in self._mapped_files():
+                setattr(self, attr, None)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Self-hosted store: one memory-mapped float32 matrix per namespace.
+    Search is an exact, vectorized cosine scan which is fast for per-chat
+    namespaces of a few thousand chunks and avoids a network round trip.
+    Optionally a quantized copy (int8, binary or truncated) is scanned
+    first and the shortlist is rescored at full precision.
+    """
+
+    def __init__(
+        self,
+        root: str = LOCAL_VECTOR_STORE_DIR,
+        dim: int = PINECONE_DIMENSION,
+        quantization: str = VECTOR_QUANTIZATION,
+        truncate_dim: int = VECTOR_TRUNCATE_DIM,
+        rescore_multiplier: int = VECTOR_RESCORE_MULTIPLIER
+    ):
+        self.root = root
+        self.dim = dim
+        self.quantizer = get_quantizer(quantization, truncate_dim)
+        self.rescore_multiplier = rescore_multiplier
+        self._namespaces: Dict[str, _LocalNamespace] = {}
+        self._lock = Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _namespace_path(self, namespace: str) -> str:
+        # Chat IDs are hex, but never trust a namespace as a path component
+        if re.fullmatch(r"[A-Za-z0-9_-]{1,128}", namespace):
+            return os.path.join(self.root, namespace)
+        return os.path.join(self.root, hashlib.sha256(namespace.encode()).hexdigest())
+
+    def _get_namespace(self, namespace: str, create: bool = False) -> Optional[_LocalNamespace]:
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                path = self._namespace_path(namespace)
+                if not create and not os.path.exists(path):
+                    return None
+                ns = _LocalNamespace(path, self.dim, self.quantizer, self.rescore_multiplier)
+                self._namespaces[namespace] = ns
+            return ns
+
+    def _normalize(self, vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def upsert(self, namespace, ids, vectors, metadatas) -> int:
+        if not ids:
+            return 0
+        ns = self._get_namespace(namespace, create=True)
+        return ns.upsert(list(ids), self._normalize(vectors), list(metadatas))
+
+    def query(self, namespace, vector, top_k=5) -> List[dict]:
+        ns = self._get_namespace(namespace)
+        if ns is None:
+            return []
+        return ns.query(self._normalize(vector)[0], top_k)
+
+    def delete(self, namespace, ids):
+        ns = self._get_namespace(namespace)
+        if ns is not None:
+            ns.delete(list(ids))
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            ns = self._namespaces.pop(namespace, None)
+        if ns is not None:
+            ns.close()
+        shutil.rmtree(self._namespace_path(namespace), ignore_errors=True)
+
+    def namespace_stats(self, namespace) -> dict:
+        ns = self._get_namespace(namespace)
+        if ns is None or ns.count == 0:
+            return {"exists": False, "vector_count": 0}
+        return {"exists": True, "vector_count": ns.count}
+
+    def ping(self):
+        if not os.access(self.root, os.R_OK | os.W_OK):
+            raise OSError(f"Vector store directory {self.root} is not readable and writable")
+
+
+# ==================== FACTORY ====================
+
+_store: Optional[VectorStore] = None
+_store_lock = Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """Get the process-wide vector store for the configured backend"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if VECTOR_STORE_BACKEND == "local":
+                    _store = LocalVectorStore()
+                elif VECTOR_STORE_BACKEND == "pinecone":
+                    _store = PineconeStore()
+                else:
+                    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {VECTOR_STORE_BACKEND}")
+    return _store